@@ -0,0 +1,156 @@
+import time
+
+import pigpio
+
+# Parameters passed to the script
+P_RAMP_UP_WAVE = 0
+P_CRUISE_WAVE = 1
+P_RAMP_DOWN_WAVE = 2
+P_ARM_DELAY = 3
+P_DEADLINE = 4
+# Parameters set by the script
+P_DETECTED = 5
+P_START_TICK = 6
+P_SENSOR_TICK = 7
+P_STOP_TICK = 8
+
+SCRIPT_TEMPLATE = """
+w {enable_pin} 0
+tick sta v0 sta p6
+lda 0 sta p5 sta p7
+wvtxm p0 2
+wvtxm p1 3
+
+tag 1
+tick sub v0 cmp p3 jm 1
+
+tag 2
+r {sensor_pin} cmp 0 jz 3
+tick sub v0 cmp p4 jp 9
+mics 20 jmp 2
+
+tag 3
+r {sensor_pin} cmp 0 jnz 4
+tick sub v0 cmp p4 jp 9
+mics 20 jmp 3
+
+tag 4
+tick sta p7
+lda 1 sta p5
+
+tag 9
+wvtxm p2 2
+
+tag 10
+wvbsy cmp 0 jz 11
+mics 200 jmp 10
+
+tag 11
+tick sta p8
+w {enable_pin} 1
+"""
+
+
+class AdvanceScript:
+    """
+    Frame advance running entirely inside the `pigpio` daemon as a stored script. The
+    script enables the motor, ramps it up, arms the frame sensor after a delay, waits
+    for its rising edge or a deadline, ramps the motor down and disables it again.
+    Python only starts the script and collects its result, such that the timing of the
+    stop does not depend on socket round trips or thread scheduling.
+
+    The ramps are sent as three precompiled waveforms: one for ramping up, one single
+    step at the target speed that is repeated while waiting for the sensor and one for
+    ramping down. Switching between them is synchronised to the end of the current
+    waveform by the daemon.
+
+    Parameters
+    ----------
+    pi : pigpio.pi
+        Connection to the `pigpio` daemon.
+    motor : StepperMotor
+        Motor to advance with.
+    sensor_pin : int
+        Broadcom number of the GPIO header pin receiving the frame sensor's signal.
+    """
+
+    POLL_INTERVAL = 0.002
+
+    def __init__(self, pi, motor, sensor_pin):
+        self.pi = pi
+        self.motor = motor
+        self.sensor_pin = sensor_pin
+        self.script_id = None
+
+    def __del__(self):
+        if self.script_id is not None:
+            self.pi.delete_script(self.script_id)
+
+    def store(self):
+        """
+        Upload the script to the daemon and wait until it is ready to run.
+        """
+        script = SCRIPT_TEMPLATE.format(
+            enable_pin=self.motor.enable_pin, sensor_pin=self.sensor_pin
+        )
+        script_id = self.pi.store_script(" ".join(script.split()).encode())
+        if script_id < 0:
+            raise RuntimeError(f"Failed to store advance script ({script_id})")
+
+        while self.pi.script_status(script_id)[0] == pigpio.PI_SCRIPT_INITING:
+            time.sleep(self.POLL_INTERVAL)
+        self.script_id = script_id
+
+    def run(self, speed, acceleration, arm_delay, deadline):
+        """
+        Advance by one frame.
+
+        Parameters
+        ----------
+        speed : int
+            Speed to run the motor at in RPM.
+        acceleration : int
+            Acceleration and deceleration in `rounds / (minute * second)`, unless the
+            motor has a profile set.
+        arm_delay : float
+            Time in seconds after starting the motor before the sensor is armed.
+        deadline : float
+            Time in seconds after starting the motor by which the sensor must have been
+            triggered.
+
+        Returns
+        -------
+        result : tuple
+            Tuple `(was_detected, start_tick, sensor_tick, stop_tick)` of whether the
+            sensor was triggered before the deadline and the `pigpio` ticks at which
+            the motor started, the sensor was triggered (`0` if it was not) and the
+            motor stopped.
+        """
+        if self.script_id is None:
+            self.store()
+
+        ramp_up, cruise, ramp_down = self.motor.get_ramp_waveforms(
+            self.motor.rpm2hz(speed), self.motor.rpm2hz(acceleration)
+        )
+        params = [0] * 10
+        params[P_RAMP_UP_WAVE] = ramp_up
+        params[P_CRUISE_WAVE] = cruise
+        params[P_RAMP_DOWN_WAVE] = ramp_down
+        params[P_ARM_DELAY] = int(1e6 * arm_delay)
+        params[P_DEADLINE] = int(1e6 * deadline)
+
+        self.pi.run_script(self.script_id, params)
+
+        status, params = self.pi.script_status(self.script_id)
+        while status in (pigpio.PI_SCRIPT_RUNNING, pigpio.PI_SCRIPT_WAITING):
+            time.sleep(self.POLL_INTERVAL)
+            status, params = self.pi.script_status(self.script_id)
+        if status != pigpio.PI_SCRIPT_HALTED:
+            raise RuntimeError(f"Advance script failed (status={status})")
+
+        was_detected = params[P_DETECTED] == 1
+        start_tick = params[P_START_TICK] & 0xFFFFFFFF
+        sensor_tick = params[P_SENSOR_TICK] & 0xFFFFFFFF
+        stop_tick = params[P_STOP_TICK] & 0xFFFFFFFF
+
+        return was_detected, start_tick, sensor_tick, stop_tick
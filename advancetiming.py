@@ -0,0 +1,186 @@
+import json
+import os
+import statistics
+from collections import deque
+
+
+class AdvanceTimingController:
+    """
+    Learns how long frame advances take and derives from that when to arm the frame
+    sensor and when to give up waiting for it. Advance durations, i.e. the time from
+    starting the motor to the sensor being triggered, are collected in a sliding window
+    so the controller follows the mechanism as it warms up. The windows are set from
+    robust statistics of the collected durations, such that single outliers do not move
+    them.
+
+    Advances that timed out are learned from as well, with the deadline they missed as
+    a lower bound of their duration, such that the windows are not only learned from
+    the advances that were fast enough. After a timeout, the deadline is widened
+    further with every timeout in a row until an advance succeeds again, so recovery
+    advances and a mechanism that slows down, e.g. as the take-up reel fills, get more
+    time. The deadline always leaves at least `MIN_MARGIN` seconds above the median.
+
+    The learned durations are kept per motion setting (e.g. speed and profile) and are
+    persisted to a JSON file, so they carry over between runs of the scanner.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file the learned durations are persisted to.
+    default_arm_delay : float
+        Arming delay in seconds used until enough durations have been collected.
+    default_timeout : float
+        Timeout in seconds after arming used until enough durations have been collected.
+    window : int, optional
+        Number of most recent durations to learn from.
+    min_samples : int, optional
+        Number of durations needed before the learned windows are used.
+    """
+
+    ARM_QUANTILE = 0.01
+    ARM_FRACTION = 0.5  # Arm at this fraction of the shortest usual advance
+    DEADLINE_QUANTILE = 0.99
+    DEADLINE_MARGIN = 1.05
+    DEADLINE_MADS = 6  # Deadline at least this many (scaled) MADs above the median
+    MIN_MARGIN = 0.05  # Deadline at least this many seconds above the median
+    WIDENING_STEP = 0.25  # Fraction of the deadline added per timeout in a row
+    MAX_WIDENING = 2.0
+    SAVE_INTERVAL = 50
+
+    def __init__(
+        self, path, default_arm_delay, default_timeout, window=200, min_samples=20
+    ):
+        self.path = path
+        self.default_arm_delay = default_arm_delay
+        self.default_timeout = default_timeout
+        self.window = window
+        self.min_samples = min_samples
+
+        self.durations = {}
+        self.setting = None
+        self.n_unsaved = 0
+        self.n_timeouts = 0  # Timeouts since the last successful advance
+
+        self.load()
+
+    def select(self, setting):
+        """
+        Select the motion setting, e.g. `"300 RPM / None"`, that subsequent updates
+        and windows refer to.
+        """
+        self.setting = str(setting)
+        if self.setting not in self.durations:
+            self.durations[self.setting] = deque(maxlen=self.window)
+
+    def update(self, duration):
+        """
+        Add the `duration` in seconds of a successful advance.
+        """
+        self.n_timeouts = 0
+        self.add(duration)
+
+    def record_timeout(self, deadline):
+        """
+        Add an advance that did not reach the sensor by `deadline`, the time in seconds
+        after starting the motor it was given, and widen the deadline.
+        """
+        # Learn from the deadline before widening, as learning from the widened one
+        # would widen the deadline without bound while the advance keeps failing
+        self.add(deadline / self.widening)
+        self.n_timeouts += 1
+
+    def add(self, duration):
+        """
+        Add `duration` to the durations of the selected setting.
+        """
+        self.durations[self.setting].append(duration)
+
+        self.n_unsaved += 1
+        if self.n_unsaved >= self.SAVE_INTERVAL:
+            self.save()
+
+    @property
+    def is_trained(self):
+        return len(self.durations.get(self.setting, ())) >= self.min_samples
+
+    @property
+    def arm_delay(self):
+        """
+        Time in seconds to wait after starting the motor before arming the sensor.
+        """
+        if not self.is_trained:
+            return self.default_arm_delay
+        return self.ARM_FRACTION * self.quantile(self.ARM_QUANTILE)
+
+    @property
+    def deadline(self):
+        """
+        Time in seconds after starting the motor by which the sensor must have been
+        triggered.
+        """
+        if not self.is_trained:
+            return self.widening * (self.default_arm_delay + self.default_timeout)
+
+        durations = self.durations[self.setting]
+        median = statistics.median(durations)
+        mad = statistics.median(abs(duration - median) for duration in durations)
+        deadline = max(
+            self.DEADLINE_MARGIN * self.quantile(self.DEADLINE_QUANTILE),
+            median + max(self.DEADLINE_MADS * 1.4826 * mad, self.MIN_MARGIN),
+        )
+        return self.widening * deadline
+
+    @property
+    def widening(self):
+        """
+        Factor the deadline is widened by after the timeouts since the last successful
+        advance.
+        """
+        return min(1 + self.WIDENING_STEP * self.n_timeouts, self.MAX_WIDENING)
+
+    @property
+    def timeout(self):
+        """
+        Time in seconds to wait for the sensor after arming it.
+        """
+        return self.deadline - self.arm_delay
+
+    def quantile(self, q):
+        """
+        Empirical `q`-quantile of the durations of the selected setting.
+        """
+        durations = sorted(self.durations[self.setting])
+        return durations[min(int(q * len(durations)), len(durations) - 1)]
+
+    def load(self):
+        """
+        Load learned durations from the JSON file, if it exists.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            state = json.load(f)
+        self.durations = {
+            setting: deque(durations, maxlen=self.window)
+            for setting, durations in state.items()
+        }
+
+    def save(self):
+        """
+        Persist the learned durations to the JSON file.
+        """
+        state = {setting: list(d) for setting, d in self.durations.items()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self.n_unsaved = 0
+
+    @property
+    def stats(self):
+        return {
+            "samples": len(self.durations.get(self.setting, ())),
+            "timeouts": self.n_timeouts,
+            "arm_delay": round(self.arm_delay, 3),
+            "timeout": round(self.timeout, 3),
+        }
@@ -0,0 +1,101 @@
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# The raw data appended to a JPEG by the HQ camera's firmware starts with a header of
+# this size, followed by the 12-bit packed sensor data
+HEADER_SIZE = 32768
+HEADER_OFFSET = 176  # Offset of the Broadcom raw header within the header block
+HEADER = struct.Struct("<32sHHHH24xHHBB")
+
+# Size of the raw block of the HQ camera, i.e. its offset from the end of a capture
+RAW_OFFSET = 18711040
+
+BAYER_ORDERS = {0: "RGGB", 1: "GBRG", 2: "BGGR", 3: "GRBG"}
+
+BayerLayout = namedtuple(
+    "BayerLayout", ["width", "height", "stride", "n_rows", "bayer_order"]
+)
+
+
+def read_layout(raw):
+    """
+    Read the layout of the sensor data from the header of a raw block, i.e. the bytes
+    the camera appends to a JPEG when capturing with `bayer=True`.
+
+    Returns
+    -------
+    layout : BayerLayout
+        Width and height of the image in pixels, number of bytes per row and number of
+        rows in the (padded) sensor data as well as the Bayer order as a string, e.g.
+        `"BGGR"`.
+    """
+    raw = memoryview(raw)
+    if raw[:4] != b"BRCM":
+        raise ValueError("Raw block does not start with a BRCM header")
+
+    _, width, height, _, _, _, _, bayer_order, _ = HEADER.unpack_from(
+        raw, HEADER_OFFSET
+    )
+    # Rows are padded to a multiple of 32 bytes and the height to a multiple of 16 rows
+    # plus 16 rows
+    stride = (width * 12 // 8 + 31) // 32 * 32
+    n_rows = (height + 16) // 16 * 16
+
+    return BayerLayout(width, height, stride, n_rows, BAYER_ORDERS[bayer_order])
+
+
+def sensor_data(raw, layout=None):
+    """
+    View of the packed sensor data of a raw block as a 2D `uint8` array of `n_rows`
+    rows of `stride` bytes. Every three bytes of a row hold two 12-bit pixels: the high
+    8 bits of the first pixel, the high 8 bits of the second pixel and the low 4 bits of
+    both.
+    """
+    if layout is None:
+        layout = read_layout(raw)
+    data = np.frombuffer(
+        raw, dtype=np.uint8, count=layout.n_rows * layout.stride, offset=HEADER_SIZE
+    )
+    return data.reshape(layout.n_rows, layout.stride)
+
+
+def unpack(data, width):
+    """
+    Unpack 12-bit packed sensor data, given as a 2D `uint8` array of rows of at least
+    `width * 3 // 2` bytes, into a `uint16` array of `width` pixels per row.
+    """
+    data = data[:, : width * 3 // 2].reshape(len(data), -1, 3).astype(np.uint16)
+    pixels = np.empty((len(data), width), dtype=np.uint16)
+    pixels[:, 0::2] = (data[:, :, 0] << 4) | (data[:, :, 2] & 0xF)
+    pixels[:, 1::2] = (data[:, :, 1] << 4) | (data[:, :, 2] >> 4)
+    return pixels
+
+
+def msb_planes(raw, step=16, layout=None):
+    """
+    Subsampled copy of the high 8 bits of the pixels of a raw block, taking every
+    `step`-th pixel (`step` must be even) of each of the four Bayer positions. Useful
+    for cheap statistics of a frame without unpacking the sensor data.
+
+    Returns
+    -------
+    planes : numpy.ndarray
+        `uint8` array of shape `(4, height // step, width // step)` holding the
+        positions `(0, 0)`, `(0, 1)`, `(1, 0)` and `(1, 1)` of the Bayer pattern.
+    """
+    if layout is None:
+        layout = read_layout(raw)
+    data = sensor_data(raw, layout)
+
+    n_rows = layout.height // step
+    n_columns = layout.width // step
+    byte_step = 3 * (step // 2)
+    return np.stack(
+        [
+            data[row : n_rows * step : step, column::byte_step][:, :n_columns]
+            for row in (0, 1)
+            for column in (0, 1)
+        ]
+    )
@@ -0,0 +1,121 @@
+import queue
+from threading import Lock
+
+
+class FrameBuffer:
+    """
+    Preallocated buffer that a frame is captured into. It behaves like a writable file
+    object, such that the camera can capture into it directly, and hands out its
+    contents as `memoryview` slices without copying them.
+
+    Buffers are reference counted. Every user of a buffer that may outlive the scan loop
+    iteration it was captured in calls `retain` and later `release`. Once the last
+    reference is released, the buffer is returned to its pool.
+
+    Parameters
+    ----------
+    pool : FrameBufferPool
+        Pool that the buffer is returned to once it is released.
+    capacity : int
+        Number of bytes to preallocate.
+    """
+
+    def __init__(self, pool, capacity):
+        self.pool = pool
+        self.data = bytearray(capacity)
+        self.length = 0
+
+        self.references = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return self.length
+
+    def write(self, b):
+        """
+        Append `b` to the buffer. Grows the buffer if the preallocated capacity is
+        exceeded.
+        """
+        b = memoryview(b).cast("B")
+        end = self.length + len(b)
+        if end > len(self.data):
+            # Allocate anew rather than resizing, as views of the old data may still
+            # be held elsewhere.
+            data = bytearray(max(end, 2 * len(self.data)))
+            data[: self.length] = self.data[: self.length]
+            self.data = data
+        self.data[self.length : end] = b
+        self.length = end
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def view(self, start=0, stop=None):
+        """
+        Get a `memoryview` of the captured bytes without copying them.
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        return memoryview(self.data)[start:stop]
+
+    def retain(self):
+        """
+        Add a reference to the buffer.
+        """
+        with self.lock:
+            self.references += 1
+
+    def release(self):
+        """
+        Remove a reference to the buffer. Returns the buffer to its pool when no
+        references remain.
+        """
+        with self.lock:
+            self.references -= 1
+            is_free = self.references == 0
+        if is_free:
+            self.pool.put_back(self)
+
+
+class FrameBufferPool:
+    """
+    Pool of preallocated and recycled `FrameBuffer` objects, avoiding the allocation of
+    tens of MB of memory for every captured frame.
+
+    Parameters
+    ----------
+    n_buffers : int
+        Number of buffers in the pool. Acquiring a buffer blocks while all of them are
+        in use.
+    capacity : int
+        Number of bytes preallocated for each buffer.
+    """
+
+    def __init__(self, n_buffers, capacity):
+        self.n_buffers = n_buffers
+        self.capacity = capacity
+
+        # A FIFO queue makes sure that a released buffer is reused as late as possible
+        self.free = queue.Queue()
+        for _ in range(n_buffers):
+            self.free.put(FrameBuffer(self, capacity))
+
+    def acquire(self):
+        """
+        Get an empty buffer from the pool holding a single reference. Blocks until a
+        buffer is available.
+        """
+        buffer = self.free.get()
+        buffer.length = 0
+        buffer.references = 1
+        return buffer
+
+    def put_back(self, buffer):
+        """
+        Return a buffer to the pool. Called by `FrameBuffer.release`.
+        """
+        self.free.put(buffer)
+
+    @property
+    def n_free(self):
+        return self.free.qsize()
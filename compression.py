@@ -0,0 +1,190 @@
+import logging
+import time
+from threading import Lock
+
+import numpy as np
+
+import rawfile
+
+logger = logging.getLogger("filmscanner.compression")
+
+TEMPERATURE_PATH = "/sys/class/thermal/thermal_zone0/temp"
+
+
+class FrameCompressor:
+    """
+    Lossless compression of raw frames (see `rawfile.encode`) on the writer threads of
+    the write queue. Both NumPy and zlib release the GIL while working on large
+    arrays, so the writer threads compress frames in parallel on separate cores. The
+    compression level adapts to how full the write queue is and to the CPU
+    temperature, so that compressing never holds up the scan more than writing
+    uncompressed frames would:
+
+    - While the write queue holds less than `low_water` of its budget, frames are
+      compressed at `max_level`, which also finds the repeated strings in the flat
+      parts of a frame, such as the dark surround of the film gate.
+    - Above that, they are compressed at level 1, which is several times faster and
+      compresses noisy sensor data almost as well.
+    - Above `high_water` or once the CPU reaches `max_temperature`, frames are written
+      uncompressed. Within 5 °C of `max_temperature`, level 1 is used at most.
+
+    Every compressed frame is decompressed again and compared with the original
+    before it is written, unless `verify` is set to `False`. Frames that fail this
+    check are written uncompressed, as are frames that do not get any smaller.
+
+    Parameters
+    ----------
+    write_queue : WriteBehindQueue
+        Write queue whose fill level the compression level adapts to.
+    max_level : int, optional
+        Highest zlib compression level to use while the write queue is nearly empty.
+    low_water : float, optional
+        Fraction of the write queue's budget below which `max_level` is used.
+    high_water : float, optional
+        Fraction of the write queue's budget above which frames are not compressed.
+    max_temperature : float, optional
+        CPU temperature in °C above which frames are not compressed.
+    verify : bool, optional
+        Whether to check that every compressed frame decompresses to the original.
+    """
+
+    def __init__(
+        self,
+        write_queue,
+        max_level=6,
+        low_water=0.25,
+        high_water=0.75,
+        max_temperature=75.0,
+        verify=True,
+    ):
+        self.write_queue = write_queue
+        self.max_level = max_level
+        self.low_water = low_water
+        self.high_water = high_water
+        self.max_temperature = max_temperature
+        self.verify = verify
+
+        self.lock = Lock()
+        self.temperature = None
+        self.t_temperature = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Reset the statistics, e.g. at the start of a new reel.
+        """
+        with self.lock:
+            self.n_compressed = 0
+            self.n_uncompressed = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.compress_time = 0.0
+            self.level = self.max_level
+
+    def compress(self, data):
+        """
+        Compress packed sensor data at the current adaptive level. Suitable as the
+        `compress` argument of `rawfile.write`.
+
+        Returns
+        -------
+        payload : bytes
+            Compressed data, or `None` if the data should be written uncompressed.
+        """
+        level = self.select_level()
+        with self.lock:
+            self.level = level
+
+        if level == 0:
+            with self.lock:
+                self.n_uncompressed += 1
+            return None
+
+        t_start = time.perf_counter()
+        payload = rawfile.encode(data, level)
+        is_mismatch = self.verify and not is_identical(payload, data)
+        if is_mismatch or len(payload) >= data.nbytes:
+            payload = None
+        duration = time.perf_counter() - t_start
+
+        with self.lock:
+            if is_mismatch:
+                logger.error("Compressed frame did not match the original")
+            if payload is None:
+                self.n_uncompressed += 1
+            else:
+                self.n_compressed += 1
+                self.bytes_in += data.nbytes
+                self.bytes_out += len(payload)
+                self.compress_time += duration
+
+        return payload
+
+    def select_level(self):
+        """
+        Compression level for the next frame given the write queue's fill level and the
+        CPU temperature. Level 0 means not to compress.
+        """
+        fill = self.write_queue.bytes_pending / self.write_queue.budget
+        temperature = self.cpu_temperature()
+
+        if fill >= self.high_water:
+            return 0
+        if temperature is not None and temperature >= self.max_temperature:
+            return 0
+        if fill >= self.low_water:
+            return 1
+        if temperature is not None and temperature >= self.max_temperature - 5:
+            return 1
+        return self.max_level
+
+    def cpu_temperature(self):
+        """
+        CPU temperature in °C, read at most once per second, or `None` if it cannot be
+        read.
+        """
+        now = time.monotonic()
+        if now - self.t_temperature >= 1:
+            self.t_temperature = now
+            try:
+                with open(TEMPERATURE_PATH) as f:
+                    self.temperature = int(f.read()) / 1000
+            except (OSError, ValueError):
+                self.temperature = None
+        return self.temperature
+
+    def log_stats(self):
+        """
+        Log the compression ratio and throughput.
+        """
+        stats = self.stats
+        logger.info(
+            f"Compressed {stats['compressed']} frames"
+            f" ({stats['uncompressed']} uncompressed) / ratio={stats['ratio']:.2f}"
+            f" / throughput={stats['mb_per_s']:.1f} MB/s"
+        )
+
+    @property
+    def stats(self):
+        with self.lock:
+            ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+            # Throughput of a single writer thread
+            throughput = (
+                self.bytes_in / self.compress_time if self.compress_time else 0.0
+            )
+            return {
+                "level": self.level,
+                "compressed": self.n_compressed,
+                "uncompressed": self.n_uncompressed,
+                "ratio": round(ratio, 2),
+                "mb_per_s": round(throughput / 1e6, 1),
+            }
+
+
+def is_identical(payload, data):
+    """
+    Check that `payload` compressed with `rawfile.encode` decompresses to the packed
+    sensor `data`.
+    """
+    height, row_bytes = data.shape
+    return np.array_equal(rawfile.decode(payload, height, row_bytes * 2 // 3), data)
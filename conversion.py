@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+from dngconverter import clear_caches, find_tasks, is_valid_dng
+
+logger = logging.getLogger("filmscanner.conversion")
+
+
+class ConversionScheduler:
+    """
+    Converts the frames of finished scans to DNGs on the scanner in the background (see
+    `dngconverter.py`), such that the Pi does not sit idle between reels. Reels are
+    converted as jobs one after the other, one frame at a time, on a single thread
+    running at the lowest CPU priority. Before every frame, the job checks `is_busy`
+    and pauses while the scanner is busy, e.g. scanning, showing the liveview or
+    fast-forwarding, and for `idle_delay` seconds after, so that at most the frame
+    being converted when a scan starts competes with it.
+
+    Jobs and their progress are checkpointed to a JSON file, so they continue where
+    they left off after a restart. Frames that already have a complete DNG are
+    skipped. A job fails if less than `min_free_space` bytes of storage would be left
+    for scans.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file the jobs are persisted to.
+    is_busy : function
+        Function returning `True` while the scanner is busy.
+    on_progress : function, optional
+        Called without arguments whenever a job converted a frame or changed its state.
+    idle_delay : float, optional
+        Seconds the scanner needs to be idle before a paused job continues.
+    checkpoint_interval : int, optional
+        Number of frames after which a job's progress is checkpointed.
+    min_free_space : int, optional
+        Bytes of storage to leave free in the directory of a reel.
+    """
+
+    def __init__(
+        self,
+        path,
+        is_busy,
+        on_progress=None,
+        idle_delay=10.0,
+        checkpoint_interval=25,
+        min_free_space=20_000_000_000,
+    ):
+        self.path = path
+        self.is_busy = is_busy
+        self.on_progress = on_progress if on_progress is not None else lambda: None
+        self.idle_delay = idle_delay
+        self.checkpoint_interval = checkpoint_interval
+        self.min_free_space = min_free_space
+
+        self.lock = Lock()
+        self.jobs_event = Event()
+        self.jobs = []
+        self.t_frames = []
+
+        self.load()
+        # Jobs interrupted by a restart continue from their checkpoint
+        for job in self.jobs:
+            if job["state"] in ("running", "paused"):
+                job["state"] = "queued"
+        if self.jobs:
+            self.jobs_event.set()
+
+        self.thread = Thread(target=self.run, name="conversion", daemon=True)
+
+    def start(self):
+        """
+        Start running queued jobs in the background.
+        """
+        self.thread.start()
+
+    def submit(self, directory):
+        """
+        Queue a job converting the frames of the scan in `directory`, unless one is
+        queued or running already. A failed job is queued again from its checkpoint.
+        """
+        directory = os.path.abspath(directory)
+        with self.lock:
+            job = next(
+                (
+                    job
+                    for job in self.jobs
+                    if job["directory"] == directory and job["state"] != "done"
+                ),
+                None,
+            )
+            if job is not None and job["state"] != "failed":
+                return
+            elif job is not None:
+                job["state"] = "queued"
+                job["error"] = None
+            else:
+                self.jobs.append(
+                    {
+                        "directory": directory,
+                        "state": "queued",
+                        "frames": 0,
+                        "converted": 0,
+                        "failed": 0,
+                        "next": 0,
+                        "error": None,
+                    }
+                )
+        logger.info(f'Queued conversion of "{directory}"')
+        self.save()
+        self.jobs_event.set()
+        self.on_progress()
+
+    def run(self):
+        """
+        Loop running queued jobs one after the other.
+        """
+        try:
+            # On Linux, this lowers the priority of only this thread, not the server's
+            os.setpriority(os.PRIO_PROCESS, 0, 19)
+        except (AttributeError, OSError):
+            pass
+
+        while True:
+            with self.lock:
+                job = next((job for job in self.jobs if job["state"] == "queued"), None)
+            if job is None:
+                self.jobs_event.wait()
+                self.jobs_event.clear()
+                continue
+
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logger.error(f'Conversion of "{job["directory"]}" failed: {e}')
+                self.set_state(job, "failed", error=str(e))
+
+    def run_job(self, job):
+        """
+        Convert the frames of `job`, starting at its checkpoint.
+        """
+        directory = Path(job["directory"])
+        tasks = find_tasks(directory, delete=False, skip_blank=False)
+        with self.lock:
+            job["frames"] = len(tasks)
+        self.set_state(job, "running")
+        logger.info(f'Converting "{directory}" from frame {job["next"]}')
+
+        try:
+            for i in range(job["next"], len(tasks)):
+                self.wait_until_idle(job)
+                if shutil.disk_usage(directory).free < self.min_free_space:
+                    raise RuntimeError("Not enough free space left")
+
+                task = tasks[i]
+                is_converted = True
+                if not is_valid_dng(task.dng_path):
+                    try:
+                        task.convert(*task.args)
+                    except Exception as e:
+                        logger.error(f'Failed to convert "{task.dng_path}": {e}')
+                        is_converted = False
+
+                with self.lock:
+                    job["next"] = i + 1
+                    job["converted" if is_converted else "failed"] += 1
+                    self.t_frames = (self.t_frames + [time.monotonic()])[-16:]
+                if job["next"] % self.checkpoint_interval == 0:
+                    self.save()
+                self.on_progress()
+        finally:
+            # Frames may be added to the reel before it is converted again
+            clear_caches()
+
+        logger.info(
+            f'Converted "{directory}" ({job["converted"]} frames, {job["failed"]}'
+            " failed)"
+        )
+        with self.lock:
+            self.t_frames = []
+        self.set_state(job, "done")
+
+    def wait_until_idle(self, job):
+        """
+        Pause `job` while the scanner is busy and until it was idle for `idle_delay`
+        seconds.
+        """
+        if not self.is_busy():
+            return
+
+        self.set_state(job, "paused")
+        t_idle = None
+        while t_idle is None or time.monotonic() - t_idle < self.idle_delay:
+            if self.is_busy():
+                t_idle = None
+            elif t_idle is None:
+                t_idle = time.monotonic()
+            time.sleep(0.5)
+        with self.lock:
+            self.t_frames = []
+        self.set_state(job, "running")
+
+    def set_state(self, job, state, error=None):
+        """
+        Set the `state` of `job`, checkpoint it and report the change.
+        """
+        with self.lock:
+            job["state"] = state
+            job["error"] = error
+        self.save()
+        self.on_progress()
+
+    def load(self):
+        """
+        Load the jobs from the JSON file, if it exists.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            self.jobs = json.load(f)["jobs"]
+
+    def save(self):
+        """
+        Persist the jobs to the JSON file.
+        """
+        with self.lock:
+            content = json.dumps({"jobs": self.jobs}, indent=4)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def stats(self):
+        with self.lock:
+            job = next(
+                (job for job in self.jobs if job["state"] in ("running", "paused")),
+                None,
+            )
+            n_queued = sum(1 for job in self.jobs if job["state"] == "queued")
+            t_frames = self.t_frames
+            rate = (
+                (len(t_frames) - 1) / (t_frames[-1] - t_frames[0])
+                if len(t_frames) > 1 and t_frames[-1] > t_frames[0]
+                else 0.0
+            )
+            return {
+                "state": job["state"] if job is not None else "idle",
+                "reel": reel_name(job["directory"]) if job is not None else None,
+                "done": job["next"] if job is not None else 0,
+                "frames": job["frames"] if job is not None else 0,
+                "frames_per_s": round(rate, 2),
+                "queued": n_queued,
+            }
+
+
+def reel_name(directory):
+    """
+    Short name of the reel scanned to `directory`, e.g. "reel-03/frames".
+    """
+    path = Path(directory)
+    return str(Path(path.parent.name, path.name))
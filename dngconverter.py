@@ -1,9 +1,37 @@
 import argparse
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
 from pathlib import Path
+from typing import Optional
 
-from pidng.core import RPICAM2DNG
-from tqdm import tqdm
+import bayer
+import rawfile
+from dngwriter import DNGWriter
+from manifest import open_manifest
+from reel import Reel, is_container
+
+# Colour matrices of the HQ camera's sensor, the same that `pidng` writes for JPEGs
+COLOR_MATRIX_1 = [6759, -2379, 751, -4432, 13871, 5465, -401, 1664, 7845]
+COLOR_MATRIX_2 = [5603, -1351, -600, -2872, 11180, 2132, 600, 453, 5821]
+FORWARD_MATRIX_1 = [7889, 1273, 482, 2401, 9705, -2106, -26, -4406, 12683]
+FORWARD_MATRIX_2 = [6591, 3034, 18, 1991, 10585, -2575, -493, -919, 9663]
+
+MIN_DNG_BYTES = int(1e6)
+TIFF_HEADERS = (b"II*\x00", b"MM\x00*")
+
+# Peak memory of a worker process converting a full sensor frame, with some headroom
+WORKER_MEMORY = 300_000_000
+# Number of frames handed to a worker process at once
+CHUNK_SIZE = 4
+
+# Conversion of a single frame by calling `convert(*args)`, which writes `dng_path`
+Task = namedtuple("Task", ["convert", "args", "dng_path"])
 
 
 def bayerjpg2dng(jpg_path: Path, delete: bool = False) -> None:
@@ -11,16 +39,194 @@ def bayerjpg2dng(jpg_path: Path, delete: bool = False) -> None:
     Convert a the file at `jpg_path` to a `.dng` file. Deletes the old file if `delete`
     is set to `True`.
     """
-    d = RPICAM2DNG()
-    d.convert(str(jpg_path))
+    with open(jpg_path, "rb") as f:
+        jpg = f.read()
 
     dng_path = jpg_path.with_suffix(".dng")
-    validate_file(dng_path, min_bytes=int(1e6))
+    write_jpeg_dng(jpg, dng_path)
+    validate_file(dng_path, min_bytes=MIN_DNG_BYTES)
 
     if delete:
         jpg_path.unlink()
 
 
+def raw2dng(raw_path: Path, delete: bool = False) -> None:
+    """
+    Convert the raw file at `raw_path` (see `rawfile.py`) to a `.dng` file of the size
+    of its possibly cropped sensor data, using the camera settings saved to
+    `capture.json` in the same directory during the scan.
+    Deletes the old file if `delete` is set to `True`.
+    """
+    dng_path = raw_path.with_suffix(".dng")
+    write_raw_dng(rawfile.read(raw_path), dng_path)
+    validate_file(dng_path, min_bytes=MIN_DNG_BYTES)
+
+    if delete:
+        raw_path.unlink()
+
+
+def reel2dng(directory: Path, index: int) -> None:
+    """
+    Convert the frame at `index` of the reel container in `directory` (see `reel.py`)
+    to a `.dng` file in `directory`.
+    """
+    frames = open_reel(directory)
+    dng_path = directory / f"frame-{index:05d}.dng"
+
+    if frames.records[index].suffix == "raw":
+        write_raw_dng(rawfile.parse(frames[index]), dng_path)
+    else:
+        write_jpeg_dng(frames[index], dng_path)
+
+    validate_file(dng_path, min_bytes=MIN_DNG_BYTES)
+
+
+# Reel containers opened by `open_reel`, kept open until `clear_caches` is called
+open_reels = {}
+
+
+def open_reel(directory: Path) -> Reel:
+    """Open the reel container in `directory` once per worker process."""
+    if directory not in open_reels:
+        open_reels[directory] = Reel(directory)
+    return open_reels[directory]
+
+
+def clear_caches() -> None:
+    """
+    Close the reel containers and drop the converters cached by `open_reel`,
+    `dng_writer` and `jpeg_converter`, such that frames and camera settings saved to a
+    directory later, e.g. by resuming its scan, are picked up when it is converted
+    again.
+    """
+    for reel in open_reels.values():
+        reel.close()
+    open_reels.clear()
+    dng_writer.cache_clear()
+    jpeg_converter.cache_clear()
+
+
+@lru_cache()
+def jpeg_converter() -> "RPICAM2DNG":
+    """Converter for Bayer JPEGs, created once per worker process."""
+    # Only needed for old scans, so the scanner does not need `pidng` to import this
+    from pidng.core import RPICAM2DNG
+
+    return RPICAM2DNG()
+
+
+def write_raw_dng(frame: rawfile.RawFrame, dng_path: Path) -> None:
+    """
+    Write a frame read with `rawfile` to a `.dng` file at `dng_path`, using the camera
+    settings in `capture.json` in the same directory.
+    """
+    writer = dng_writer(dng_path.parent, frame.width, frame.height, frame.bayer_order)
+
+    # Written to a temporary file first, such that only complete DNGs get their name
+    tmp_path = dng_path.with_suffix(".tmp.dng")
+    with open(tmp_path, "wb") as f:
+        writer.write(f, frame.data)
+    os.replace(tmp_path, dng_path)
+
+
+def write_jpeg_dng(jpg: bytes, dng_path: Path) -> None:
+    """
+    Write the raw bayer data appended to the JPEG `jpg` to a `.dng` file at
+    `dng_path`. If the scan saved its camera settings to `capture.json` in the same
+    directory, the raw block is sliced off the end of the JPEG and written like a raw
+    file. Otherwise `pidng` converts the JPEG, reading the settings from its EXIF data.
+    """
+    if (dng_path.parent / "capture.json").is_file():
+        raw = memoryview(jpg)[-bayer.RAW_OFFSET :]
+        layout = bayer.read_layout(raw)
+        data = bayer.sensor_data(raw, layout)[: layout.height]
+        frame = rawfile.RawFrame(
+            layout.width, layout.height, layout.bayer_order, data, 0, 0
+        )
+        write_raw_dng(frame, dng_path)
+    else:
+        # Given a stream rather than a path, `pidng` returns the DNG instead of writing
+        write_file(dng_path, jpeg_converter().convert(BytesIO(jpg)))
+
+
+@lru_cache()
+def dng_writer(directory: Path, width: int, height: int, bayer_order: str) -> DNGWriter:
+    """
+    DNG writer for the frames in `directory` with the given image size and Bayer
+    order, created once per reel and worker process.
+    """
+    return DNGWriter(dng_tags(directory, width, height, bayer_order))
+
+
+def dng_tags(directory: Path, width: int, height: int, bayer_order: str) -> dict:
+    """
+    DNG tags for the frames in `directory` with the given image size and Bayer order,
+    built from the camera settings in the directory's `capture.json`.
+    """
+    with open(directory / "capture.json") as f:
+        settings = json.load(f)
+    gain_r, gain_b = settings["awb_gains"]
+
+    return {
+        "ImageWidth": width,
+        "ImageLength": height,
+        "TileWidth": width,
+        "TileLength": height,
+        "Orientation": 1,
+        "PhotometricInterpretation": 32803,
+        "SamplesPerPixel": 1,
+        "BitsPerSample": 12,
+        "CFARepeatPatternDim": [2, 2],
+        "CFAPattern": ["RGB".index(color) for color in bayer_order],
+        "BlackLevel": 256,
+        "WhiteLevel": 4095,
+        "ColorMatrix1": [[value, 10000] for value in COLOR_MATRIX_1],
+        "ColorMatrix2": [[value, 10000] for value in COLOR_MATRIX_2],
+        "ForwardMatrix1": [[value, 10000] for value in FORWARD_MATRIX_1],
+        "ForwardMatrix2": [[value, 10000] for value in FORWARD_MATRIX_2],
+        "CalibrationIlluminant1": 17,
+        "CalibrationIlluminant2": 21,
+        "AsShotNeutral": [
+            [1000, int(gain_r * 1000)],
+            [1000, 1000],
+            [1000, int(gain_b * 1000)],
+        ],
+        "Make": "RaspberryPi",
+        "Model": settings["model"],
+        "UniqueCameraModel": "Raspberry Pi High Quality Camera",
+        "DNGVersion": [1, 4, 0, 0],
+        "DNGBackwardVersion": [1, 2, 0, 0],
+        "ProfileName": "Repro 2_5D no LUT - D65 is really 5960K",
+        "ProfileEmbedPolicy": 3,
+        "DefaultBlackRender": 0,
+        "PreviewColorSpace": 2,
+    }
+
+
+def write_file(path: Path, data: bytes) -> None:
+    """
+    Write `data` to a temporary file and rename it to `path` once it is complete.
+    """
+    tmp_path = path.with_suffix(".tmp" + path.suffix)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def is_valid_dng(path: Path) -> bool:
+    """
+    Check if there is a complete DNG at `path`. DNGs only get their name once they were
+    written completely, so checking the size and the TIFF header is enough.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(len(TIFF_HEADERS[0]))
+        size = path.stat().st_size
+    except OSError:
+        return False
+    return header in TIFF_HEADERS and size > MIN_DNG_BYTES
+
+
 def validate_file(path: Path, min_bytes: int = 1) -> None:
     """Check if file exists and has a file size larger than `min_bytes`."""
     is_valid = path.is_file() and path.stat().st_size > min_bytes
@@ -35,34 +241,192 @@ class InvalidFileException(Exception):
         super().__init__(f'File "{filepath}" is invalid.')
 
 
+def find_tasks(directory: Path, delete: bool, skip_blank: bool) -> list:
+    """
+    Conversion tasks for all frames of the scan in `directory`. Deletes the original
+    files once converted if `delete` is set and leaves out the frames the scan's
+    manifest marks as blank if `skip_blank` is set.
+    """
+    # Take the saved frames from the manifest if the scan has one, which is much faster
+    # than listing the directory
+    manifest = open_manifest(directory)
+    saved_frames = None
+    if manifest is not None:
+        where = "path IS NOT NULL"
+        if skip_blank:
+            where += " AND is_blank IS NOT 1"
+        saved_frames = manifest.frames(where)
+        manifest.close()
+    elif skip_blank:
+        raise SystemExit(f'No manifest found in "{directory}" to skip blank frames')
+
+    if is_container(directory):
+        # Frames cannot be deleted from a container one by one
+        if saved_frames is not None:
+            indices = [frame["frame_index"] for frame in saved_frames]
+        else:
+            reel = Reel(directory)
+            indices = reel.indices
+            reel.close()
+        return [
+            Task(reel2dng, (directory, index), directory / f"frame-{index:05d}.dng")
+            for index in indices
+        ]
+
+    if saved_frames is not None:
+        filepaths = [directory / frame["path"] for frame in saved_frames]
+    else:
+        filepaths = sorted(directory.glob("frame-*.jpg")) + sorted(
+            directory.glob("frame-*.raw")
+        )
+    return [
+        Task(
+            raw2dng if path.suffix == ".raw" else bayerjpg2dng,
+            (path, delete),
+            path.with_suffix(".dng"),
+        )
+        for path in filepaths
+    ]
+
+
+def convert_chunk(tasks: list) -> list:
+    """
+    Run a chunk of conversion `tasks` in a worker process. Returns the `dng_path` and
+    error message of every task that failed, such that a single broken frame does not
+    stop the conversion of all others.
+    """
+    failures = []
+    for task in tasks:
+        try:
+            task.convert(*task.args)
+        except Exception as e:
+            failures.append((task.dng_path, str(e)))
+    return failures
+
+
+def convert(tasks: list, jobs: int) -> list:
+    """
+    Run the conversion `tasks` on `jobs` worker processes and show the progress with
+    the frames converted per second and the remaining time. Tasks are handed out in
+    chunks of `CHUNK_SIZE` and at most two chunks per worker are queued at a time, so
+    memory use does not grow with the number of frames. Returns the failures of all
+    tasks (see `convert_chunk`).
+    """
+    # Only needed on the command line, so the scanner does not need `tqdm`
+    from tqdm import tqdm
+
+    chunks = (tasks[i : i + CHUNK_SIZE] for i in range(0, len(tasks), CHUNK_SIZE))
+    failures = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor, tqdm(
+        total=len(tasks), unit="frame"
+    ) as pbar:
+        pending = {
+            executor.submit(convert_chunk, chunk): len(chunk)
+            for chunk in islice(chunks, 2 * jobs)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pbar.update(pending.pop(future))
+                failures += future.result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending[executor.submit(convert_chunk, chunk)] = len(chunk)
+    return failures
+
+
+def default_jobs() -> int:
+    """
+    Number of worker processes to run, one per CPU core as long as the available
+    memory allows.
+    """
+    n_cores = os.cpu_count() or 1
+    memory = available_memory()
+    if memory is None:
+        return n_cores
+    return max(1, min(n_cores, memory // WORKER_MEMORY))
+
+
+def available_memory() -> Optional[int]:
+    """
+    Memory available to new processes in bytes, or `None` if it cannot be determined.
+    Falls back to half of the physical memory where the available memory is not known,
+    e.g. on macOS.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
 def parse_arguments() -> argparse.Namespace:
     """
     Parse command line arguments to the Pi to DNG conversion utility. Returns the `args`
     object.
     """
     parser = argparse.ArgumentParser(
-        description="Convert Raspberry Pi Bayer JPEGs to DNGs."
+        description="Convert Raspberry Pi Bayer JPEGs and raw files to DNGs."
+    )
+    parser.add_argument(
+        "directories",
+        nargs="+",
+        help="Directories with the JPEG or raw files or a reel container",
     )
-    parser.add_argument("directory", help="Directory with the JPEG files")
     parser.add_argument("--delete", action="store_true")
+    parser.add_argument(
+        "--skip-blank",
+        action="store_true",
+        help="Skip frames the scan's manifest marks as blank",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of worker processes. Defaults to as many as the CPU cores and the"
+        " available memory allow.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip frames that already have a complete DNG, e.g. to continue an"
+        " interrupted conversion",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_arguments()
 
-    directory = Path(args.directory)
-    filepaths = list(directory.glob("frame-*.jpg"))
+    jobs = args.jobs if args.jobs is not None else default_jobs()
 
-    with tqdm(total=len(filepaths)) as pbar:
-        executor = ProcessPoolExecutor(max_workers=2)
-        futures = [
-            executor.submit(bayerjpg2dng, path, delete=args.delete)
-            for path in filepaths
-        ]
-        for future in as_completed(futures):
-            _ = future.result()
-            pbar.update()
+    tasks = []
+    for directory in args.directories:
+        tasks += find_tasks(Path(directory), args.delete, args.skip_blank)
+    n_found = len(tasks)
+    if args.resume:
+        tasks = [task for task in tasks if not is_valid_dng(task.dng_path)]
+    print(
+        f"Converting {len(tasks)} frames ({n_found - len(tasks)} already converted)"
+        f" with {jobs} workers"
+    )
+
+    t_start = time.perf_counter()
+    failures = convert(tasks, jobs)
+    duration = time.perf_counter() - t_start
+
+    n_converted = len(tasks) - len(failures)
+    rate = n_converted / duration if duration > 0 else 0.0
+    print(f"Converted {n_converted} frames in {duration:.0f} s ({rate:.1f} frames/s)")
+    for dng_path, error in failures:
+        print(f'Failed to convert "{dng_path}": {error}')
+    if failures:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import struct
+
+import numpy as np
+
+# TIFF field types
+BYTE = 1
+ASCII = 2
+SHORT = 3
+LONG = 4
+RATIONAL = 5
+SRATIONAL = 10
+
+FORMATS = {BYTE: "B", SHORT: "H", LONG: "L", RATIONAL: "L", SRATIONAL: "l"}
+
+# Tags DNGs can be written with, as their ID and field type
+TAGS = {
+    "NewSubfileType": (254, LONG),
+    "ImageWidth": (256, LONG),
+    "ImageLength": (257, LONG),
+    "BitsPerSample": (258, SHORT),
+    "Compression": (259, SHORT),
+    "PhotometricInterpretation": (262, SHORT),
+    "Make": (271, ASCII),
+    "Model": (272, ASCII),
+    "Orientation": (274, SHORT),
+    "SamplesPerPixel": (277, SHORT),
+    "Software": (305, ASCII),
+    "TileWidth": (322, SHORT),
+    "TileLength": (323, SHORT),
+    "TileOffsets": (324, LONG),
+    "TileByteCounts": (325, LONG),
+    "CFARepeatPatternDim": (33421, SHORT),
+    "CFAPattern": (33422, BYTE),
+    "DNGVersion": (50706, BYTE),
+    "DNGBackwardVersion": (50707, BYTE),
+    "UniqueCameraModel": (50708, ASCII),
+    "BlackLevel": (50714, SHORT),
+    "WhiteLevel": (50717, SHORT),
+    "ColorMatrix1": (50721, SRATIONAL),
+    "ColorMatrix2": (50722, SRATIONAL),
+    "AsShotNeutral": (50728, RATIONAL),
+    "CalibrationIlluminant1": (50778, SHORT),
+    "CalibrationIlluminant2": (50779, SHORT),
+    "ProfileName": (50936, ASCII),
+    "ProfileEmbedPolicy": (50941, LONG),
+    "ForwardMatrix1": (50964, SRATIONAL),
+    "ForwardMatrix2": (50965, SRATIONAL),
+    "PreviewColorSpace": (50970, LONG),
+    "DefaultBlackRender": (51110, LONG),
+}
+
+# The same as `pidng`, such that DNGs are identical to those written with it before
+SOFTWARE = "PyDNG"
+
+TIFF_HEADER = struct.Struct("<2sHI")
+IFD_ENTRY = struct.Struct("<HHI4s")
+
+
+class DNGWriter:
+    """
+    Writer of uncompressed DNGs holding raw sensor data of a fixed size, e.g. all frames
+    of a reel. The header and all tags are laid out once, so writing a frame only
+    repacks its sensor data from the camera's packing to that of DNGs (see `repack`),
+    without unpacking it to 16-bit pixels. The file layout is the same as that of
+    `pidng`'s `RAW2DNG`, so the DNGs are byte for byte identical to those it writes.
+
+    Parameters
+    ----------
+    tags : dict
+        Tags to write, mapping names in `TAGS` to their values, e.g.
+        `{"ImageWidth": 4056, "Make": "RaspberryPi", "ColorMatrix1": [[6759, 10000],
+        ...], ...}`. `ImageWidth`, `ImageLength` and `BitsPerSample` are required.
+        The tags describing the image data's layout and compression are added.
+    """
+
+    def __init__(self, tags):
+        self.width = tags["ImageWidth"]
+        self.height = tags["ImageLength"]
+        self.bits = tags["BitsPerSample"]
+        self.image_size = self.height * self.width * self.bits // 8
+
+        tags = dict(
+            tags,
+            NewSubfileType=0,
+            Compression=1,
+            Software=SOFTWARE,
+            TileOffsets=0,
+            TileByteCounts=self.image_size,
+        )
+        # The image data follows the IFD, whose size does not depend on the offset
+        tags["TileOffsets"] = TIFF_HEADER.size + len(build_ifd(tags))
+        self.header = TIFF_HEADER.pack(b"II", 42, TIFF_HEADER.size) + build_ifd(tags)
+
+    def write(self, f, data):
+        """
+        Write a DNG of the sensor data `data`, a 2D `uint8` array of rows of packed
+        pixels as saved by the camera (see `bayer.sensor_data`), to the file object
+        `f`.
+        """
+        f.write(self.header)
+        f.write(repack(data, self.width, self.bits))
+        f.write(bytes(-self.image_size % 4))
+
+
+def build_ifd(tags):
+    """
+    Image file directory with the given `tags` followed by the values that do not fit
+    into its entries, padded to a multiple of 4 bytes, assuming that it starts right
+    after the TIFF header.
+    """
+    tags = sorted((TAGS[name], value) for name, value in tags.items())
+    entries = bytearray(struct.pack("<H", len(tags)))
+    values = bytearray()
+    values_offset = TIFF_HEADER.size + 2 + len(tags) * IFD_ENTRY.size + 4
+    for (tag_id, type_), value in tags:
+        count, data = encode_value(type_, value)
+        if len(data) <= 4:
+            entries += IFD_ENTRY.pack(tag_id, type_, count, data)
+        else:
+            offset = struct.pack("<I", values_offset + len(values))
+            entries += IFD_ENTRY.pack(tag_id, type_, count, offset)
+            values += data
+    entries += struct.pack("<I", 0)  # No next IFD
+
+    ifd = entries + values
+    return bytes(ifd + bytes(-len(ifd) % 4))
+
+
+def encode_value(type_, value):
+    """
+    Count and bytes of a tag's `value`, padded to a multiple of 4 bytes. Values are
+    strings for ASCII tags, lists of `[numerator, denominator]` pairs for rational
+    tags and numbers or lists of numbers otherwise.
+    """
+    if type_ == ASCII:
+        data = value.encode("ascii") + b"\0"
+        count = len(data)
+    else:
+        if isinstance(value, (int, float)):
+            value = [value]
+        count = len(value)
+        if type_ in (RATIONAL, SRATIONAL):
+            value = [number for pair in value for number in pair]
+        data = struct.pack(f"<{len(value)}{FORMATS[type_]}", *value)
+    return count, data + bytes(-len(data) % 4)
+
+
+def repack(data, width, bits=12):
+    """
+    Repack sensor data, given as a 2D `uint8` array of rows of at least
+    `width * bits // 8` bytes in the camera's (MIPI) packing, into the packing of
+    uncompressed DNGs, where the bits of consecutive pixels follow each other from the
+    most significant bit on. Supports 10 and 12-bit data and shuffles bits within
+    groups of bytes instead of unpacking pixels to 16 bits.
+
+    Returns
+    -------
+    packed : numpy.ndarray
+        Contiguous `uint8` array of `width * bits // 8` bytes per row.
+    """
+    if bits == 12:
+        # Bytes hold the high 8 bits of two pixels and then the low 4 bits of both
+        b = data[:, : width * 3 // 2].reshape(len(data), -1, 3)
+        packed = np.empty(b.shape, dtype=np.uint8)
+        packed[:, :, 0] = b[:, :, 0]
+        packed[:, :, 1] = (b[:, :, 2] << 4) | (b[:, :, 1] >> 4)
+        packed[:, :, 2] = (b[:, :, 1] << 4) | (b[:, :, 2] >> 4)
+    elif bits == 10:
+        # Bytes hold the high 8 bits of four pixels and then the low 2 bits of all
+        b = data[:, : width * 5 // 4].reshape(len(data), -1, 5)
+        low = b[:, :, 4]
+        packed = np.empty(b.shape, dtype=np.uint8)
+        packed[:, :, 0] = b[:, :, 0]
+        packed[:, :, 1] = (low << 6) | (b[:, :, 1] >> 2)
+        packed[:, :, 2] = (b[:, :, 1] << 6) | (low >> 2 & 0b11) << 4 | (b[:, :, 2] >> 4)
+        packed[:, :, 3] = (b[:, :, 2] << 4) | (low >> 4 & 0b11) << 2 | (b[:, :, 3] >> 6)
+        packed[:, :, 4] = (b[:, :, 3] << 2) | (low >> 6)
+    else:
+        raise ValueError(f"Unsupported bit depth {bits}")
+    return packed.reshape(len(data), -1)
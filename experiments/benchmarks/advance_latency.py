@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the latency of the commands issued to the `pigpio` daemon by
+`StepperMotor.start` and `StepperMotor.stop` during a frame advance, comparing cached
+waveforms against rebuilding all waveforms on every ramp. Runs against the stand-in
+daemon in `fake_pigpiod.py`, so no motor is moved.
+
+Run from the repository root with
+
+    python3 experiments/benchmarks/advance_latency.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark advance command latency.")
+    parser.add_argument("--port", type=int, default=8889)
+    parser.add_argument("--latency", type=float, default=100e-6)
+    parser.add_argument("--n", type=int, default=200, help="Number of advances")
+    return parser.parse_args()
+
+
+def benchmark(motor, daemon, n):
+    """
+    Time `n` start/stop command sequences on `motor`. Returns a list of latencies in
+    seconds and the number of daemon commands issued per advance.
+    """
+    motor.enable()
+    daemon.reset_counts()
+    latencies = []
+    for _ in range(n):
+        t_start = time.perf_counter()
+        motor.start(speed=300, acceleration=24)
+        motor.stop(deceleration=24)
+        latencies.append(time.perf_counter() - t_start)
+    motor.disable()
+    return latencies, daemon.n_commands / n
+
+
+def report(name, latencies, commands_per_advance):
+    latencies_ms = sorted(1e3 * latency for latency in latencies)
+    p95 = latencies_ms[int(0.95 * (len(latencies_ms) - 1))]
+    print(
+        f"{name:>9}: mean={statistics.mean(latencies_ms):.2f} ms"
+        f" / stdev={statistics.stdev(latencies_ms):.2f} ms / p95={p95:.2f} ms"
+        f" / commands={commands_per_advance:.0f}"
+    )
+
+
+def main():
+    args = parse_arguments()
+
+    # `pigpio` reads the port when it is imported
+    os.environ["PIGPIO_PORT"] = str(args.port)
+
+    from fake_pigpiod import FakePigpioDaemon
+
+    daemon = FakePigpioDaemon(args.port, latency=args.latency)
+    daemon.start()
+
+    from filmscanner import StepperMotor
+
+    class UncachedStepperMotor(StepperMotor):
+        """Stepper motor rebuilding its waveforms for every ramp."""
+
+        def send_ramp(self, ramp):
+            self.clear_waveforms()
+            super().send_ramp(ramp)
+
+    cached = StepperMotor(16, 21, 20)
+    uncached = UncachedStepperMotor(16, 21, 20)
+
+    print(f"{args.n} advances with {1e6 * args.latency:.0f} us command latency")
+    report("uncached", *benchmark(uncached, daemon, args.n))
+    report("cached", *benchmark(cached, daemon, args.n))
+
+    daemon.shutdown()
+
+
+if __name__ == "__main__":
+    main()
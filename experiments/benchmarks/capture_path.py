@@ -0,0 +1,111 @@
+"""
+Benchmark of the two capture paths of scans: saving the JPEG with the raw bayer data
+appended against raw-only captures, which save only the sensor data as a `.raw` file
+(see `rawfile.py`) and encode a low quality JPEG without thumbnail for the preview.
+Measures the capture latency, the time to write a frame and the bytes written per
+frame. Needs the camera, so run it on the scanner with the server stopped, from the
+repository root with
+
+    python3 experiments/benchmarks/capture_path.py --directory /media/pi/PortableSSD/tmp
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from fractions import Fraction
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from picamerax import PiCamera
+
+import rawfile
+from buffers import FrameBufferPool
+
+RAW_OFFSET = 18711040
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark scan capture paths.")
+    parser.add_argument("--directory", required=True, help="Directory to write to")
+    parser.add_argument("--n", type=int, default=50, help="Number of frames per path")
+    parser.add_argument("--quality", type=int, default=10, help="Raw-only JPEG quality")
+    return parser.parse_args()
+
+
+def benchmark(camera, frame_buffers, directory, n, raw_only, quality):
+    """
+    Capture and save `n` frames. Returns lists of capture and write times in seconds
+    and of the bytes written per frame.
+    """
+    options = {"quality": quality, "thumbnail": None} if raw_only else {}
+    capture_times, write_times, sizes = [], [], []
+    for i in range(n):
+        frame = frame_buffers.acquire()
+
+        t_start = time.perf_counter()
+        camera.capture(frame, format="jpeg", bayer=True, **options)
+        capture_times.append(time.perf_counter() - t_start)
+
+        path = directory / f"frame-{i:05d}.{'raw' if raw_only else 'jpg'}"
+        t_start = time.perf_counter()
+        with open(path, "wb") as f:
+            if raw_only:
+                rawfile.write(f, frame.view(start=len(frame) - RAW_OFFSET))
+            else:
+                f.write(frame.view())
+            f.flush()
+            os.fsync(f.fileno())
+        write_times.append(time.perf_counter() - t_start)
+
+        sizes.append(path.stat().st_size)
+        path.unlink()
+        frame.release()
+
+    return capture_times, write_times, sizes
+
+
+def report(name, capture_times, write_times, sizes):
+    capture_ms = sorted(1e3 * t for t in capture_times)
+    p95 = capture_ms[int(0.95 * (len(capture_ms) - 1))]
+    print(
+        f"{name:>8}: capture mean={statistics.mean(capture_ms):.0f} ms / p95={p95:.0f}"
+        f" ms / write mean={1e3 * statistics.mean(write_times):.0f} ms"
+        f" / bytes={statistics.mean(sizes) / 1e6:.2f} MB"
+    )
+
+
+def main():
+    args = parse_arguments()
+
+    directory = Path(args.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Same settings as `FilmScanner` uses during scans
+    camera = PiCamera(resolution=(400, 300))
+    camera.analog_gain = 1
+    camera.digital_gain = 1
+    camera.shutter_speed = int(1e6 * 1 / 250)
+    camera.awb_mode = "off"
+    camera.awb_gains = (Fraction(513, 256), Fraction(703, 256))
+    camera.vflip = True
+    time.sleep(2)
+
+    frame_buffers = FrameBufferPool(n_buffers=1, capacity=RAW_OFFSET + 1_000_000)
+
+    print(f"{args.n} frames per path written to {directory}")
+    for name, raw_only in (("jpeg+raw", False), ("raw-only", True)):
+        report(
+            name,
+            *benchmark(
+                camera, frame_buffers, directory, args.n, raw_only, args.quality
+            ),
+        )
+
+    camera.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark of writing DNGs with `dngwriter`, which repacks the sensor data in place,
+against `pidng`'s `RAW2DNG`, which unpacks it to 16-bit pixels and packs it again.
+Checks that both write identical files. Converts synthetic full sensor frames unless
+raw files saved by raw-only scans (see `rawfile.py`) are given. Run it from the
+repository root with
+
+    python3 experiments/benchmarks/dng_writer.py --n 20
+    python3 experiments/benchmarks/dng_writer.py /media/pi/PortableSSD/reel/*.raw
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+from pidng.core import RAW2DNG, DNGTags
+from pidng.dng import Tag
+
+import bayer
+import rawfile
+from dngconverter import dng_tags
+from dngwriter import DNGWriter
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark DNG writers.")
+    parser.add_argument("raw_files", nargs="*", help="Raw files to convert")
+    parser.add_argument("--n", type=int, default=10, help="Number of synthetic frames")
+    return parser.parse_args()
+
+
+def synthetic_frames(n):
+    """
+    Frames of random full sensor data of the HQ camera.
+    """
+    rng = np.random.default_rng(0)
+    for _ in range(n):
+        data = rng.integers(0, 256, size=(3040, 4056 * 3 // 2), dtype=np.uint8)
+        yield rawfile.RawFrame(4056, 3040, "BGGR", data, 0, 0)
+
+
+def pidng_tags(tags):
+    """
+    The same tags as `pidng` `DNGTags`.
+    """
+    pidng_tags = DNGTags()
+    for name, value in tags.items():
+        pidng_tags.set(getattr(Tag, name), value)
+    return pidng_tags
+
+
+def write_with_pidng(frame, tags, directory):
+    image = bayer.unpack(frame.data, frame.width)
+    RAW2DNG().convert(image, tags=tags, filename="pidng", path=str(directory))
+    return (directory / "pidng.dng").read_bytes()
+
+
+def write_with_dngwriter(frame, writer):
+    f = io.BytesIO()
+    writer.write(f, frame.data)
+    return f.getvalue()
+
+
+def main():
+    args = parse_arguments()
+
+    directory = Path(tempfile.mkdtemp())
+    with open(directory / "capture.json", "w") as f:
+        json.dump({"model": "RP_imx477", "awb_gains": [1.8, 1.5]}, f)
+
+    if args.raw_files:
+        frames = (rawfile.read(path) for path in args.raw_files)
+    else:
+        frames = synthetic_frames(args.n)
+
+    pidng_times, dngwriter_times = [], []
+    writers = {}
+    for frame in frames:
+        tags = dng_tags(directory, frame.width, frame.height, frame.bayer_order)
+
+        t_start = time.perf_counter()
+        expected = write_with_pidng(frame, pidng_tags(tags), directory)
+        pidng_times.append(time.perf_counter() - t_start)
+
+        t_start = time.perf_counter()
+        key = (frame.width, frame.height, frame.bayer_order)
+        if key not in writers:
+            writers[key] = DNGWriter(tags)
+        dng = write_with_dngwriter(frame, writers[key])
+        dngwriter_times.append(time.perf_counter() - t_start)
+
+        if dng != expected:
+            raise SystemExit("DNGs written by pidng and dngwriter differ")
+
+    pidng_time = statistics.mean(pidng_times)
+    dngwriter_time = statistics.mean(dngwriter_times)
+    print(f"Converted {len(pidng_times)} frames, all identical")
+    print(f"pidng:     {1e3 * pidng_time:.0f} ms per frame")
+    print(f"dngwriter: {1e3 * dngwriter_time:.0f} ms per frame")
+    print(f"Speedup:   {pidng_time / dngwriter_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Stand-in for the `pigpio` daemon speaking its socket protocol, such that code using
+`pigpio.pi` can be exercised and benchmarked without a Raspberry Pi. Every command is
+answered after a configurable latency, emulating the round trip to the real daemon.
+"""
+
+import argparse
+import socketserver
+import struct
+import time
+from threading import Lock, Thread
+
+CMD_WRITE = 4
+CMD_BR1 = 10
+CMD_BC1 = 12
+CMD_BS1 = 14
+CMD_TICK = 16
+CMD_WVCLR = 27
+CMD_PROC = 38
+CMD_PROCP = 45
+CMD_WVCRE = 49
+CMD_NOIB = 99
+
+PI_SCRIPT_HALTED = 1
+
+
+class FakePigpioDaemon(socketserver.ThreadingTCPServer):
+    """
+    Fake `pigpio` daemon.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on.
+    latency : float, optional
+        Time in seconds the daemon takes to answer each command.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, latency=100e-6):
+        super().__init__(("localhost", port), FakePigpioHandler)
+        self.latency = latency
+
+        self.lock = Lock()
+        self.levels = 0
+        self.next_wave_id = 0
+        self.next_script_id = 0
+        self.script_params = {}
+        self.command_counts = {}
+        self.notification_sockets = []
+        self.t_start = time.monotonic()
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        """
+        Thread(target=self.serve_forever, daemon=True).start()
+
+    def tick(self):
+        return int((time.monotonic() - self.t_start) * 1e6) & 0xFFFFFFFF
+
+    def execute(self, cmd, p1, p2, extension):
+        """
+        Execute a command and return its result and any extension bytes to reply with.
+        """
+        with self.lock:
+            self.command_counts[cmd] = self.command_counts.get(cmd, 0) + 1
+
+            if cmd == CMD_WRITE:
+                self.set_level(p1, p2)
+            elif cmd == CMD_BS1:
+                self.levels |= p1
+            elif cmd == CMD_BC1:
+                self.levels &= ~p1
+            elif cmd == CMD_BR1:
+                return self.levels, b""
+            elif cmd == CMD_TICK:
+                return self.tick(), b""
+            elif cmd == CMD_WVCLR:
+                self.next_wave_id = 0
+            elif cmd == CMD_WVCRE:
+                self.next_wave_id += 1
+                return self.next_wave_id - 1, b""
+            elif cmd == CMD_PROC:
+                self.next_script_id += 1
+                return self.next_script_id - 1, b""
+            elif cmd == CMD_PROCP:
+                params = self.script_params.get(p1, [0] * 10)
+                data = struct.pack("11i", PI_SCRIPT_HALTED, *params)
+                return len(data), data
+        return 0, b""
+
+    def set_level(self, gpio, level):
+        if level:
+            self.levels |= 1 << gpio
+        else:
+            self.levels &= ~(1 << gpio)
+
+    def emit_level_change(self, gpio, level):
+        """
+        Change the level of `gpio` and report it to all clients listening for
+        notifications, e.g. to emulate a sensor being triggered.
+        """
+        with self.lock:
+            self.set_level(gpio, level)
+            report = struct.pack("HHII", 0, 0, self.tick(), self.levels)
+            for sock in self.notification_sockets:
+                sock.sendall(report)
+
+    def reset_counts(self):
+        with self.lock:
+            self.command_counts = {}
+
+    @property
+    def n_commands(self):
+        return sum(self.command_counts.values())
+
+
+class FakePigpioHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        daemon = self.server
+        while True:
+            header = self.receive(16)
+            if header is None:
+                break
+            cmd, p1, p2, p3 = struct.unpack("IIII", header)
+            extension = self.receive(p3) if p3 > 0 else b""
+
+            if cmd == CMD_NOIB:
+                # This connection now only carries notifications to the client
+                self.request.sendall(struct.pack("IIIi", cmd, p1, p2, 0))
+                with daemon.lock:
+                    daemon.notification_sockets.append(self.request)
+                while self.receive(16) is not None:
+                    pass
+                with daemon.lock:
+                    daemon.notification_sockets.remove(self.request)
+                break
+
+            time.sleep(daemon.latency)
+            res, data = daemon.execute(cmd, p1, p2, extension)
+            self.request.sendall(struct.pack("IIIi", cmd, p1, p2, res) + data)
+
+    def receive(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run a stand-in pigpio daemon.")
+    parser.add_argument("--port", type=int, default=8889)
+    parser.add_argument("--latency", type=float, default=100e-6)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    FakePigpioDaemon(args.port, latency=args.latency).serve_forever()
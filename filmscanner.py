@@ -1,17 +1,40 @@
+import json
 import logging
 import os
+import statistics
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fractions import Fraction
 from functools import partial
 from io import BytesIO
 from pathlib import Path
-from threading import Event
+from threading import Condition, Event
 
 import pigpio
 from picamerax import PiCamera
 
+import bayer
+from buffers import FrameBufferPool
+from compression import FrameCompressor
+from conversion import ConversionScheduler
+import rawfile
+import telemetry
+from advancescript import AdvanceScript
+from advancetiming import AdvanceTimingController
+from framecheck import BlankFrameClassifier, FrameChecker
+from hardware import GPIOConnection
+from journal import FILENAME as JOURNAL_FILENAME
+from journal import ScanJournal, resume_point
+from manifest import FILENAME as MANIFEST_FILENAME
+from manifest import ChecksumFile, FrameManifest
+from pipeline import ScanPipeline, Stage, WriteBehindQueue
+from recovery import AdvanceRecovery
+from reel import DATA_FILENAME, ReelWriter, parse_frame_name
+from reelposition import ReelPosition
+from roi import RegionOfInterest
+from settle import SettleDetector
 from utils import BaseCallback, CallbackList, Viewer
 
 # Setup logging (to console)
@@ -35,11 +58,12 @@ class FilmScanner:
         if os.system("pigs t > /dev/null 2>&1"):
             os.system("sudo pigpiod -t 0")
             time.sleep(5)
-        self.pi = pigpio.pi()
+        # All hardware components share one connection to the daemon
+        self.pi = GPIOConnection()
 
-        self.light = Light(6)
-        self.motor = StepperMotor(16, 21, 20)
-        self.frame_sensor = HallEffectSensor(26)
+        self.light = Light(6, pi=self.pi)
+        self.motor = StepperMotor(16, 21, 20, pi=self.pi)
+        self.frame_sensor = HallEffectSensor(26, pi=self.pi)
 
         self.camera = PiCamera(resolution=(800, 600))
         self.camera.analog_gain = 1
@@ -51,7 +75,60 @@ class FilmScanner:
         self.camera.vflip = True
         time.sleep(2)
 
-        self.raw_offset = 18711040
+        self.raw_offset = bayer.RAW_OFFSET
+
+        # During raw-only scans, only the raw sensor data is saved. The camera still
+        # encodes a JPEG, but at this low quality and without an EXIF thumbnail, such
+        # that it is only good for the preview.
+        self.raw_only = False
+        self.raw_only_jpeg_quality = 10
+        # Raw-only scans crop the saved sensor data to the film gate
+        self.roi = RegionOfInterest("roi.json")
+        # When set, raw-only scans compress the saved sensor data losslessly
+        self.raw_compression = False
+
+        # When set, scans write all frames into a single container (see `reel.py`)
+        # instead of individual files
+        self.reel_container = False
+        self.reel_writer = None
+
+        # Facts about every frame of the current scan (see `manifest.py`)
+        self.manifest = None
+
+        # How far the current scan got durably, such that it can be resumed after a
+        # crash (see `journal.py`)
+        self.journal = None
+
+        # When set, finished scans are converted to DNGs in the background whenever
+        # the scanner is idle (see `conversion.py`)
+        self.background_conversion = False
+        self.conversion_scheduler = ConversionScheduler(
+            "conversion_jobs.json",
+            is_busy=lambda: (
+                self.is_scanning
+                or self.is_liveview_active
+                or self.is_advancing
+                or self.is_fast_forwarding
+            ),
+            on_progress=lambda: self.callback.on_conversion_progress(),
+        )
+
+        # When set, captures wait for the film to come to rest (with the fixed delays
+        # as a cap) instead of always sleeping for the fixed delays
+        self.settle_detection = True
+        self.settle_detector = SettleDetector(self.camera)
+        self.settle_times = []
+
+        # End the scan after this many consecutive blank frames following frames with
+        # content. Set to `None` to always scan `n_frames`.
+        self.end_of_reel_blank_frames = 24
+        self.blank_classifier = BlankFrameClassifier()
+
+        # Captured frames are compared with the previous one to catch failed advances
+        self.frame_checker = FrameChecker()
+        self.has_scanned_content = False
+        self.n_consecutive_blank = 0
+        self.has_reached_end_of_reel = False
 
         self.is_advancing = False
         self.is_fast_forwarding = False
@@ -68,9 +145,61 @@ class FilmScanner:
         self.zoom_toggled_event = Event()
 
         self.last_steps = 0
+        self.advance_timeline = telemetry.AdvanceTimeline()
+
+        self.advance_speed = 300
+        self.advance_acceleration = 24
+        t_threshold = 0.487 * 1.025  # Measured advance duration at 300 RPM with margin
+        self.advance_timing = AdvanceTimingController(
+            "advance_timing.json",
+            default_arm_delay=t_threshold * 0.25,
+            default_timeout=t_threshold * 0.75,
+        )
+
+        # When set, fast-forwarding runs the motor continuously and counts frame sensor
+        # pulses instead of advancing frame by frame
+        self.continuous_fast_forward = True
+        # RPM, which the motor reaches at 1500 Hz (see `StepperMotor.PWM_FREQUENCIES`)
+        self.fast_forward_speed = 450
+        self.fast_forward_count = 0
+        self.fast_forward_rate = 0.0
+
+        self.reel_position = ReelPosition("reel_position.json")
+        self.recovery = AdvanceRecovery(self, budget=120)
+
+        # Continuous-motion scanning. The speed must leave enough time per frame for
+        # capturing. The phase is the fraction of a frame period after the sensor
+        # pulse at which the exposure should start, and the capture latency the time
+        # from calling `capture` to the start of the exposure.
+        self.continuous_scan_speed = 150  # RPM
+        self.continuous_scan_shutter_speed = int(1e6 * 1 / 1000)  # 1/1000
+        self.continuous_scan_phase = 0.1
+        self.continuous_scan_capture_latency = 0.0
+        self.continuous_scan_max_error = 0.05  # Fraction of a frame period
+        self.continuous_scan_window = 8  # Pulses to predict the frame period from
+        self.capture_timing_errors = deque(maxlen=100)
+        self.n_continuous_counted = 0
+
+        # When set, advances run as a script inside the pigpio daemon
+        self.use_advance_script = False
+        self.advance_script = AdvanceScript(
+            self.pi, self.motor, self.frame_sensor.input_pin
+        )
 
         self.img_stream = BytesIO()
-        self.write_executor = ThreadPoolExecutor(max_workers=1)
+        self.write_queue = WriteBehindQueue(
+            self.save_frame, budget=160_000_000, n_writers=2
+        )
+        # Enough buffers to fill the write queue's budget, plus one being captured into
+        # and one held by the preview
+        frame_capacity = self.raw_offset + 1_000_000
+        self.frame_buffers = FrameBufferPool(
+            n_buffers=self.write_queue.budget // frame_capacity + 2,
+            capacity=frame_capacity,
+        )
+        self.compressor = FrameCompressor(self.write_queue)
+        self.preview_buffer = None
+        self.pipeline = None
 
         self.turn_off_light()
 
@@ -99,6 +228,8 @@ class FilmScanner:
         )
         self.callback.setup(self)
 
+        self.conversion_scheduler.start()
+
     def __del__(self):
         self.turn_off_light()
         self.motor.disable()
@@ -109,13 +240,26 @@ class FilmScanner:
 
         self.pi.stop()
 
-    def start_scan(self, output_directory, n_frames, start_index=0):
+    def start_scan(
+        self,
+        output_directory,
+        n_frames,
+        start_index=0,
+        pipelined=True,
+        continuous=False,
+        raw_only=False,
+        start_position=None,
+        resume=False,
+        reel_container=None,
+    ):
         """
         Start a scan. The arguments are the same as those of `scan`.
         """
         logger.info(
             f"Starting scan (output_directory={output_directory} / frames={n_frames} /"
-            f" start_index={start_index})"
+            f" start_index={start_index} / pipelined={pipelined} /"
+            f" continuous={continuous} / raw_only={raw_only} /"
+            f" start_position={start_position} / resume={resume})"
         )
         self.scan_stop_requested = False
         self.is_scanning = True
@@ -125,9 +269,57 @@ class FilmScanner:
             output_directory=output_directory,
             n_frames=n_frames,
             start_index=start_index,
+            pipelined=pipelined,
+            continuous=continuous,
+            raw_only=raw_only,
+            start_position=start_position,
+            resume=resume,
+            reel_container=reel_container,
         )
         self.scan_started_event.wait()
 
+    def resume_scan(self, output_directory):
+        """
+        Resume the scan in `output_directory` that was interrupted, e.g. by a crash, a
+        power cut or an error, with the same arguments it was started with. The last
+        durable frames in the scan's journal are validated against the manifest and the
+        scan continues at the first frame that is not safely on disk (see
+        `journal.resume_point`). The film is first moved to the reel position that
+        frame was captured at, so the film must not have been re-threaded, or the reel
+        position must have been set to match it again.
+        """
+        journal = ScanJournal(os.path.join(output_directory, JOURNAL_FILENAME))
+        if journal.parameters is None:
+            raise ValueError(f'No scan journal found in "{output_directory}"')
+        if journal.is_complete:
+            raise ValueError(f'The scan in "{output_directory}" is already complete')
+
+        manifest = FrameManifest(os.path.join(output_directory, MANIFEST_FILENAME))
+        try:
+            start_index, start_position = resume_point(
+                output_directory, journal, manifest
+            )
+            # Forget about the frames that will be scanned again
+            manifest.truncate(start_index)
+        finally:
+            manifest.close()
+
+        parameters = dict(journal.parameters, start_index=start_index)
+        if start_index >= parameters["n_frames"]:
+            raise ValueError(f'All frames of "{output_directory}" are already saved')
+
+        logger.info(
+            f"Resuming scan at frame {start_index} (reel position {start_position},"
+            f" currently at {self.reel_position.frame})"
+        )
+        self.start_scan(
+            output_directory,
+            start_position=start_position,
+            resume=True,
+            reel_container=journal.reel_container,
+            **parameters,
+        )
+
     def stop_scan(self):
         """
         Stop a scan prematurely. When called, the scanner will stop once the current
@@ -139,18 +331,83 @@ class FilmScanner:
         self.scan_stop_requested = True
         self.scan_stopped_event.wait()
 
-    def debug_scan(self, output_directory, n_frames=3900, start_index=0):
-        """
-        The same as `scan`, but exceptions are caught and printed to `stdout`.
+    def debug_scan(
+        self,
+        output_directory,
+        n_frames=3900,
+        start_index=0,
+        pipelined=True,
+        continuous=False,
+        raw_only=False,
+        start_position=None,
+        resume=False,
+        reel_container=None,
+    ):
+        """
+        The same as `scan`, but exceptions are caught and logged.
         """
         try:
-            self.scan(output_directory, n_frames, start_index)
+            self.scan(
+                output_directory,
+                n_frames,
+                start_index,
+                pipelined,
+                continuous,
+                raw_only,
+                start_position,
+                resume,
+                reel_container,
+            )
         except Exception as e:
-            print(
-                f"AN ERROR HAS OCURRED: {e}"
-            )  # TODO to logger (and web interface) instead of print
+            logger.error(f"Scan failed at frame {self.current_frame_index}: {e}")
+
+            try:
+                self.clean_up_failed_scan(pipelined)
+            finally:
+                self.scan_stop_requested = False
+                self.is_scanning = False
+                self.last_scan_end_info = "failure"
+                self.scan_stopped_event.set()
+                self.stop_logging_to_output_directory()
+
+    def clean_up_failed_scan(self, pipelined):
+        """
+        Stop the motor and the pipeline and save what can be saved after a scan failed.
+        Every step runs even if an earlier one fails, e.g. because the failure left the
+        hardware or the output directory in a bad state.
+        """
+        steps = []
+        if self.frame_sensor.counting_callback is not None:
+            steps.append(self.stop_continuous_motion)
+        if pipelined and self.pipeline is not None:
+            steps.append(self.stop_pipeline)
+        steps += [
+            self.wait_for_saves,
+            self.close_reel_writer,
+            self.close_manifest,
+            partial(self.close_journal, is_complete=False),
+            self.save_advance_timeline,
+        ]
 
-    def scan(self, output_directory, n_frames=3900, start_index=0):
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                name = getattr(step, "func", step).__name__
+                logger.error(f"Failed to clean up after the scan ({name}): {e}")
+
+    def scan(
+        self,
+        output_directory,
+        n_frames=3900,
+        start_index=0,
+        pipelined=True,
+        continuous=False,
+        raw_only=False,
+        start_position=None,
+        resume=False,
+        reel_container=None,
+    ):
         """
         Scan a film reel frame-by-frame.
 
@@ -168,6 +425,39 @@ class FilmScanner:
         start_index: int, optional
             Frame index at which to start scanning if you are not scanning from the
             beginning. Reduces the number of frames scanning.
+        pipelined : bool, optional
+            When set to `True`, saving, preview extraction and callbacks run in
+            separate pipeline stages, such that the film advance starts as soon as the
+            capture has finished. When set to `False`, all of these run one after the
+            other before each advance.
+        continuous : bool, optional
+            When set to `True`, the motor keeps turning at `continuous_scan_speed` and
+            frames are captured while the film dwells in the gate, timed from the frame
+            sensor's pulses (see `capture_frame_in_motion`). If the timing error of a
+            frame is too large, the scan falls back to stopping for every frame.
+        raw_only : bool, optional
+            When set to `True`, only the raw sensor data of each frame is saved as a
+            `.raw` file (see `rawfile`) instead of the JPEG with the raw data appended.
+            The data is cropped to the region of interest `roi`, if one is set, and
+            compressed if `raw_compression` is set.
+        start_position : int, optional
+            Reel position of the frame at `start_index`. If given, the film is moved
+            there with `seek` before scanning.
+        resume : bool, optional
+            When set to `True`, the scan continues the journaled scan in
+            `output_directory` at `start_index` instead of starting a new journal. Use
+            `resume_scan` to resume an interrupted scan.
+        reel_container : bool, optional
+            When set to `True`, frames are written to a reel container in
+            `output_directory` instead of individual files (see `reel.py`). Defaults to
+            the scanner's `reel_container` setting.
+
+        The camera settings needed to convert the frames to DNGs are saved to
+        `capture.json` in `output_directory`.
+        Facts about every frame, e.g. its capture time, checksum and whether it is
+        blank, are kept in a manifest in `output_directory` (see `manifest.py`). How
+        far the scan got durably is kept in a journal in `output_directory`, such that
+        it can be resumed with `resume_scan` after a crash (see `journal.py`).
         """
         self.last_scan_end_info = "dismissed"
         self.scan_started_event.set()
@@ -177,6 +467,7 @@ class FilmScanner:
         self.output_directory = output_directory
         self.n_frames = n_frames
         self.current_frame_index = 0
+        self.raw_only = raw_only
 
         self.turn_on_light()
 
@@ -186,35 +477,136 @@ class FilmScanner:
             self.stop_liveview()
 
         Path(output_directory).mkdir(parents=True, exist_ok=True)
+        self.manifest = FrameManifest(os.path.join(output_directory, MANIFEST_FILENAME))
+        self.journal = ScanJournal(os.path.join(output_directory, JOURNAL_FILENAME))
 
         self.start_logging_to_output_directory()
+        self.write_queue.reset_stats()
+        self.compressor.reset_stats()
+        self.advance_timeline.clear()
+        self.recovery.reset()
 
         self.camera.resolution = (400, 300)
-
-        time.sleep(5)
+        self.save_capture_settings(continuous)
+        if reel_container is None:
+            reel_container = self.reel_container
+        if reel_container:
+            self.reel_writer = ReelWriter(output_directory)
+
+        if start_position is not None and start_position != self.reel_position.frame:
+            self.seek(start_position)
+            if self.reel_position.frame != start_position:
+                raise RuntimeError(f"Could not move the film to frame {start_position}")
+
+        if resume:
+            self.journal.resume(start_index)
+        else:
+            parameters = {
+                "n_frames": n_frames,
+                "start_index": start_index,
+                "pipelined": pipelined,
+                "continuous": continuous,
+                "raw_only": raw_only,
+            }
+            self.journal.begin(parameters, reel_container, self.reel_position.frame)
+
+        self.wait_for_settle(max_delay=5)
+        self.settle_times.clear()
+
+        if pipelined:
+            self.start_pipeline()
+
+        self.capture_timing_errors.clear()
+        self.frame_checker.reset()
+        self.has_scanned_content = False
+        self.n_consecutive_blank = 0
+        self.has_reached_end_of_reel = False
+        if resume:
+            # Continue the end of reel detection where the interrupted scan left off
+            for frame in self.manifest.frames(f"frame_index < {start_index}"):
+                if frame["is_blank"] == 0:
+                    self.has_scanned_content = True
+                    self.n_consecutive_blank = 0
+                elif frame["is_blank"] == 1 and self.has_scanned_content:
+                    self.n_consecutive_blank += 1
 
         for i in range(start_index, n_frames):
             self.current_frame_index = i
 
-            filename = f"frame-{i:05d}.jpg"
+            filename = f"frame-{i:05d}.{'raw' if raw_only else 'jpg'}"
             filepath = os.path.join(output_directory, filename)
 
-            time.sleep(0.2)
-
-            frame = self.capture_frame()
-            self.wait_for_previous_save()
+            frame = None
+            if continuous and i > start_index:
+                frame = self.capture_frame_in_motion(i - start_index)
+                if frame is None:
+                    logger.warning("Falling back to stop-start scanning")
+                    continuous = False
+                    self.stop_continuous_motion_on(i - start_index)
+            is_captured_in_motion = frame is not None
+            settle_time = None
+            if frame is None:
+                settle_time = self.wait_for_settle(max_delay=0.2)
+                frame = self.capture_frame()
+            self.manifest.update(i, captured_at=time.time(), settle_time=settle_time)
+            frame, planes = self.check_frame(
+                i, frame, can_retry=not is_captured_in_motion
+            )
+            self.manifest.update(i, position=self.reel_position.frame)
             self.submit_save_frame(frame, filepath)
-            self.preview_frame = frame[: -self.raw_offset]  # Cut off the raw bayer data
-            self.callback.on_frame_capture()
+            if pipelined:
+                frame.retain()
+                if not self.pipeline["preview"].put(frame):
+                    frame.release()
+                self.pipeline["classify"].put((i, planes))
+                self.pipeline["callback"].put(i)
+            else:
+                self.publish_preview(frame)
+                self.classify_frame(i, planes)
+                self.callback.on_frame_capture()
+            frame.release()
 
-            self.advance()
+            if not continuous:
+                t_advance = time.perf_counter()
+                self.advance()
+                self.manifest.update(
+                    i, advance_duration=time.perf_counter() - t_advance
+                )
+            elif i == start_index:
+                self.start_continuous_motion()
 
             logger.info(f'Captured "{filepath}"')
 
+            if i % 100 == 99:
+                self.save_advance_timeline()
+
             if self.scan_stop_requested:
                 break
 
+        if continuous:
+            self.stop_continuous_motion()
+        if pipelined:
+            self.stop_pipeline()
+        # Only now, as frames drained from the pipeline may still detect the end of the
+        # reel and request a stop
+        self.scan_stop_requested = False
+        self.wait_for_saves()
+        self.close_reel_writer()
+        self.close_manifest()
+        self.close_journal(
+            is_complete=self.has_reached_end_of_reel or i == n_frames - 1
+        )
+        self.save_advance_timeline()
+        self.advance_timing.save()
+
         logger.info(f"Finished scanning {i+1} frames")
+        if raw_only and self.raw_compression:
+            self.compressor.log_stats()
+        if self.settle_times:
+            logger.info(
+                "Mean settle time"
+                f" {1e3 * sum(self.settle_times) / len(self.settle_times):.0f} ms"
+            )
 
         self.is_scanning = False
         self.last_scan_end_info = "success"
@@ -225,6 +617,9 @@ class FilmScanner:
 
         self.stop_logging_to_output_directory()
 
+        if self.background_conversion:
+            self.conversion_scheduler.submit(output_directory)
+
         if self.viewers:
             self.start_liveview()
         else:
@@ -232,96 +627,301 @@ class FilmScanner:
 
         return i + 1
 
-    def wait_for_previous_save(self):
+    def wait_for_settle(self, max_delay):
         """
-        If a frame is currently being saved, blocks until that save operation has
-        finished.
+        Wait until the film in the gate has come to rest, but at most `max_delay`
+        seconds. Just sleeps for `max_delay` if `settle_detection` is not set. Returns
+        the time waited in seconds.
         """
-        # Wait for previous image to be saved if there was one
-        if hasattr(self, "write_future"):
-            _ = self.write_future.result()
+        if not self.settle_detection:
+            time.sleep(max_delay)
+            return max_delay
 
-    def submit_save_frame(self, frame, filepath):
+        has_settled, settle_time = self.settle_detector.wait(max_delay)
+        self.settle_times.append(settle_time)
+        if has_settled:
+            logger.info(f"Settled after {1e3 * settle_time:.0f} ms")
+        else:
+            logger.info(f"Not settled after {1e3 * settle_time:.0f} ms")
+        return settle_time
+
+    def start_pipeline(self):
         """
-        Submit a frame for saving. Returns immediately while the frame is saved
-        concurrently. Use `wait for previous save` to block until saving is finished.
-        The arguments are the same as those of `save_frame`.
+        Set up and start the pipeline stages that captured frames are handed to during
+        a pipelined scan.
         """
-        self.write_future = self.write_executor.submit(self.save_frame, frame, filepath)
+        self.pipeline = ScanPipeline(
+            [
+                Stage("preview", self.run_preview_stage, maxsize=1, lossy=True),
+                Stage("classify", self.run_classify_stage, maxsize=16),
+                Stage("callback", self.run_callback_stage, maxsize=4),
+            ]
+        )
+        self.pipeline.start()
 
-    def advance(self, recover=True):
+    def stop_pipeline(self):
         """
-        Advance film scanner by one frame.
+        Wait for all frames in the pipeline to be processed, then stop the pipeline and
+        log how busy each of its stages was.
+        """
+        self.pipeline.close()
+        self.pipeline.log_stats()
+
+    def run_preview_stage(self, frame):
+        """
+        Pipeline stage publishing a captured frame as the preview.
+        """
+        self.publish_preview(frame)
+        frame.release()
+
+    def check_frame(self, frame_index, frame, can_retry=True):
+        """
+        Check a captured frame for a failed advance with the `frame_checker`. If the
+        frame is dark, it is captured again, at most once. A frame that duplicates the
+        previous one is kept and flagged in the manifest instead of advancing again, as
+        distinct frames of dark or static shots can look like duplicates and advancing
+        again would skip them for good.
 
         Parameters
         ----------
-        recover : bool
-            Set `true` to attempt to recevor the scanner when an error occurs during the
-            advance.
+        frame_index : int
+            Index of the frame.
+        frame : FrameBuffer
+            Captured frame.
+        can_retry : bool, optional
+            Set to `False` to only log problems, e.g. for frames captured in motion.
+
+        Returns
+        -------
+        result : tuple
+            Tuple `(frame, planes)` of the frame to keep, which may be a new capture,
+            and its subsampled Bayer planes (see `bayer.msb_planes`).
         """
-        self.is_advancing = True
-        self.callback.on_advance_start()
+        planes = bayer.msb_planes(frame.view(start=len(frame) - self.raw_offset))
+        problem = self.frame_checker.check(planes)
 
-        logger.debug("Advancing one frame")
+        if problem == "dark" and can_retry:
+            frame.release()
+            logger.warning(f"Frame {frame_index} is dark, capturing again")
+            settle_time = self.wait_for_settle(max_delay=0.2)
+            frame = self.capture_frame()
+            self.manifest.update(
+                frame_index, captured_at=time.time(), settle_time=settle_time
+            )
 
-        t_threshold = 0.487 * 1.025
+            planes = bayer.msb_planes(frame.view(start=len(frame) - self.raw_offset))
+            problem = self.frame_checker.check(planes)
+            if problem is None:
+                logger.info(f"Frame {frame_index} is fine after retrying")
 
-        self.motor.enable()
-        self.motor.start(speed=300, acceleration=24)
-        time.sleep(
-            t_threshold * 0.25
-        )  # Move magnet out of range before arming Hall effect sensor
-        was_frame_detected = self.frame_sensor.wait_for_trigger(
-            timeout=t_threshold * 0.75
+        if problem == "duplicate":
+            logger.warning(
+                f"Frame {frame_index} may duplicate the previous frame, keeping it"
+            )
+        elif problem is not None:
+            logger.warning(f"Frame {frame_index} is {problem}, keeping it anyway")
+
+        self.frame_checker.accept()
+        self.manifest.update(
+            frame_index, is_duplicate=problem == "duplicate", is_dark=problem == "dark"
         )
-        self.motor.stop(deceleration=24)
-        self.motor.disable()
 
-        if not was_frame_detected:
-            logger.error("Frame sensor was not reached in time")
-            fixed = False
-            if recover:
-                fixed = self.recover()
-            if not fixed:
-                raise AdvanceTimeoutError()
+        return frame, planes
 
-        self.is_advancing = False
-        self.callback.on_advance_end()
+    def run_classify_stage(self, item):
+        """
+        Pipeline stage classifying frames as blank or with content. Takes tuples of the
+        frame index and the frame's subsampled Bayer planes.
+        """
+        self.classify_frame(*item)
 
-    def recover(self):
+    def classify_frame(self, frame_index, planes):
         """
-        Attempt to recover the frame advance after an error has occurred.
+        Classify the frame at `frame_index` from its subsampled Bayer `planes` (see
+        `bayer.msb_planes`). Blank frames before the first frame with content are logged
+        as leader. Once `end_of_reel_blank_frames` consecutive blank frames follow
+        frames with content, the end of the reel is logged and the scan is stopped.
         """
-        attempts = 0
-        pause = 1
-        while True:
-            logger.warning(
-                f"Attempting frame sensor recovery (attempt={attempts}, pause={pause})"
+        is_blank, mean, deviation = self.blank_classifier.classify(planes)
+        self.manifest.update(frame_index, is_blank=is_blank)
+        if not is_blank:
+            self.has_scanned_content = True
+            self.n_consecutive_blank = 0
+            return
+
+        if not self.has_scanned_content:
+            logger.info(
+                f"Frame {frame_index} looks like leader (mean={mean:.0f} /"
+                f" deviation={deviation:.1f})"
             )
+            return
 
-            self.motor.direction = 1
+        self.n_consecutive_blank += 1
+        logger.info(
+            f"Frame {frame_index} looks blank (mean={mean:.0f} /"
+            f" deviation={deviation:.1f})"
+        )
+        if self.n_consecutive_blank == self.end_of_reel_blank_frames:
+            first_blank_index = frame_index - self.n_consecutive_blank + 1
+            logger.info(f"End of reel detected at frame {first_blank_index}")
+            self.has_reached_end_of_reel = True
+            self.scan_stop_requested = True
 
-            self.motor.enable()
-            self.motor.start(speed=1, acceleration=1)
-            self.frame_sensor.wait_for_trigger(timeout=1.0)
-            self.motor.stop(deceleration=1)
-            self.motor.disable()
+    def run_callback_stage(self, frame_index):
+        """
+        Pipeline stage calling the frame capture callbacks.
+        """
+        self.callback.on_frame_capture()
+
+    def publish_preview(self, frame):
+        """
+        Publish the JPEG part of a captured `FrameBuffer` as the preview frame. The
+        buffer is held until the next frame is published.
+        """
+        frame.retain()
+        previous_buffer, self.preview_buffer = self.preview_buffer, frame
 
-            time.sleep(1)
+        # Cut off the raw bayer data
+        self.preview_frame = frame.view(stop=len(frame) - self.raw_offset)
 
-            self.motor.direction = 0
+        if previous_buffer is not None:
+            previous_buffer.release()
 
-            try:
-                self.advance(recover=False)
-            except AdvanceTimeoutError:
-                if True:  # attempts < 5:
-                    attempts += 1
-                    time.sleep(pause)
-                    pause *= 2
-                else:
-                    return False
+    @property
+    def pipeline_stats(self):
+        return self.pipeline.stats if self.pipeline is not None else {}
+
+    def wait_for_saves(self):
+        """
+        Block until all frames submitted for saving have been saved.
+        """
+        self.write_queue.flush()
+
+    def submit_save_frame(self, frame, filepath):
+        """
+        Submit a captured `FrameBuffer` for saving to `filepath`. Returns immediately
+        while the frame is saved concurrently, unless the write queue's memory budget is
+        exhausted. The buffer is held until it has been written. Use `wait_for_saves` to
+        block until saving is finished. Only the raw bayer data is submitted if
+        `filepath` is a `.raw` file.
+        """
+        if filepath.endswith(".raw"):
+            data = frame.view(start=len(frame) - self.raw_offset)
+        else:
+            data = frame.view()
+        frame.retain()
+        self.write_queue.submit(data, filepath, on_written=frame.release)
+
+    def advance(self, recover=True, speed=None):
+        """
+        Advance film scanner by one frame.
+
+        Parameters
+        ----------
+        recover : bool
+            Set `true` to attempt to recevor the scanner when an error occurs during the
+            advance.
+        speed : int, optional
+            Speed in RPM to advance at. Defaults to `advance_speed`.
+        """
+        # Recovery advances run within the advance they recover, which stays active
+        is_recovery_advance = self.is_advancing
+        self.is_advancing = True
+        if not is_recovery_advance:
+            self.callback.on_advance_start()
+
+        try:
+            logger.debug("Advancing one frame")
+
+            if speed is None:
+                speed = self.advance_speed
+
+            self.advance_timing.select(f"{speed} RPM / {self.motor.profile!r}")
+            arm_delay = self.advance_timing.arm_delay
+            timeout = self.advance_timing.timeout
+            if not self.advance_timing.is_trained:
+                # The default windows were measured at 300 RPM
+                arm_delay *= 300 / speed
+                timeout *= 300 / speed
+
+            if self.use_advance_script:
+                result = self.advance_script.run(
+                    speed,
+                    self.advance_acceleration,
+                    arm_delay=arm_delay,
+                    deadline=arm_delay + timeout,
+                )
+                was_frame_detected, start_tick, sensor_tick, stop_tick = result
             else:
-                return True
+                self.motor.enable()
+                self.motor.start(speed=speed, acceleration=self.advance_acceleration)
+                start_tick = self.pi.get_current_tick()
+                time.sleep(arm_delay)  # Move magnet out of range before arming sensor
+                was_frame_detected = self.frame_sensor.wait_for_trigger(timeout=timeout)
+                self.motor.stop(deceleration=self.advance_acceleration)
+                stop_tick = self.pi.get_current_tick()
+                self.motor.disable()
+                sensor_tick = self.frame_sensor.last_tick if was_frame_detected else 0
+
+            self.record_advance(
+                start_tick, sensor_tick, stop_tick, was_frame_detected, recover
+            )
+            if was_frame_detected:
+                self.reel_position.move(1)
+
+            # Also learn from recovery advances and timeouts, such that the windows
+            # widen when advances slow down instead of timing out over and over
+            if was_frame_detected:
+                duration = telemetry.tick_diff(start_tick, sensor_tick)
+                self.advance_timing.update(duration / 1e6)
+            else:
+                self.advance_timing.record_timeout(arm_delay + timeout)
+
+            if not was_frame_detected:
+                logger.error("Frame sensor was not reached in time")
+                fixed = False
+                if recover:
+                    fixed = self.recover()
+                if not fixed:
+                    raise AdvanceTimeoutError()
+        finally:
+            # Also when recovery gave up, such that the scanner is not locked
+            if not is_recovery_advance:
+                self.is_advancing = False
+                self.callback.on_advance_end()
+
+    def record_advance(
+        self, start_tick, sensor_tick, stop_tick, was_frame_detected, recover
+    ):
+        """
+        Record the ticks and outcome of an advance in the advance timeline. Advances
+        with `recover` set to `False` are those made while recovering.
+        """
+        if recover:
+            outcome = telemetry.DETECTED if was_frame_detected else telemetry.TIMED_OUT
+        elif was_frame_detected:
+            outcome = telemetry.RECOVERY_DETECTED
+        else:
+            outcome = telemetry.RECOVERY_TIMED_OUT
+
+        self.advance_timeline.append(
+            self.current_frame_index, start_tick, sensor_tick, stop_tick, outcome
+        )
+
+    def save_advance_timeline(self):
+        """
+        Save the advance timeline to `advances.bin` in the current output directory.
+        Load it for analysis with `telemetry.load_timeline`.
+        """
+        path = os.path.join(self.output_directory, "advances.bin")
+        self.advance_timeline.save(path)
+
+    def recover(self):
+        """
+        Attempt to recover the frame advance after an error has occurred. See
+        `AdvanceRecovery` for the strategy. Returns whether recovery succeeded.
+        """
+        return self.recovery.run()
 
     def start_fast_forward(self, n=None):
         """
@@ -352,43 +952,381 @@ class FilmScanner:
             Number of frames to advance. If set to `None`, fast-forward until stopped.
         """
         self.is_fast_forwarding = True
+        self.fast_forward_count = 0
+        self.fast_forward_rate = 0.0
         self.fast_forward_started_event.set()
         self.callback.on_fast_forward_start()
 
+        t_start = time.perf_counter()
+
         if n is None:
             logger.debug("Fast-forwarding until stopped")
             while not self.fast_forward_stop_requested:
-                self.advance()
+                self.fast_forward_frames(t_start)
             self.fast_forward_stop_requested = False
         else:
             logger.debug(f"Fast-forwarding {n} frames")
-            for _ in range(n):
-                self.advance()
+            while self.fast_forward_count < n:
+                self.fast_forward_frames(t_start, n - self.fast_forward_count)
                 if self.scan_stop_requested:
                     logger.debug("Stopping fast-forwarding early")
                     self.scan_stop_requested = False
                     break
 
+        logger.info(
+            f"Fast-forwarded {self.fast_forward_count} frames at"
+            f" {self.fast_forward_rate:.2f} frames/s"
+        )
+
         self.is_fast_forwarding = False
         self.fast_forward_stopped_event.set()
         self.callback.on_fast_forward_end()
 
-    def capture_frame(self):
+    def start_seek(self, frame):
+        """
+        Start seeking. The arguments are the same as those of `seek`. A seek can be
+        stopped like fast-forwarding, using `stop_fast_forward`.
+        """
+        self.fast_forward_stop_requested = False
+        self.is_fast_forwarding = True
+        self.fast_forward_started_event.clear()
+        self.fast_forward_executor.submit(self.seek, frame)
+        self.fast_forward_started_event.wait()
+
+    def seek(self, frame):
+        """
+        Move the film to the absolute frame index `frame` of the reel position, in
+        either direction. Forwards, this fast-forwards. Backwards, the motor runs in
+        reverse until it has passed the frame before `frame` and then advances onto
+        `frame`, such that the scanner always comes to a stop like after `advance`.
+
+        Parameters
+        ----------
+        frame : int
+            Frame index to move to.
+        """
+        self.is_fast_forwarding = True
+        self.fast_forward_count = 0
+        self.fast_forward_rate = 0.0
+        self.fast_forward_started_event.set()
+        self.callback.on_fast_forward_start()
+
+        logger.debug(f"Seeking frame {frame} from frame {self.reel_position.frame}")
+
+        t_start = time.perf_counter()
+
+        while self.reel_position.frame != frame:
+            if self.fast_forward_stop_requested:
+                logger.debug("Stopping seek early")
+                break
+            if frame > self.reel_position.frame:
+                self.fast_forward_frames(t_start, frame - self.reel_position.frame)
+            else:
+                n = self.reel_position.frame - frame + 1
+                if self.run_continuously(n, t_start, direction=1) == 0:
+                    logger.error("Frame sensor was not reached while rewinding")
+                    break
+                self.advance()
+                self.count_fast_forward_frames(1, t_start)
+        self.fast_forward_stop_requested = False
+
+        logger.info(f"Stopped seek at frame {self.reel_position.frame}")
+
+        self.is_fast_forwarding = False
+        self.fast_forward_stopped_event.set()
+        self.callback.on_fast_forward_end()
+
+    def fast_forward_frames(self, t_start, n=None):
+        """
+        Fast-forward up to `n` frames, or until a stop is requested if `n` is `None`,
+        and return once the scanner is stopped on a frame. Unless
+        `continuous_fast_forward` is unset or only one frame is left, the motor runs
+        continuously (see `run_continuously`) up to one frame before the target. The
+        last frame is made with a regular advance, such that the scanner stops on the
+        sensor exactly like after `advance`. If the sensor is not triggered in time
+        while running continuously, the regular advance and its recovery take over.
+
+        Parameters
+        ----------
+        t_start : float
+            Value of `time.perf_counter()` at which fast-forwarding started, used to
+            compute the fast-forward rate.
+        n : int, optional
+            Maximum number of frames to advance.
+        """
+        if self.continuous_fast_forward and n != 1:
+            self.run_continuously(None if n is None else n - 1, t_start)
+
+        self.advance()
+        self.count_fast_forward_frames(1, t_start)
+
+    def run_continuously(self, n, t_start, direction=0):
+        """
+        Run the motor continuously at `fast_forward_speed` while counting the frame
+        sensor's pulses and updating the reel position from them. The motor is
+        decelerated after `n` pulses (never if `None`), when a stop is requested or when
+        the sensor is not triggered in time. Pulses within a quarter of a frame from
+        the start are ignored, as they come from the magnet the scanner is stopped at.
+
+        Parameters
+        ----------
+        n : int
+            Number of pulses to run for.
+        t_start : float
+            Value of `time.perf_counter()` at which fast-forwarding started, used to
+            compute the fast-forward rate.
+        direction : int, optional
+            Direction to run the motor in. `0` moves the film forwards and `1`
+            backwards.
+
+        Returns
+        -------
+        n_counted : int
+            Number of pulses counted.
+        """
+        # Frame duration scaled from the measured advance duration at 300 RPM
+        t_frame = 0.487 * 300 / self.motor.cruise_speed(self.fast_forward_speed)
+
+        with self.pi.batch():
+            self.motor.direction = direction
+            self.motor.enable()
+        self.motor.run(
+            speed=self.fast_forward_speed, acceleration=self.advance_acceleration
+        )
+        self.frame_sensor.start_counting(
+            self.pi.get_current_tick(), min_interval=int(0.25e6 * t_frame)
+        )
+
+        n_counted = 0
+        while n is None or n_counted < n:
+            if self.fast_forward_stop_requested or self.scan_stop_requested:
+                break
+            if not self.frame_sensor.wait_for_count(n_counted + 1, timeout=4 * t_frame):
+                logger.error("Frame sensor was not reached while fast-forwarding")
+                break
+            n_new = self.frame_sensor.count - n_counted
+            n_counted += n_new
+            self.reel_position.move(-n_new if direction else n_new)
+            self.count_fast_forward_frames(n_new, t_start)
+
+        self.motor.stop(deceleration=self.advance_acceleration)
+        self.frame_sensor.stop_counting()
+        while self.pi.wave_tx_busy():
+            time.sleep(0.01)
+        self.motor.direction = 0
+
+        return n_counted
+
+    def count_fast_forward_frames(self, n, t_start):
+        """
+        Add `n` frames to the fast-forward count and update the fast-forward rate.
+        """
+        self.fast_forward_count += n
+        self.fast_forward_rate = self.fast_forward_count / (
+            time.perf_counter() - t_start
+        )
+        self.callback.on_fast_forward_progress()
+
+    def start_continuous_motion(self):
+        """
+        Start turning the motor at `continuous_scan_speed` and counting the frame
+        sensor's pulses for continuous-motion scanning.
+        """
+        self.motor.enable()
+        self.motor.run(
+            speed=self.continuous_scan_speed, acceleration=self.advance_acceleration
+        )
+        self.n_continuous_counted = 0
+        self.frame_sensor.start_counting(
+            self.pi.get_current_tick(),
+            min_interval=int(0.25e6 * self.nominal_frame_period),
+        )
+
+    def stop_continuous_motion(self):
+        """
+        Stop the motor after continuous-motion scanning.
+        """
+        self.motor.stop(deceleration=self.advance_acceleration)
+        while self.pi.wave_tx_busy():
+            time.sleep(0.01)
+        self.frame_sensor.stop_counting()
+        self.update_continuous_position()
+        self.motor.disable()
+
+    def stop_continuous_motion_on(self, k):
+        """
+        Stop the motor after continuous-motion scanning and move the film onto the
+        frame of the `k`-th sensor pulse after the motor was started, such that the
+        frame can be captured at rest, e.g. after capturing it in motion failed.
+
+        The motor decelerates wherever the film happens to be, often in the middle of a
+        pulldown or past the next pulse, where no sensor stop guarantees the framing.
+        Like `seek` backwards, the motor therefore runs in reverse past the pulse of the
+        frame before, or only past the last pulse if that was not reached yet, and
+        then advances onto the next frames.
+        """
+        frame = self.reel_position.frame - self.n_continuous_counted + k
+        self.stop_continuous_motion()
+
+        t_start = time.perf_counter()
+        n = max(self.reel_position.frame - frame + 2, 1)
+        if self.run_continuously(n, t_start, direction=1) == n:
+            # The film stopped right after the last pulse it ran back past, so the
+            # advance passes that pulse before it stops
+            self.reel_position.move(1)
+            self.advance()
+            if self.reel_position.frame < frame:
+                self.fast_forward_frames(t_start, frame - self.reel_position.frame)
+
+        if self.reel_position.frame != frame:
+            raise RuntimeError(f"Could not move the film back onto frame {frame}")
+
+    def update_continuous_position(self, count=None):
+        """
+        Move the reel position by the sensor pulses counted since the last update, or
+        up to the `count`-th pulse since the motor was started if given.
+        """
+        if count is None:
+            count = self.frame_sensor.count
+        n_new = max(min(count, self.frame_sensor.count) - self.n_continuous_counted, 0)
+        self.n_continuous_counted += n_new
+        self.reel_position.move(n_new)
+
+    @property
+    def nominal_frame_period(self):
+        """
+        Expected time in seconds per frame at `continuous_scan_speed`, scaled from the
+        measured advance duration at 300 RPM.
+        """
+        return 0.487 * 300 / self.continuous_scan_speed
+
+    def capture_frame_in_motion(self, k):
+        """
+        Capture a frame while the motor is turning continuously. The `k`-th sensor
+        pulse after the motor was started marks the frame. The time of this pulse is
+        predicted from the frame period of the last `continuous_scan_window` pulses and
+        the capture is started such that the exposure begins `continuous_scan_phase`
+        frame periods after it, i.e. while the film dwells in the gate.
+
+        The timing error is how much earlier or later `capture` was called than it
+        should have been for the exposure to start `continuous_scan_phase` frame
+        periods after the frame's actual pulse, assuming the exposure starts
+        `continuous_scan_capture_latency` seconds after the call. It is logged and kept
+        in `capture_timing_errors`. The exposure itself is not observed, so the error
+        only catches a mispredicted pulse or a late call, not a wrong capture latency,
+        which has to be calibrated. The first frame is timed from its actual pulse, so
+        its error is just the delay of the call.
+
+        Returns
+        -------
+        frame : FrameBuffer
+            Buffer holding the captured frame or `None` if the timing error exceeded
+            `continuous_scan_max_error` frame periods, in which case the frame is
+            discarded.
+        """
+        sensor = self.frame_sensor
+        nominal_period = 1e6 * self.nominal_frame_period
+        if not sensor.wait_for_count(k - 1, timeout=4 * self.nominal_frame_period):
+            logger.error("Frame sensor was not reached during continuous scanning")
+            return None
+
+        # Ticks of the pulses up to the previous frame's
+        with sensor.count_condition:
+            ticks = list(sensor.count_ticks)
+            ticks = ticks[: len(ticks) - (sensor.count - (k - 1))]
+        ticks = ticks[-(self.continuous_scan_window + 1) :]
+        periods = [telemetry.tick_diff(a, b) for a, b in zip(ticks, ticks[1:])]
+        period = statistics.median(periods) if periods else nominal_period
+
+        if ticks:
+            pulse_tick = int(ticks[-1] + period) & 0xFFFFFFFF
+        else:
+            # Nothing to predict from for the first frame, so wait for its pulse
+            if not sensor.wait_for_count(k, timeout=4 * self.nominal_frame_period):
+                logger.error("Frame sensor was not reached during continuous scanning")
+                return None
+            with sensor.count_condition:
+                pulse_tick = sensor.count_ticks[-(sensor.count - k) - 1]
+
+        offset = self.continuous_scan_phase * period
+        offset -= 1e6 * self.continuous_scan_capture_latency
+        call_tick = int(pulse_tick + offset) & 0xFFFFFFFF
+        delay = telemetry.signed_tick_diff(self.pi.get_current_tick(), call_tick)
+        if delay > 0:
+            time.sleep(delay / 1e6)
+
+        call_tick = self.pi.get_current_tick()
+        frame = self.capture_frame(shutter_speed=self.continuous_scan_shutter_speed)
+
+        # Compare against the actual pulse of the frame
+        if not sensor.wait_for_count(k, timeout=4 * self.nominal_frame_period):
+            logger.error("Frame sensor was not reached during continuous scanning")
+            frame.release()
+            return None
+        with sensor.count_condition:
+            pulse_tick = sensor.count_ticks[-(sensor.count - k) - 1]
+        # The frame was captured at the reel position its pulse moved the film to
+        self.update_continuous_position(k)
+        error = telemetry.signed_tick_diff(
+            int(pulse_tick + offset) & 0xFFFFFFFF, call_tick
+        )
+
+        self.capture_timing_errors.append(error / 1e3)
+        logger.info(f"Capture timing error of frame {k}: {error / 1e3:.1f} ms")
+
+        if abs(error) > self.continuous_scan_max_error * period:
+            logger.warning(
+                f"Capture timing error of {error / 1e3:.1f} ms exceeds"
+                f" {self.continuous_scan_max_error * period / 1e3:.1f} ms"
+            )
+            frame.release()
+            return None
+
+        return frame
+
+    @property
+    def capture_timing_stats(self):
+        """
+        Last and largest absolute capture timing error in milliseconds of the frames
+        captured in motion during the current scan.
+        """
+        if not self.capture_timing_errors:
+            return {"last_ms": 0.0, "max_ms": 0.0}
+        return {
+            "last_ms": round(self.capture_timing_errors[-1], 1),
+            "max_ms": round(max(map(abs, self.capture_timing_errors)), 1),
+        }
+
+    def capture_frame(self, shutter_speed=None):
         """
         Capture the current frame.
 
+        Parameters
+        ----------
+        shutter_speed : int, optional
+            Shutter speed in microseconds to capture with. Defaults to 1/250 s.
+
         Returns
         -------
-        frame : bytes
-            JPEG encoded image with raw bayer data appended.
+        frame : FrameBuffer
+            Buffer from the scanner's pool holding the JPEG encoded image with raw bayer
+            data appended. Call its `release` method once done with it.
         """
-        self.camera.shutter_speed = int(1e6 * 1 / 250)
+        if shutter_speed is None:
+            shutter_speed = int(1e6 * 1 / 250)
+        self.camera.shutter_speed = shutter_speed
 
-        buffer = BytesIO()
-        self.camera.capture(buffer, format="jpeg", bayer=True)
+        if self.raw_only:
+            options = {"quality": self.raw_only_jpeg_quality, "thumbnail": None}
+        else:
+            options = {}
 
-        buffer.seek(0)
-        frame = buffer.read()
+        frame = self.frame_buffers.acquire()
+        try:
+            self.camera.capture(frame, format="jpeg", bayer=True, **options)
+        except Exception:
+            frame.release()
+            raise
 
         return frame
 
@@ -398,16 +1336,110 @@ class FilmScanner:
 
         Parameters
         ----------
-        frame : bytes
-            Frame to save encoded as bytes.
+        frame : bytes-like
+            Frame to save encoded as bytes. Raw bayer data if `filepath` is a `.raw`
+            file.
         filepath : str
-            Path to save the frame to.
-        """
-        with open(filepath, "wb") as f:
-            f.write(frame)
+            Path to save the frame to. If a reel container is being written, the frame
+            is appended to it under the index and suffix from the path instead.
+        """
+        index, suffix = parse_frame_name(filepath)
+        if self.reel_writer is not None:
+            length = None
+            if suffix == "raw":
+                length, frame = self.encode_raw_frame(frame)
+            record = self.reel_writer.write(index, suffix, frame, length)
+            self.manifest.update(
+                index,
+                path=DATA_FILENAME,
+                offset=record.offset,
+                size=record.length,
+                crc32=record.crc,
+            )
+        else:
+            with open(filepath, "wb") as f:
+                f = ChecksumFile(f)
+                if suffix == "raw":
+                    for chunk in self.encode_raw_frame(frame)[1]:
+                        f.write(chunk)
+                else:
+                    f.write(frame)
+            self.manifest.update(
+                index,
+                path=os.path.basename(filepath),
+                offset=None,
+                size=f.size,
+                crc32=f.crc32,
+            )
+
+        if self.journal is not None:
+            self.journal.record_saved(index)
 
         logger.debug(f"Saved {filepath}")
 
+    def encode_raw_frame(self, raw):
+        """
+        Encode the raw bayer data `raw` of a frame in the raw file format, cropped to
+        the region of interest and compressed if enabled. Returns the number of bytes
+        and a generator of chunks of them (see `rawfile.chunks`), so that the frame
+        can be written without copying it into a single buffer first.
+        """
+        layout = bayer.read_layout(raw)
+        box = rawfile.crop_box(layout, self.roi.region)
+        compress = self.compressor.compress if self.raw_compression else None
+        return rawfile.chunks(raw, layout=layout, box=box, compress=compress)
+
+    def close_manifest(self):
+        """
+        Close the manifest of the current scan, if there is one.
+        """
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+
+    def close_journal(self, is_complete):
+        """
+        Flush the frames of the current scan saved so far and record in its journal
+        whether the scan `is_complete`, if there is a journal.
+        """
+        if self.journal is not None:
+            self.journal.finish(is_complete)
+            self.journal = None
+
+    def close_reel_writer(self):
+        """
+        Close the reel container written by the current scan, if there is one.
+        """
+        if self.reel_writer is not None:
+            self.reel_writer.close()
+            self.reel_writer = None
+
+    def save_capture_settings(self, continuous=False):
+        """
+        Save the camera settings that frames are captured with to `capture.json` in the
+        output directory. Raw files lack the JPEG's EXIF data, and JPEGs are converted
+        to DNGs without parsing it, so converting frames relies on these.
+        """
+        if continuous:
+            shutter_speed = self.continuous_scan_shutter_speed
+        else:
+            shutter_speed = int(1e6 * 1 / 250)
+        settings = {
+            "model": self.camera.revision,
+            "awb_gains": [float(gain) for gain in self.camera.awb_gains],
+            "analog_gain": float(self.camera.analog_gain),
+            "digital_gain": float(self.camera.digital_gain),
+            "shutter_speed": shutter_speed,
+            "roi": self.roi.region,
+            "time": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        path = os.path.join(self.output_directory, "capture.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(settings, f, indent=4)
+        os.replace(tmp_path, path)
+
     @property
     def is_light_on(self):
         return self.light.is_on
@@ -543,6 +1575,8 @@ class FilmScanner:
         buffer = BytesIO()
 
         self.camera.resolution = (800, 600)
+        if not self.is_zoomed:
+            self.camera.zoom = self.roi.zoom
         self.turn_on_light()
 
         for _ in self.camera.capture_continuous(
@@ -560,7 +1594,7 @@ class FilmScanner:
                     self.callback.on_zoom_in()
                 else:
                     self.is_zoomed = False
-                    self.camera.zoom = (0.0, 0.0, 1.0, 1.0)
+                    self.camera.zoom = self.roi.zoom
                     self.live_view_zoom_toggle_requested = False
                     self.zoom_toggled_event.set()
                     self.callback.on_zoom_out()
@@ -598,6 +1632,17 @@ class FilmScanner:
 
         return viewer.view()
 
+    def set_roi(self, region):
+        """
+        Set the region of interest that raw-only scans crop the sensor data to, given
+        as `(x, y, width, height)` in fractions of the sensor size, or `None` to save
+        the full sensor. The liveview shows the region unless zoomed in.
+        """
+        self.roi.set(region)
+        logger.info(f"Set region of interest to {self.roi.region}")
+        if not self.is_zoomed:
+            self.camera.zoom = self.roi.zoom
+
     def toggle_zoom(self):
         self.zoom_toggled_event.clear()
         self.live_view_zoom_toggle_requested = True
@@ -632,6 +1677,12 @@ class FilmScanner:
     def is_fast_forward_allowed(self):
         return not (self.is_advancing or self.is_fast_forwarding or self.is_scanning)
 
+    @property
+    def is_position_change_allowed(self):
+        # The film moves while seeking (which counts as fast-forwarding), and scans
+        # record the position of every frame
+        return not (self.is_advancing or self.is_fast_forwarding or self.is_scanning)
+
     @property
     def is_light_toggle_allowed(self):
         return not self.is_scanning
@@ -668,21 +1719,35 @@ class HallEffectSensor:
     input_pin : int
         Broadcom number of the GPIO header pin receiving a digital signal from the
         sensor.
+    pi : GPIOConnection, optional
+        Connection to the `pigpio` daemon to share. A new one is opened if not given.
 
     Attributes
     ---------
     is_armed : bool
         Flag set to true when the sensor is armed, i.e. setup to call a callback
         function whenever the Hall effect is detected.
+    last_tick : int
+        `pigpio` tick in microseconds at which the Hall effect was last detected.
+    count : int
+        Number of times the Hall effect was detected since `start_counting` was called.
+    count_ticks : deque
+        `pigpio` ticks of the most recent detections since `start_counting` was called.
     """
 
-    def __init__(self, input_pin):
+    def __init__(self, input_pin, pi=None):
         self.input_pin = input_pin
 
-        self.pi = pigpio.pi()
+        self.pi = pi if pi is not None else GPIOConnection()
         self.pi.set_mode(self.input_pin, pigpio.INPUT)
 
         self.is_armed = False
+        self.last_tick = None
+
+        self.count = 0
+        self.count_ticks = deque(maxlen=64)
+        self.count_condition = Condition()
+        self.counting_callback = None
 
     def wait_for_trigger(self, timeout=None):
         frame_detected_event = Event()
@@ -731,8 +1796,62 @@ class HallEffectSensor:
         Internal callback for `pgpio` which calls the sensor's callback function.
         """
         logger.debug("Hall effect sensor detected")
+        self.last_tick = tick
         self.callback()
 
+    def start_counting(self, start_tick, min_interval=0):
+        """
+        Start counting how often the Hall effect is detected. Unlike `arm`, counting
+        continues after the first detection until `stop_counting` is called.
+
+        Parameters
+        ----------
+        start_tick : int
+            `pigpio` tick at which counting starts.
+        min_interval : int, optional
+            Detections less than `min_interval` microseconds after `start_tick` or the
+            previous detection are ignored, e.g. to debounce the sensor.
+        """
+        assert self.counting_callback is None, "Hall effect sensor is already counting!"
+        with self.count_condition:
+            self.count = 0
+            self.count_ticks.clear()
+        self.last_count_tick = start_tick
+        self.min_count_interval = min_interval
+        self.counting_callback = self.pi.callback(
+            self.input_pin, pigpio.RISING_EDGE, self.count_detection
+        )
+
+    def stop_counting(self):
+        """
+        Stop counting detections of the Hall effect.
+        """
+        self.counting_callback.cancel()
+        self.counting_callback = None
+
+    def wait_for_count(self, count, timeout=None):
+        """
+        Wait until the Hall effect has been detected `count` times since counting was
+        started. Returns `False` if this did not happen within `timeout` seconds.
+        """
+        with self.count_condition:
+            return self.count_condition.wait_for(
+                lambda: self.count >= count, timeout=timeout
+            )
+
+    def count_detection(self, pin, level, tick):
+        """
+        Internal callback for `pigpio` counting detections of the Hall effect.
+        """
+        if telemetry.tick_diff(self.last_count_tick, tick) < self.min_count_interval:
+            return
+        self.last_count_tick = tick
+        self.last_tick = tick
+        with self.count_condition:
+            self.count += 1
+            self.count_ticks.append(tick)
+            self.count_condition.notify_all()
+
 
 class Light:
     """
@@ -742,6 +1861,8 @@ class Light:
     ----------
     switch_pin : int
         Broadcom number of the GPIO header pin used to turn the light on and off.
+    pi : GPIOConnection, optional
+        Connection to the `pigpio` daemon to share. A new one is opened if not given.
 
     Attributes
     ---------
@@ -750,10 +1871,10 @@ class Light:
         when it is off.
     """
 
-    def __init__(self, switch_pin):
+    def __init__(self, switch_pin, pi=None):
         self.switch_pin = switch_pin
 
-        self.pi = pigpio.pi()
+        self.pi = pi if pi is not None else GPIOConnection()
         self.pi.set_mode(self.switch_pin, pigpio.OUTPUT)
 
         self.turn_off()
@@ -797,6 +1918,8 @@ class StepperMotor:
     step_pin : int
         Broadcom number of the GPIO header pin connected to the stepper driver's `STEP`
         input.
+    pi : GPIOConnection, optional
+        Connection to the `pigpio` daemon to share. A new one is opened if not given.
 
     Attributes
     ---------
@@ -805,23 +1928,42 @@ class StepperMotor:
         or be able to run.
     speed : int
         Current speed of the motor in RPM.
+    waveforms : dict
+        Cache of the IDs of the step waveforms created on the `pigpio` daemon, keyed by
+        `(frequency, step_pin)`. Waveforms are only created once and reused by every
+        ramp sent afterwards. The cache is ordered from least to most recently used, so
+        that the least recently used waveforms can be evicted when it is full.
+    profile : MotionProfile
+        Acceleration profile (see `motionprofile.py`) used to ramp the motor up and
+        down. When set, the profile's own acceleration replaces the `acceleration` and
+        `deceleration` passed to `start` and `stop`. When `None`, the motor ramps
+        through the fixed `PWM_FREQUENCIES`.
     """
 
     STEPS_PER_ROUND = 200
-    PWM_FREQUENCIES = [320, 500, 800, 1000, 1600, 2000]
+    PWM_FREQUENCIES = [320, 500, 800, 1000, 1500, 1600, 2000]
+    MAX_WAVEFORMS = 200  # pigpio supports at most 250 waveforms
+    MAX_CHAIN_COUNTERS = 20  # pigpio supports at most 20 loop counters per chain
 
-    def __init__(self, enable_pin, direction_pin, step_pin):
+    def __init__(self, enable_pin, direction_pin, step_pin, pi=None):
         self.enable_pin = enable_pin
         self.direction_pin = direction_pin
         self.step_pin = step_pin
 
-        self.pi = pigpio.pi()
+        self.pi = pi if pi is not None else GPIOConnection()
         self.pi.set_mode(self.enable_pin, pigpio.OUTPUT)
         self.pi.set_mode(self.direction_pin, pigpio.OUTPUT)
         self.pi.set_mode(self.step_pin, pigpio.OUTPUT)
 
-        self.disable()
-        self.direction = 0  # Set direction counter-clockwise
+        # Start from a clean slate as the daemon may still hold waveforms from before
+        self.pi.wave_clear()
+        self.waveforms = {}
+        self.chain_wids = set()
+        self.profile = None
+
+        with self.pi.batch():
+            self.disable()
+            self.direction = 0  # Set direction counter-clockwise
         self.speed = 0
 
     def __del__(self):
@@ -874,6 +2016,18 @@ class StepperMotor:
         ramp = self.make_ramp(pwm_frequency, pwm_acceleration, stay=10000)
         self.send_ramp(ramp)
 
+    def run(self, speed=300, acceleration=24):
+        """
+        Start running the stepper motor and keep it running at the target speed until
+        `stop` is called. The parameters are the same as those of `start`.
+        """
+        assert self.is_enabled, "Cannot start a disabled stepper motor!"
+
+        self.speed = speed
+
+        ramp = self.make_ramp(self.rpm2hz(speed), self.rpm2hz(acceleration), stay=1)
+        self.send_ramp(ramp, repeat_last=True)
+
     def stop(self, deceleration=24):
         """
         Stop the stepper motor.
@@ -891,6 +2045,14 @@ class StepperMotor:
         ramp = self.make_ramp(pwm_frequency, -pwm_deceleration)
         self.send_ramp(ramp)
 
+    def cruise_speed(self, speed):
+        """
+        Speed in RPM the motor actually runs at when started at `speed`. Without a
+        profile, this is the speed of the fastest of `PWM_FREQUENCIES` not above it.
+        """
+        frequency, _ = self.make_ramp(self.rpm2hz(speed), 1, stay=1)[-1]
+        return 60 * frequency / self.STEPS_PER_ROUND
+
     def rpm2hz(self, rpm):
         """
         Convert RPM to PWM frequency in Hz for this particular stepper motor.
@@ -902,6 +2064,11 @@ class StepperMotor:
         Make list of `(frequency, step)` pairs to ramp up the motor and stay at the
         target speed for `stay` steps.
         """
+        if self.profile is not None:
+            return self.profile.make_ramp(
+                target_frequency, rising=acceleration > 0, stay=stay
+            )
+
         frequencies = [f for f in self.PWM_FREQUENCIES if f <= target_frequency]
         if not frequencies:
             frequencies = [self.PWM_FREQUENCIES[0]]
@@ -912,30 +2079,128 @@ class StepperMotor:
 
         return ramp if acceleration > 0 else list(reversed(ramp))
 
-    def send_ramp(self, ramp):
+    def send_ramp(self, ramp, repeat_last=False):
         """
         Send wave chain that describes list of `(frequency, step)` pairs to step pin.
-        """
-        self.pi.wave_clear()
-        length = len(ramp)
-        wid = [-1] * length
+        Set `repeat_last` to `True` to repeat the last level until another ramp is
+        sent. Every other level of more than one step takes one of the chain's
+        `MAX_CHAIN_COUNTERS` loop counters.
+        """
+        levels = ramp[:-1] if repeat_last else ramp
+        n_counters = sum(1 for _, steps in levels if steps > 1)
+        if n_counters > self.MAX_CHAIN_COUNTERS:
+            raise ValueError(
+                f"Ramp needs {n_counters} loop counters, but pigpio supports only"
+                f" {self.MAX_CHAIN_COUNTERS}"
+            )
+
+        keys = {(frequency, self.step_pin) for frequency, _ in ramp}
+        self.make_room(len(keys - self.waveforms.keys()), keep=keys)
 
-        # Generate a wave ramp per ramp level
-        for i in range(length):
-            frequency = ramp[i][0]
-            micros = int(5e5 / frequency)
+        chain = []
+        for i, (frequency, steps) in enumerate(ramp):
+            wid = self.get_waveform(frequency)
+            if repeat_last and i == len(ramp) - 1:
+                chain += [255, 0, wid, 255, 3]  # Loop forever
+            elif steps == 1:
+                chain.append(wid)
+            elif steps > 1:
+                x = steps & 255
+                y = steps >> 8
+                chain += [255, 0, wid, 255, 1, x, y]
+
+        self.pi.wave_chain(chain)  # Transmit chain of wave forms
+        self.chain_wids = {self.waveforms[key] for key in keys}
+
+    def get_waveform(self, frequency):
+        """
+        Get the ID of a waveform producing a single step at `frequency`. The waveform is
+        created on the `pigpio` daemon the first time it is requested and taken from
+        the cache afterwards.
+        """
+        key = (frequency, self.step_pin)
+        if key not in self.waveforms:
+            micros = round(5e5 / frequency)
             wf = []
             wf.append(pigpio.pulse(1 << self.step_pin, 0, micros))  # Pulse on
             wf.append(pigpio.pulse(0, 1 << self.step_pin, micros))  # Pulse off
             self.pi.wave_add_generic(wf)
-            wid[i] = self.pi.wave_create()
+            self.waveforms[key] = self.pi.wave_create()
+        self.waveforms[key] = self.waveforms.pop(key)  # Mark as most recently used
+        return self.waveforms[key]
+
+    def get_ramp_waveforms(self, target_frequency, acceleration):
+        """
+        Get the IDs of three waveforms for running the motor at `target_frequency`: one
+        ramping up with `acceleration` (or the motor's profile), one making a single
+        step at the target speed, to be repeated, and one ramping down. Like single-step
+        waveforms, these are created once and then taken from the cache.
+        """
+        key = (target_frequency, acceleration, repr(self.profile), self.step_pin)
+        if key not in self.waveforms:
+            self.make_room(3)
+            ramp = self.make_ramp(target_frequency, acceleration, stay=1)
+            cruise = self.create_ramp_waveform(ramp[-1:])
+            ramp_up = self.create_ramp_waveform(ramp[:-1]) if ramp[:-1] else cruise
+            ramp = self.make_ramp(target_frequency, -acceleration)
+            ramp_down = self.create_ramp_waveform(ramp) if ramp else cruise
+            self.waveforms[key] = (ramp_up, cruise, ramp_down)
+        self.waveforms[key] = self.waveforms.pop(key)  # Mark as most recently used
+        return self.waveforms[key]
+
+    def create_ramp_waveform(self, ramp):
+        """
+        Create a single waveform on the `pigpio` daemon that makes all steps of a list
+        of `(frequency, step)` pairs. Returns the waveform's ID.
+        """
+        wf = []
+        for frequency, steps in ramp:
+            micros = round(5e5 / frequency)
+            for _ in range(steps):
+                wf.append(pigpio.pulse(1 << self.step_pin, 0, micros))  # Pulse on
+                wf.append(pigpio.pulse(0, 1 << self.step_pin, micros))  # Pulse off
+        self.pi.wave_add_generic(wf)
+        return self.pi.wave_create()
 
-        # Generate chain of waves
-        chain = []
-        for i in range(length):
-            steps = ramp[i][1]
-            x = steps & 255
-            y = steps >> 8
-            chain += [255, 0, wid[i], 255, 1, x, y]
+    @property
+    def n_waveforms(self):
+        """
+        Number of waveforms created on the `pigpio` daemon.
+        """
+        return sum(
+            len(wid) if isinstance(wid, tuple) else 1 for wid in self.waveforms.values()
+        )
 
-        self.pi.wave_chain(chain)  # Transmit chain of wave forms
+    def make_room(self, n_new, keep=()):
+        """
+        Make room in the waveform cache for `n_new` waveforms. While nothing is being
+        transmitted, all waveforms are cleared at once. Otherwise, the least recently
+        used waveforms are deleted one by one, except for those in `keep` and those of
+        the chain being transmitted.
+        """
+        n_excess = self.n_waveforms + n_new - self.MAX_WAVEFORMS
+        if n_excess <= 0:
+            return
+        if not self.pi.wave_tx_busy():
+            self.clear_waveforms()
+            return
+
+        for key, wids in list(self.waveforms.items()):
+            wids = wids if isinstance(wids, tuple) else (wids,)
+            if key in keep or self.chain_wids.intersection(wids):
+                continue
+            for wid in set(wids):
+                self.pi.wave_delete(wid)
+            del self.waveforms[key]
+            n_excess -= len(wids)
+            if n_excess <= 0:
+                return
+        raise RuntimeError("No room for more waveforms on the pigpio daemon")
+
+    def clear_waveforms(self):
+        """
+        Delete all waveforms from the `pigpio` daemon and empty the waveform cache.
+        """
+        self.pi.wave_clear()
+        self.waveforms = {}
+        self.chain_wids = set()
@@ -0,0 +1,157 @@
+import numpy as np
+
+
+class BlankFrameClassifier:
+    """
+    Classifies frames as blank, i.e. showing leader, an empty gate after the end of the
+    reel or opaque film, or as having content. A frame is blank when its brightness is
+    nearly uniform. The classification works on the subsampled Bayer planes returned by
+    `bayer.msb_planes`, so it only takes a few NumPy operations on a small array.
+
+    Parameters
+    ----------
+    max_deviation : float, optional
+        Largest standard deviation of the high 8 bits of the pixels, averaged over the
+        four Bayer positions, for which a frame is still considered blank.
+    """
+
+    def __init__(self, max_deviation=6.0):
+        self.max_deviation = max_deviation
+
+    def classify(self, planes):
+        """
+        Classify the frame given by its Bayer `planes`.
+
+        Returns
+        -------
+        result : tuple
+            Tuple `(is_blank, mean, deviation)` of whether the frame is blank, its mean
+            brightness and its standard deviation averaged over the Bayer positions.
+        """
+        planes = planes.reshape(len(planes), -1)
+        mean = float(planes.mean())
+        deviation = float(planes.std(axis=1).mean())
+        return deviation <= self.max_deviation, mean, deviation
+
+
+class FrameChecker:
+    """
+    Compares every captured frame with the previous one to catch failed advances. A
+    frame is considered a duplicate when it matches the previous frame down to the film
+    grain, which happens when the film did not move. A frame is considered dark when a
+    part of it is much darker than the same part of the previous frame, e.g. because
+    the light flickered or the film stopped between two frames.
+
+    A small difference hash of each frame is compared first, such that the more
+    expensive pixel comparison only runs for frames that look alike. The sensor noise
+    separating two captures of the same frame grows with the square root of the
+    brightness, so the largest difference allowed for duplicates shrinks accordingly on
+    dark frames, where the film grain differs by less in absolute terms. All checks
+    work on the subsampled Bayer planes returned by `bayer.msb_planes`.
+
+    Parameters
+    ----------
+    max_hash_distance : int, optional
+        Largest number of differing bits of the 64-bit difference hashes of two frames
+        that may be duplicates.
+    max_difference : float, optional
+        Largest mean absolute difference of the high 8 bits of the pixels of two frames
+        of medium brightness (128) that are duplicates. Must lie above the sensor's
+        noise but below the differences caused by film grain and gate weave.
+    min_difference : float, optional
+        Lower bound of the largest difference of duplicates on dark frames, covering
+        the sensor's read noise and quantisation.
+    min_deviation : float, optional
+        Frames with a smaller standard deviation are blank. They are never duplicates
+        and other frames are not checked for being dark against them.
+    dark_ratio : float, optional
+        Rows whose mean brightness drops below this fraction of the previous frame's
+        are dark.
+    min_dark_rows : float, optional
+        Fraction of rows that must be dark for the frame to be considered dark.
+    """
+
+    def __init__(
+        self,
+        max_hash_distance=4,
+        max_difference=2.0,
+        min_difference=0.5,
+        min_deviation=6.0,
+        dark_ratio=0.5,
+        min_dark_rows=0.05,
+    ):
+        self.max_hash_distance = max_hash_distance
+        self.max_difference = max_difference
+        self.min_difference = min_difference
+        self.min_deviation = min_deviation
+        self.dark_ratio = dark_ratio
+        self.min_dark_rows = min_dark_rows
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous frame, e.g. at the start of a scan.
+        """
+        self.previous = None
+        self.current = None
+
+    def check(self, planes):
+        """
+        Check the frame given by its Bayer `planes` against the previous frame.
+
+        Returns
+        -------
+        problem : str
+            `"duplicate"` or `"dark"` if the frame looks like one, `None` if it looks
+            fine.
+        """
+        luma = planes.mean(axis=0, dtype=np.float32)
+        is_blank = luma.std() < self.min_deviation
+        self.current = (luma, dhash(luma), luma.mean(axis=1), is_blank)
+        if self.previous is None:
+            return None
+
+        previous_luma, previous_hash, previous_profile, was_blank = self.previous
+        _, frame_hash, profile, _ = self.current
+
+        if (
+            not is_blank
+            and np.count_nonzero(frame_hash != previous_hash) <= self.max_hash_distance
+            and np.abs(luma - previous_luma).mean()
+            <= self.duplicate_threshold((profile.mean() + previous_profile.mean()) / 2)
+        ):
+            return "duplicate"
+
+        dark_rows = profile < self.dark_ratio * previous_profile
+        if not was_blank and dark_rows.mean() >= self.min_dark_rows:
+            return "dark"
+
+        return None
+
+    def duplicate_threshold(self, brightness):
+        """
+        Largest mean absolute difference of two duplicate frames of the given mean
+        `brightness` in the high 8 bits of the pixels.
+        """
+        threshold = self.max_difference * np.sqrt(max(brightness, 0) / 128)
+        return max(threshold, self.min_difference)
+
+    def accept(self):
+        """
+        Make the frame last passed to `check` the one the next frame is compared with.
+        """
+        self.previous = self.current
+
+
+def dhash(luma, size=8):
+    """
+    Difference hash of a 2D array as a flat boolean array of `size**2` bits, telling
+    for neighbouring cells of a `size` by `size + 1` grid of block means whether the
+    brightness increases from left to right.
+    """
+    height, width = luma.shape
+    block_height, block_width = height // size, width // (size + 1)
+    blocks = luma[: size * block_height, : (size + 1) * block_width]
+    blocks = blocks.reshape(size, block_height, size + 1, block_width).mean(axis=(1, 3))
+    return (blocks[:, 1:] > blocks[:, :-1]).ravel()
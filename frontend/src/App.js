@@ -28,13 +28,22 @@ const Controls = () => {
 
   const [scannerState, setScannerState] = useState({
     advance_toggle: {active: false, enabled: false},
+    capture_timing: {last_ms: 0, max_ms: 0},
+    compression: {level: 0, compressed: 0, uncompressed: 0, ratio: 0, mb_per_s: 0},
+    conversion: {state: "idle", reel: null, done: 0, frames: 0, frames_per_s: 0, queued: 0},
     current_frame_index: 0,
+    fast_forward: {frames: 0, frames_per_s: 0},
     fast_forward_toggle: {active: false, enabled: false},
+    gpio_latency: {},
     is_scanning: false,
     is_scan_button_enabled: false,
     last_scan_end_info: "dismissed",
     light_toggle: {active: false, enabled: false},
+    pipeline: {},
+    recovery: {active: false, stage: null, recovered: 0, failed: 0, time_s: 0},
+    reel_position: 0,
     time_remaining: "-",
+    write_queue: {queue_depth: 0, queued_mb: 0, budget_mb: 0, write_mb_per_s: 0, stall_time: 0},
     zoom_toggle: {active: false, enabled: false},
   })
   const [isEndOfUse, setIsEndOfUse] = useState(false)
@@ -82,11 +91,12 @@ const Controls = () => {
       <ButtonGrid>
         <Toggle target={"/backend/advance"} enabled={scannerState.advance_toggle.enabled} active={scannerState.advance_toggle.active}>🦦 Step</Toggle>
         <Toggle target={"/backend/light"} enabled={scannerState.light_toggle.enabled} active={scannerState.light_toggle.active}>💡 Light</Toggle>
-        <Toggle target={"/backend/fastforward"} enabled={scannerState.fast_forward_toggle.enabled} active={scannerState.fast_forward_toggle.active}>🏎 Fast-Forward</Toggle>
+        <Toggle target={"/backend/fastforward"} enabled={scannerState.fast_forward_toggle.enabled} active={scannerState.fast_forward_toggle.active}>🏎 Fast-Forward{scannerState.fast_forward_toggle.active && ` (${scannerState.fast_forward.frames} · ${scannerState.fast_forward.frames_per_s} fps)`}</Toggle>
         <Toggle target={"/backend/focuszoom"} enabled={scannerState.zoom_toggle.enabled} active={scannerState.zoom_toggle.active}>🔍 Zoom</Toggle>
       </ButtonGrid>
 
-      <ProgressBar now={scannerState.current_frame_index + scannerState.is_scanning} max={nFrames} info={scannerState.time_remaining} show={scannerState.is_scanning} />
+      <ProgressBar now={scannerState.current_frame_index + scannerState.is_scanning} max={nFrames} info={scannerState.time_remaining} show={scannerState.is_scanning} writeQueue={scannerState.write_queue} recovery={scannerState.recovery} compression={scannerState.compression} />
+      <ConversionProgress conversion={scannerState.conversion} />
       <ScanSuccessAlert show={scannerState.last_scan_end_info === "success"} />
       <ScanFailureAlert show={scannerState.last_scan_end_info === "failure"} />
 
@@ -131,7 +141,7 @@ const Toggle = ({children, target, enabled, active}) => {
   )
 }
 
-const ProgressBar = ({max, now, info, show}) => {
+const ProgressBar = ({max, now, info, show, writeQueue, recovery, compression}) => {
 
   const showStyle = "p-4 mt-2"
   const hiddenStyle = "h-0 p-0"
@@ -146,6 +156,37 @@ const ProgressBar = ({max, now, info, show}) => {
       <div className="w-full bg-gray-200 rounded-full h-1.5 dark:bg-gray-900">
         <div className="bg-purple-500 dark:bg-purple-400 h-1.5 rounded-full transition-all" style={{width: `${now / max * 100}%`}}></div>
       </div>
+      <div className="flex justify-between mt-1">
+        <span className="text-xs text-gray-500 dark:text-gray-400">Write queue {writeQueue.queue_depth} ({writeQueue.queued_mb} / {writeQueue.budget_mb} MB)</span>
+        <span className="text-xs text-gray-500 dark:text-gray-400">{writeQueue.write_mb_per_s} MB/s · {writeQueue.stall_time} s stalled</span>
+      </div>
+      <div className="flex justify-between">
+        <span className="text-xs text-gray-500 dark:text-gray-400">{recovery.active ? `Recovering (${recovery.stage}) ...` : `Recoveries ${recovery.recovered} (${recovery.failed} failed)`}</span>
+        <span className="text-xs text-gray-500 dark:text-gray-400">{recovery.time_s} s recovering</span>
+      </div>
+      <div className={"flex justify-between " + (compression.compressed > 0 ? "" : "hidden")}>
+        <span className="text-xs text-gray-500 dark:text-gray-400">Compression level {compression.level} · ratio {compression.ratio}</span>
+        <span className="text-xs text-gray-500 dark:text-gray-400">{compression.mb_per_s} MB/s · {compression.uncompressed} uncompressed</span>
+      </div>
+    </div>
+  )
+}
+
+const ConversionProgress = ({conversion}) => {
+
+  const showStyle = "p-4 mt-2"
+  const hiddenStyle = "h-0 p-0"
+
+  return (
+    <div className={"p-4 text-sm text-gray-700 bg-gray-100 rounded-lg dark:bg-gray-700 dark:text-gray-300 overflow-hidden transition-all " + (conversion.state !== "idle" ? showStyle : hiddenStyle)} role="alert">
+      <span className="font-medium">{conversion.state === "paused" ? "Converting paused while scanner is busy" : "Converting to DNG ..."}</span>
+      <div className="flex justify-between mb-1">
+        <span className="text-sm text-gray-500 dark:text-gray-400">{conversion.reel} · frame {conversion.done} of {conversion.frames}</span>
+        <span className="text-sm text-gray-500 dark:text-gray-400">{conversion.frames_per_s} fps{conversion.queued > 0 && ` · ${conversion.queued} queued`}</span>
+      </div>
+      <div className="w-full bg-gray-200 rounded-full h-1.5 dark:bg-gray-900">
+        <div className="bg-gray-500 dark:bg-gray-400 h-1.5 rounded-full transition-all" style={{width: `${conversion.frames > 0 ? conversion.done / conversion.frames * 100 : 0}%`}}></div>
+      </div>
     </div>
   )
 }
@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from threading import Lock, local
+
+import pigpio
+
+
+class GPIOConnection:
+    """
+    Single connection to the `pigpio` daemon shared by all hardware components of the
+    scanner. It can be used in place of a `pigpio.pi` object. In addition, it measures
+    the latency of every command sent to the daemon and can batch GPIO writes into bank
+    operations.
+
+    Parameters
+    ----------
+    host : str, optional
+        Host the `pigpio` daemon runs on. Defaults to `pigpio`'s default.
+    port : int, optional
+        Port the `pigpio` daemon listens on. Defaults to `pigpio`'s default.
+    pi : object, optional
+        Existing `pigpio.pi` (or compatible) object to wrap instead of opening a new
+        connection, e.g. a fake for testing.
+    """
+
+    def __init__(self, host=None, port=None, pi=None):
+        if pi is None:
+            kwargs = {"host": host, "port": port}
+            pi = pigpio.pi(**{k: v for k, v in kwargs.items() if v is not None})
+        self.pi = pi
+
+        self.latencies = {}
+        self.latencies_lock = Lock()
+        self.batch_state = local()
+        self.wrappers = {}
+
+    def __getattr__(self, name):
+        # Forward everything that is not overridden to the `pigpio.pi` object, timing
+        # every command.
+        attribute = getattr(self.pi, name)
+        if not callable(attribute):
+            return attribute
+        if name not in self.wrappers:
+
+            def wrapper(*args, **kwargs):
+                return self.timed(name, attribute, *args, **kwargs)
+
+            self.wrappers[name] = wrapper
+        return self.wrappers[name]
+
+    def timed(self, name, function, *args, **kwargs):
+        """
+        Call `function` and record how long it took under `name`.
+        """
+        t_start = time.perf_counter()
+        result = function(*args, **kwargs)
+        latency = time.perf_counter() - t_start
+
+        with self.latencies_lock:
+            count, total, maximum = self.latencies.get(name, (0, 0.0, 0.0))
+            self.latencies[name] = (count + 1, total + latency, max(maximum, latency))
+
+        return result
+
+    def write(self, gpio, level):
+        """
+        Set `gpio` to `level`. Inside a `batch` block, the write is deferred until the
+        block ends.
+        """
+        if getattr(self.batch_state, "depth", 0) > 0:
+            if level:
+                self.batch_state.set_mask |= 1 << gpio
+                self.batch_state.clear_mask &= ~(1 << gpio)
+            else:
+                self.batch_state.clear_mask |= 1 << gpio
+                self.batch_state.set_mask &= ~(1 << gpio)
+            return 0
+
+        return self.timed("write", self.pi.write, gpio, level)
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager collecting all GPIO writes made by the current thread inside
+        it and sending them as at most two bank operations (one clearing and one
+        setting GPIOs) when it exits.
+        """
+        state = self.batch_state
+        if getattr(state, "depth", 0) == 0:
+            state.set_mask = 0
+            state.clear_mask = 0
+            state.depth = 0
+
+        state.depth += 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                if state.clear_mask:
+                    self.timed("clear_bank_1", self.pi.clear_bank_1, state.clear_mask)
+                if state.set_mask:
+                    self.timed("set_bank_1", self.pi.set_bank_1, state.set_mask)
+
+    def reset_latencies(self):
+        with self.latencies_lock:
+            self.latencies = {}
+
+    @property
+    def stats(self):
+        """
+        Number of calls, mean and maximum latency in milliseconds per command.
+        """
+        with self.latencies_lock:
+            return {
+                name: {
+                    "count": count,
+                    "mean_ms": round(1e3 * total / count, 3),
+                    "max_ms": round(1e3 * maximum, 3),
+                }
+                for name, (count, total, maximum) in sorted(self.latencies.items())
+            }
@@ -0,0 +1,219 @@
+import json
+import os
+from threading import Lock
+
+from manifest import verify
+
+FILENAME = "journal.json"
+
+
+class ScanJournal:
+    """
+    Durable record of how far a scan got, kept in a JSON file in the scan's output
+    directory, such that a scan interrupted by a crash, a power cut or an error can be
+    resumed where it left off (see `FilmScanner.resume_scan`). Besides the arguments
+    of the scan, the journal holds the last durable frame: all frames from the scan's
+    first frame up to it were saved and flushed to storage.
+
+    Frames are saved by several writer threads and finish out of order, so the journal
+    tracks which frames were saved since the last durable frame. Once `batch_size`
+    more frames in a row were saved, they are flushed to storage with `os.sync`, which
+    also flushes the manifest and a reel container, and only then is the last durable
+    frame advanced and the journal written. The journal file itself is flushed to
+    storage on every write, so it never points at frames that were lost.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file the journal is persisted to. It is loaded if it exists.
+    batch_size : int, optional
+        Number of frames saved in a row after which they are flushed to storage.
+    """
+
+    def __init__(self, path, batch_size=25):
+        self.path = path
+        self.batch_size = batch_size
+
+        self.lock = Lock()
+        self.sync_lock = Lock()
+
+        self.parameters = None
+        self.reel_container = False
+        self.start_position = None
+        self.durable_frame = None
+        self.is_complete = False
+
+        # First frame not yet saved and frames saved after it
+        self.next_frame = None
+        self.saved_frames = set()
+
+        self.load()
+
+    def begin(self, parameters, reel_container, start_position):
+        """
+        Start journaling a new scan with the keyword arguments `parameters` of
+        `FilmScanner.scan`, e.g. `{"n_frames": 3800, "start_index": 0, ...}`, writing
+        to a reel container if `reel_container` is set and starting at the reel
+        position `start_position`.
+        """
+        with self.lock:
+            self.parameters = parameters
+            self.reel_container = reel_container
+            self.start_position = start_position
+            self.durable_frame = None
+            self.is_complete = False
+            self.next_frame = parameters["start_index"]
+            self.saved_frames.clear()
+        self.save()
+
+    def resume(self, frame_index):
+        """
+        Continue journaling the scan at `frame_index`, considering all frames before it
+        durable.
+        """
+        with self.lock:
+            first_index = self.parameters["start_index"]
+            self.durable_frame = frame_index - 1 if frame_index > first_index else None
+            self.is_complete = False
+            self.next_frame = frame_index
+            self.saved_frames.clear()
+        self.save()
+
+    def record_saved(self, frame_index):
+        """
+        Record that the frame at `frame_index` was saved. Flushes the frames saved so
+        far to storage whenever another batch of frames in a row was saved. Called from
+        the writer threads.
+        """
+        with self.lock:
+            self.saved_frames.add(frame_index)
+            while self.next_frame in self.saved_frames:
+                self.saved_frames.remove(self.next_frame)
+                self.next_frame += 1
+            last_durable_frame = (
+                self.durable_frame
+                if self.durable_frame is not None
+                else self.parameters["start_index"] - 1
+            )
+            is_due = self.next_frame - 1 - last_durable_frame >= self.batch_size
+
+        # While another writer thread is flushing, the next batch covers this frame
+        if is_due:
+            self.sync(blocking=False)
+
+    def sync(self, blocking=True):
+        """
+        Flush all frames saved so far to storage and advance the last durable frame. If
+        `blocking` is `False`, returns right away when another thread is flushing.
+        """
+        if not self.sync_lock.acquire(blocking=blocking):
+            return
+        try:
+            with self.lock:
+                frame_index = self.next_frame - 1
+                if frame_index < self.parameters["start_index"] or (
+                    self.durable_frame is not None and frame_index <= self.durable_frame
+                ):
+                    return
+
+            os.sync()
+
+            with self.lock:
+                self.durable_frame = frame_index
+            self.save()
+        finally:
+            self.sync_lock.release()
+
+    def finish(self, is_complete):
+        """
+        Flush the frames saved so far at the end of a scan. Set `is_complete` if the
+        scan reached its last frame or the end of the reel, such that it cannot be
+        resumed.
+        """
+        self.sync()
+        with self.lock:
+            self.is_complete = is_complete
+        self.save()
+
+    def load(self):
+        """
+        Load the journal from the JSON file, if it exists.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            content = json.load(f)
+        self.parameters = content["parameters"]
+        self.reel_container = content["reel_container"]
+        self.start_position = content["start_position"]
+        self.durable_frame = content["durable_frame"]
+        self.is_complete = content["is_complete"]
+
+    def save(self):
+        """
+        Persist the journal to the JSON file and flush it to storage.
+        """
+        with self.lock:
+            content = {
+                "parameters": self.parameters,
+                "reel_container": self.reel_container,
+                "start_position": self.start_position,
+                "durable_frame": self.durable_frame,
+                "is_complete": self.is_complete,
+            }
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(content, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        # Make the rename itself durable
+        directory_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+
+def resume_point(directory, journal, manifest, n_validated=None):
+    """
+    Frame index and reel position at which to resume the journaled scan in
+    `directory`. The last `n_validated` durable frames, by default one batch of the
+    journal, are validated against their size and checksum in the `manifest`. The scan
+    resumes at the first of them that is missing or invalid, or after the last durable
+    frame if all of them are valid.
+
+    Returns
+    -------
+    frame_index : int
+        Index of the first frame to scan.
+    position : int
+        Reel position to move the film to before scanning the frame.
+    """
+    first_index = journal.parameters["start_index"]
+    if journal.durable_frame is None:
+        return first_index, journal.start_position
+
+    if n_validated is None:
+        n_validated = journal.batch_size
+    low = max(first_index, journal.durable_frame - n_validated + 1)
+    where = f"frame_index BETWEEN {low} AND {journal.durable_frame}"
+
+    saved = {
+        frame["frame_index"]
+        for frame in manifest.frames(f"path IS NOT NULL AND {where}")
+    }
+    invalid = {frame_index for frame_index, _ in verify(directory, manifest, where)}
+    invalid |= set(range(low, journal.durable_frame + 1)) - saved
+
+    frame_index = min(invalid) if invalid else journal.durable_frame + 1
+    if frame_index == first_index:
+        return first_index, journal.start_position
+
+    # The film is advanced by one frame after every frame
+    previous = manifest.frames(f"frame_index = {frame_index - 1}")
+    if not previous or previous[0]["position"] is None:
+        raise ValueError(f"Reel position of frame {frame_index - 1} is unknown")
+    return frame_index, previous[0]["position"] + 1
@@ -0,0 +1,212 @@
+import argparse
+import os
+import sqlite3
+import zlib
+from pathlib import Path
+from threading import Lock
+
+FILENAME = "manifest.sqlite"
+
+COLUMNS = {
+    "path": "TEXT",  # File of the frame, relative to the scan's output directory
+    "offset": "INTEGER",  # Offset within the file if it is a reel container
+    "size": "INTEGER",
+    "crc32": "INTEGER",
+    "captured_at": "REAL",  # Unix time
+    "position": "INTEGER",  # Reel position the frame was captured at
+    "settle_time": "REAL",  # Seconds waited for the film to come to rest
+    "advance_duration": "REAL",  # Seconds the advance to the next frame took
+    "is_blank": "INTEGER",
+    "is_duplicate": "INTEGER",
+    "is_dark": "INTEGER",
+}
+
+
+class FrameManifest:
+    """
+    Table of facts about every frame of a scan, kept in an SQLite database in the
+    scan's output directory. Frames are added and updated as their facts become known
+    during the scan, e.g. the capture time in the scan loop and the size and checksum
+    once a writer thread saved the frame. Every update is committed right away to a
+    write-ahead log, so the manifest survives crashes of the scanner without the cost
+    of flushing the database to storage for every frame.
+
+    Tools working on a scan can read the manifest instead of listing and opening
+    thousands of frame files.
+
+    Parameters
+    ----------
+    path : str
+        Path of the database file. It is created if it does not exist yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.lock = Lock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f"{name} {type_}" for name, type_ in COLUMNS.items())
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS frames"
+                f" (frame_index INTEGER PRIMARY KEY, {columns})"
+            )
+            # Manifests written by older versions may lack some of the columns
+            existing = {
+                row["name"]
+                for row in self.connection.execute("PRAGMA table_info(frames)")
+            }
+            for name, type_ in COLUMNS.items():
+                if name not in existing:
+                    self.connection.execute(
+                        f"ALTER TABLE frames ADD COLUMN {name} {type_}"
+                    )
+
+    def update(self, frame_index, **fields):
+        """
+        Set the given `fields` of the frame at `frame_index`, adding the frame if it is
+        not in the manifest yet. Field names are those in `COLUMNS`.
+        """
+        names = list(fields)
+        for name in names:
+            if name not in COLUMNS:
+                raise ValueError(f'Unknown manifest field "{name}"')
+
+        with self.lock:
+            self.connection.execute(
+                f"INSERT INTO frames (frame_index, {', '.join(names)})"
+                f" VALUES ({', '.join('?' * (len(names) + 1))})"
+                " ON CONFLICT (frame_index) DO UPDATE SET"
+                f" {', '.join(f'{name} = excluded.{name}' for name in names)}",
+                [frame_index, *fields.values()],
+            )
+
+    def frames(self, where=None):
+        """
+        All frames ordered by index as `sqlite3.Row` objects, or only those matching
+        the SQL condition `where`, e.g. `"is_blank"`.
+        """
+        query = "SELECT * FROM frames"
+        if where is not None:
+            query += f" WHERE {where}"
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY frame_index").fetchall()
+
+    def truncate(self, frame_index):
+        """
+        Remove the frames from `frame_index` on, e.g. before they are scanned again.
+        """
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM frames WHERE frame_index >= ?", [frame_index]
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ChecksumFile:
+    """
+    Wrapper around a writable file object `f` that computes the CRC32 and counts the
+    bytes of everything written to it.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.crc32 = 0
+        self.size = 0
+
+    def write(self, b):
+        n = self.f.write(b)
+        self.crc32 = zlib.crc32(b, self.crc32)
+        self.size += n
+        return n
+
+
+def open_manifest(directory):
+    """
+    Open the manifest of the scan in `directory`, or return `None` if it has none.
+    """
+    path = Path(directory) / FILENAME
+    return FrameManifest(str(path)) if path.is_file() else None
+
+
+def verify(directory, manifest, where=None):
+    """
+    Check the size and checksum of every saved frame of the scan in `directory`, or
+    only of those matching the SQL condition `where`, against the `manifest`. Returns
+    a list of `(frame_index, problem)` tuples.
+    """
+    problems = []
+    condition = "path IS NOT NULL" + (f" AND ({where})" if where is not None else "")
+    for frame in manifest.frames(condition):
+        path = Path(directory) / frame["path"]
+        try:
+            with open(path, "rb") as f:
+                f.seek(frame["offset"] or 0)
+                data = f.read(frame["size"])
+        except OSError:
+            problems.append((frame["frame_index"], "missing"))
+            continue
+        if len(data) != frame["size"]:
+            problems.append((frame["frame_index"], "truncated"))
+        elif zlib.crc32(data) != frame["crc32"]:
+            problems.append((frame["frame_index"], "checksum mismatch"))
+    return problems
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Inspect the manifest of a scan.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = subparsers.add_parser("summary", help="Summarise the scan")
+    summary_parser.add_argument("directory", help="Output directory of the scan")
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="Check the size and checksum of every frame"
+    )
+    verify_parser.add_argument("directory", help="Output directory of the scan")
+
+    blank_parser = subparsers.add_parser(
+        "blank", help="List the files of blank frames, e.g. to delete them"
+    )
+    blank_parser.add_argument("directory", help="Output directory of the scan")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    manifest = open_manifest(args.directory)
+    if manifest is None:
+        raise SystemExit(f'No manifest found in "{args.directory}"')
+
+    if args.command == "summary":
+        frames = manifest.frames()
+        saved = [frame for frame in frames if frame["path"] is not None]
+        print(f"{len(frames)} frames captured, {len(saved)} saved")
+        print(f"{sum(frame['size'] for frame in saved) / 1e9:.1f} GB")
+        for flag in ("is_blank", "is_duplicate", "is_dark"):
+            n = sum(1 for frame in frames if frame[flag])
+            print(f"{n} {flag[3:]} frames")
+    elif args.command == "verify":
+        problems = verify(args.directory, manifest)
+        for frame_index, problem in problems:
+            print(f"Frame {frame_index}: {problem}")
+        print(f"{len(problems)} problems found")
+    elif args.command == "blank":
+        for frame in manifest.frames("is_blank AND offset IS NULL"):
+            print(os.path.join(args.directory, frame["path"]))
+
+    manifest.close()
+
+
+if __name__ == "__main__":
+    main()
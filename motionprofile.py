@@ -0,0 +1,372 @@
+import abc
+import argparse
+import itertools
+import math
+import statistics
+import time
+
+# pigpio allows at most 20 loop counters in a wave chain, and `StepperMotor.send_ramp`
+# repeats every level of more than one step with a counter. 19 levels, including the
+# level the motor stays at, leave one counter spare.
+MAX_RAMP_LEVELS = 19
+
+
+def quantise(frequency):
+    """
+    Round `frequency` to the nearest frequency a `pigpio` step waveform with a
+    whole-microsecond half-period can produce. This keeps the number of distinct
+    waveforms that need to be created on the daemon small.
+    """
+    micros = max(1, round(5e5 / frequency))
+    return 5e5 / micros
+
+
+def ramp_duration(ramp):
+    """
+    Duration in seconds of a list of `(frequency, steps)` pairs.
+    """
+    return sum(steps / frequency for frequency, steps in ramp)
+
+
+def steps_after(ramp, duration):
+    """
+    Number of steps a list of `(frequency, steps)` pairs has produced after
+    `duration` seconds.
+    """
+    steps_done = 0
+    for frequency, steps in ramp:
+        level_duration = steps / frequency
+        if duration < level_duration:
+            return steps_done + int(duration * frequency)
+        steps_done += steps
+        duration -= level_duration
+    return steps_done
+
+
+def coarsen(ramp, max_levels):
+    """
+    Merge neighbouring levels of a ramp until it has at most `max_levels` levels. Merged
+    levels run at the frequency that keeps their duration unchanged.
+    """
+    while len(ramp) > max_levels:
+        merged = []
+        for pair in zip(ramp[::2], ramp[1::2]):
+            steps = sum(steps for _, steps in pair)
+            merged.append((quantise(steps / ramp_duration(pair)), steps))
+        if len(ramp) % 2:
+            merged.append(ramp[-1])
+        ramp = merged
+    return ramp
+
+
+class MotionProfile(abc.ABC):
+    """
+    Base class of continuous acceleration profiles for `StepperMotor`. A profile turns
+    a target step frequency into a ramp, i.e. a list of `(frequency, steps)` pairs, of
+    arbitrary resolution. Subclasses define the shape of the ramp by implementing
+    `velocity` and `duration`.
+
+    Parameters
+    ----------
+    acceleration : float
+        Maximum acceleration in steps per second squared.
+    start_frequency : float, optional
+        Step frequency in Hz that the motor can start and stop at without ramping.
+    resolution : int, optional
+        Number of steps per ramp level. Ramps that would exceed `MAX_RAMP_LEVELS` levels
+        are coarsened automatically.
+    """
+
+    def __init__(self, acceleration, start_frequency=320, resolution=1):
+        self.acceleration = acceleration
+        self.start_frequency = start_frequency
+        self.resolution = resolution
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(acceleration={self.acceleration})"
+
+    @abc.abstractmethod
+    def velocity(self, t, start_frequency, target_frequency):
+        """
+        Step frequency in Hz at `t` seconds into ramping up from `start_frequency` to
+        `target_frequency`.
+        """
+
+    @abc.abstractmethod
+    def duration(self, start_frequency, target_frequency):
+        """
+        Duration in seconds of ramping up from `start_frequency` to `target_frequency`.
+        """
+
+    def make_ramp(self, target_frequency, rising=True, stay=0):
+        """
+        Make list of `(frequency, step)` pairs to ramp up the motor and stay at the
+        target speed for `stay` steps. Set `rising` to `False` to get the ramp for
+        stopping from `target_frequency` instead.
+        """
+        start_frequency = min(self.start_frequency, target_frequency)
+
+        ramp = self.ramp_up(start_frequency, target_frequency)
+        if stay > 0:
+            ramp.append((quantise(target_frequency), stay))
+
+        return ramp if rising else list(reversed(ramp))
+
+    def ramp_up(self, start_frequency, target_frequency):
+        """
+        Sample the profile into ramp levels of `resolution` steps each by integrating
+        its velocity over time.
+        """
+        duration = self.duration(start_frequency, target_frequency)
+        dt = 0.05 / target_frequency
+
+        ramp = []
+        t, position = 0.0, 0.0
+        t_level, position_level = 0.0, 0.0
+        while t < duration:
+            velocity = self.velocity(t + dt / 2, start_frequency, target_frequency)
+            position += velocity * dt
+            t += dt
+            steps = int(position - position_level)
+            if steps >= self.resolution:
+                ramp.append((quantise(steps / (t - t_level)), steps))
+                t_level, position_level = t, position_level + steps
+
+        # Merge neighbouring levels that ended up at the same waveform
+        merged = []
+        for frequency, steps in ramp:
+            if merged and merged[-1][0] == frequency:
+                merged[-1] = (frequency, merged[-1][1] + steps)
+            else:
+                merged.append((frequency, steps))
+
+        return coarsen(merged, MAX_RAMP_LEVELS - 1)
+
+
+class TrapezoidalProfile(MotionProfile):
+    """
+    Profile accelerating at constant `acceleration` until the target frequency is
+    reached. The parameters are the same as those of `MotionProfile`.
+    """
+
+    def velocity(self, t, start_frequency, target_frequency):
+        return min(start_frequency + self.acceleration * t, target_frequency)
+
+    def duration(self, start_frequency, target_frequency):
+        return (target_frequency - start_frequency) / self.acceleration
+
+
+class SCurveProfile(MotionProfile):
+    """
+    Jerk-limited profile whose acceleration rises and falls linearly, which avoids the
+    sudden changes in torque of a trapezoidal profile.
+
+    Parameters
+    ----------
+    acceleration : float
+        Maximum acceleration in steps per second squared.
+    jerk : float
+        Maximum jerk in steps per second cubed.
+    start_frequency : float, optional
+        Step frequency in Hz that the motor can start and stop at without ramping.
+    resolution : int, optional
+        Number of steps per ramp level.
+    """
+
+    def __init__(self, acceleration, jerk, start_frequency=320, resolution=1):
+        super().__init__(acceleration, start_frequency, resolution)
+        self.jerk = jerk
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(acceleration={self.acceleration},"
+            f" jerk={self.jerk})"
+        )
+
+    def phases(self, start_frequency, target_frequency):
+        """
+        Peak acceleration, duration of each jerk phase and duration of the constant
+        acceleration phase.
+        """
+        delta = target_frequency - start_frequency
+        if delta >= self.acceleration**2 / self.jerk:
+            peak_acceleration = self.acceleration
+            t_jerk = self.acceleration / self.jerk
+            t_constant = delta / self.acceleration - t_jerk
+        else:
+            peak_acceleration = math.sqrt(delta * self.jerk)
+            t_jerk = peak_acceleration / self.jerk
+            t_constant = 0.0
+        return peak_acceleration, t_jerk, t_constant
+
+    def velocity(self, t, start_frequency, target_frequency):
+        peak_acceleration, t_jerk, t_constant = self.phases(
+            start_frequency, target_frequency
+        )
+        t_total = 2 * t_jerk + t_constant
+        if t < t_jerk:
+            return start_frequency + self.jerk * t**2 / 2
+        elif t < t_jerk + t_constant:
+            return (
+                start_frequency
+                + self.jerk * t_jerk**2 / 2
+                + peak_acceleration * (t - t_jerk)
+            )
+        elif t < t_total:
+            return target_frequency - self.jerk * (t_total - t) ** 2 / 2
+        else:
+            return target_frequency
+
+    def duration(self, start_frequency, target_frequency):
+        _, t_jerk, t_constant = self.phases(start_frequency, target_frequency)
+        return 2 * t_jerk + t_constant
+
+
+def measure_advance(scanner, speed, acceleration=24):
+    """
+    Advance `scanner` by one frame with its motor's current profile and measure the
+    steps it took.
+
+    Returns
+    -------
+    result : tuple
+        Tuple `(was_detected, duration, steps_to_sensor, steps_total)` of whether the
+        frame sensor was reached, the time in seconds until it was reached, the steps
+        sent to the motor until then and the steps sent during the whole advance.
+    """
+    motor = scanner.motor
+    frequency = motor.rpm2hz(speed)
+    ramp_up = motor.make_ramp(frequency, motor.rpm2hz(acceleration), stay=10**6)
+    ramp_down = motor.make_ramp(frequency, -motor.rpm2hz(acceleration))
+    t_expected = 0.487 * 300 / speed  # Scaled from the measured time at 300 RPM
+
+    motor.enable()
+    t_start = time.perf_counter()
+    motor.start(speed=speed, acceleration=acceleration)
+    time.sleep(0.25 * t_expected)  # Move magnet out of range before arming sensor
+    was_detected = scanner.frame_sensor.wait_for_trigger(timeout=4 * t_expected)
+    t_sensor = time.perf_counter() - t_start
+    motor.stop(deceleration=acceleration)
+    t_stop = time.perf_counter() - t_start
+    time.sleep(ramp_duration(ramp_down))
+    motor.disable()
+
+    steps_to_sensor = steps_after(ramp_up, t_sensor)
+    steps_total = steps_after(ramp_up, t_stop) + sum(steps for _, steps in ramp_down)
+
+    return was_detected, t_sensor, steps_to_sensor, steps_total
+
+
+def evaluate(scanner, profile, speed, n_advances=20, tolerance=5):
+    """
+    Run `n_advances` advances with `profile` at `speed` RPM and check that no steps were
+    skipped. The steps between consecutive sensor detections must be the same for every
+    frame, as the mechanism needs the same number of steps per frame. Skipped steps
+    show up as frames that needed more steps than the others.
+
+    Returns
+    -------
+    result : dict
+        Mean advance duration, maximum deviation of steps per frame from their median
+        and whether the profile passed.
+    """
+    scanner.motor.profile = profile
+
+    durations, frame_steps = [], []
+    overshoot = None
+    for _ in range(n_advances):
+        was_detected, duration, steps_to_sensor, steps_total = measure_advance(
+            scanner, speed
+        )
+        if not was_detected:
+            return {"duration": math.inf, "deviation": math.inf, "passed": False}
+        durations.append(duration)
+        if overshoot is not None:
+            frame_steps.append(overshoot + steps_to_sensor)
+        overshoot = steps_total - steps_to_sensor
+
+    median_steps = statistics.median(frame_steps)
+    deviation = max(abs(steps - median_steps) for steps in frame_steps)
+
+    return {
+        "duration": statistics.mean(durations),
+        "deviation": deviation,
+        "passed": deviation <= tolerance,
+    }
+
+
+def sweep(scanner, profiles, speeds, n_advances=20, tolerance=5):
+    """
+    Evaluate every combination of `profiles` and `speeds` (in RPM) and find the fastest
+    one that never skips steps.
+
+    Returns
+    -------
+    best : tuple
+        Tuple `(profile, speed, result)` of the fastest passing combination, or `None`
+        if no combination passed.
+    """
+    best = None
+    for profile, speed in itertools.product(profiles, speeds):
+        result = evaluate(scanner, profile, speed, n_advances, tolerance)
+        print(
+            f"{profile} at {speed} RPM: duration={result['duration']:.3f} s /"
+            f" deviation={result['deviation']} steps /"
+            f" {'passed' if result['passed'] else 'FAILED'}"
+        )
+        is_faster = best is None or result["duration"] < best[2]["duration"]
+        if result["passed"] and is_faster:
+            best = (profile, speed, result)
+    return best
+
+
+def parse_arguments():
+    """
+    Parse command line arguments to the profile sweep. Returns the `args` object.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Find the fastest motion profile that never skips steps. Stop the scanner"
+            " server before running this."
+        )
+    )
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=["trapezoidal", "s-curve"],
+        choices=["trapezoidal", "s-curve"],
+    )
+    parser.add_argument(
+        "--accelerations", nargs="+", type=float, default=[10000, 20000, 40000]
+    )
+    parser.add_argument("--jerk", type=float, default=2e6)
+    parser.add_argument("--speeds", nargs="+", type=int, default=[300, 400, 500])
+    parser.add_argument("--advances", type=int, default=20)
+    parser.add_argument("--tolerance", type=int, default=5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    from filmscanner import FilmScanner
+
+    profiles = []
+    for shape, acceleration in itertools.product(args.shapes, args.accelerations):
+        if shape == "trapezoidal":
+            profiles.append(TrapezoidalProfile(acceleration))
+        else:
+            profiles.append(SCurveProfile(acceleration, args.jerk))
+
+    scanner = FilmScanner()
+    best = sweep(scanner, profiles, args.speeds, args.advances, args.tolerance)
+
+    if best is None:
+        print("No profile passed")
+    else:
+        profile, speed, result = best
+        print(f"Fastest: {profile} at {speed} RPM ({result['duration']:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
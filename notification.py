@@ -36,10 +36,17 @@ class EmailNotifier:
 
 
 class MailCallback(BaseCallback):
-    """Callback for sending an e-mail notification when a scan finished."""
+    """Callback for sending an e-mail notification when a scan finished or aborted."""
 
     def __init__(self):
         self.notifier = EmailNotifier()
 
     def on_scan_end(self):
         self.notifier.send(f"Finished scanning {self.scanner.n_frames} frames!")
+
+    def on_recovery_end(self):
+        if self.scanner.recovery.last_outcome == "failed":
+            self.notifier.send(
+                "Scan aborted: could not recover the frame advance at frame"
+                f" {self.scanner.current_frame_index}!"
+            )
@@ -0,0 +1,295 @@
+import logging
+import queue
+import time
+from collections import deque
+from threading import Condition, Thread
+
+logger = logging.getLogger("filmscanner.pipeline")
+
+
+class Stage:
+    """
+    Pipeline stage that processes items from a bounded queue on its own worker thread.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage used in logs and statistics.
+    function : function
+        Function called with every item put into the stage.
+    maxsize : int, optional
+        Maximum number of items waiting in the stage's queue. When the queue is full,
+        `put` blocks until there is space again.
+    lossy : bool, optional
+        When set to `True`, `put` never blocks. Instead the item is dropped if the
+        queue is full. Use this for stages whose work may be skipped, e.g. previews.
+    """
+
+    _STOP = object()
+
+    def __init__(self, name, function, maxsize=1, lossy=False):
+        self.name = name
+        self.function = function
+        self.lossy = lossy
+
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = Thread(target=self.run, name=f"stage-{name}", daemon=True)
+
+        self.n_processed = 0
+        self.n_dropped = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self.t_start = None
+
+    def start(self):
+        """
+        Start the stage's worker thread.
+        """
+        self.t_start = time.monotonic()
+        self.thread.start()
+
+    def put(self, item):
+        """
+        Submit an item to this stage. Blocks while the queue is full unless the stage is
+        lossy. Returns `False` if the item was dropped and `True` otherwise.
+        """
+        if self.lossy:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.n_dropped += 1
+                return False
+            return True
+
+        t_put = time.monotonic()
+        self.queue.put(item)
+        self.blocked_time += time.monotonic() - t_put
+        return True
+
+    def close(self):
+        """
+        Process all items still in the queue and stop the worker thread. Returns only
+        once the worker thread has finished.
+        """
+        self.queue.put(self._STOP)
+        self.thread.join()
+
+    def run(self):
+        """
+        Worker loop processing items until the stage is closed.
+        """
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                break
+
+            t_item = time.monotonic()
+            try:
+                self.function(item)
+            except Exception as e:
+                logger.error(f'Stage "{self.name}" failed to process an item: {e}')
+            self.busy_time += time.monotonic() - t_item
+            self.n_processed += 1
+
+    @property
+    def occupancy(self):
+        """
+        Fraction of the time since the stage was started that it spent processing
+        items.
+        """
+        if self.t_start is None:
+            return 0.0
+        elapsed = time.monotonic() - self.t_start
+        return self.busy_time / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def stats(self):
+        return {
+            "occupancy": round(self.occupancy, 3),
+            "queue_depth": self.queue.qsize(),
+            "processed": self.n_processed,
+            "dropped": self.n_dropped,
+            "blocked_time": round(self.blocked_time, 3),
+        }
+
+
+class ScanPipeline:
+    """
+    Collection of pipeline stages that frames are handed to after capture, such that
+    the scan loop can return to advancing the film right away.
+
+    Parameters
+    ----------
+    stages : list
+        List of `Stage` objects making up the pipeline.
+    """
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def start(self):
+        """
+        Start all stages.
+        """
+        for stage in self.stages.values():
+            stage.start()
+
+    def close(self):
+        """
+        Drain and stop all stages in the order they were given.
+        """
+        for stage in self.stages.values():
+            stage.close()
+
+    @property
+    def stats(self):
+        return {name: stage.stats for name, stage in self.stages.items()}
+
+    def log_stats(self):
+        """
+        Log the occupancy of every stage.
+        """
+        for name, stats in self.stats.items():
+            logger.info(
+                f'Stage "{name}": occupancy={stats["occupancy"]:.1%}'
+                f' / processed={stats["processed"]} / dropped={stats["dropped"]}'
+                f' / blocked={stats["blocked_time"]:.1f}s'
+            )
+
+
+class WriteBehindQueue:
+    """
+    Queue of frames waiting to be written to storage by a number of writer threads.
+    Submitting a frame only blocks when the frames already waiting take up more memory
+    than the configured budget, such that short storage latency spikes do not stall the
+    scan.
+
+    Parameters
+    ----------
+    write : function
+        Function called as `write(frame, filepath)` to write a frame.
+    budget : int, optional
+        Maximum number of bytes held by frames that are waiting or being written.
+    n_writers : int, optional
+        Number of writer threads.
+    """
+
+    def __init__(self, write, budget=160_000_000, n_writers=2):
+        self.write = write
+        self.budget = budget
+
+        self.queue = queue.Queue()
+        self.condition = Condition()
+        self.bytes_pending = 0
+        self.n_pending = 0
+        self.error = None
+
+        self.stall_time = 0.0
+        self.bytes_written = 0
+        self.completions = deque(maxlen=16)
+
+        self.writers = [
+            Thread(target=self.run, name=f"writer-{i}", daemon=True)
+            for i in range(n_writers)
+        ]
+        for writer in self.writers:
+            writer.start()
+
+    def submit(self, frame, filepath, on_written=None):
+        """
+        Submit a frame to be written to `filepath`. Blocks while the memory budget is
+        exhausted. Raises the exception of a previously failed write, if there was one.
+        If given, `on_written` is called without arguments once the write has finished
+        or failed.
+        """
+        self.raise_error()
+
+        size = len(frame)
+        with self.condition:
+            t_submit = time.monotonic()
+            # Always admit a frame into an empty queue, even if it exceeds the budget
+            while self.n_pending > 0 and self.bytes_pending + size > self.budget:
+                self.condition.wait()
+            self.stall_time += time.monotonic() - t_submit
+
+            self.bytes_pending += size
+            self.n_pending += 1
+
+        self.queue.put((frame, filepath, size, on_written))
+
+    def flush(self):
+        """
+        Block until all submitted frames have been written. Raises the exception of a
+        failed write, if there was one.
+        """
+        with self.condition:
+            while self.n_pending > 0:
+                self.condition.wait()
+        self.raise_error()
+
+    def raise_error(self):
+        """
+        Raise the exception of a failed write, if there was one, and reset it.
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def run(self):
+        """
+        Writer loop writing frames as they are submitted.
+        """
+        while True:
+            frame, filepath, size, on_written = self.queue.get()
+
+            try:
+                self.write(frame, filepath)
+            except Exception as e:
+                logger.error(f'Failed to write "{filepath}": {e}')
+                self.error = e
+            else:
+                with self.condition:
+                    self.bytes_written += size
+                    self.completions.append((time.monotonic(), size))
+
+            del frame  # Release the frame's memory before waking up submitters
+            if on_written is not None:
+                on_written()
+            with self.condition:
+                self.bytes_pending -= size
+                self.n_pending -= 1
+                self.condition.notify_all()
+
+    def reset_stats(self):
+        """
+        Reset the statistics, e.g. at the start of a new scan.
+        """
+        with self.condition:
+            self.stall_time = 0.0
+            self.bytes_written = 0
+            self.completions.clear()
+
+    @property
+    def write_rate(self):
+        """
+        Recent write throughput in bytes per second.
+        """
+        with self.condition:
+            if len(self.completions) < 2:
+                return 0.0
+            (t_first, _), (t_last, _) = self.completions[0], self.completions[-1]
+            n_bytes = sum(size for _, size in list(self.completions)[1:])
+        return n_bytes / (t_last - t_first) if t_last > t_first else 0.0
+
+    @property
+    def stats(self):
+        return {
+            "queue_depth": self.n_pending,
+            "queued_mb": round(self.bytes_pending / 1e6, 1),
+            "budget_mb": round(self.budget / 1e6, 1),
+            "write_mb_per_s": round(self.write_rate / 1e6, 1),
+            "stall_time": round(self.stall_time, 2),
+        }
@@ -0,0 +1,228 @@
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+import bayer
+
+# A raw file is a header followed by `height` rows of `width * 3 // 2` bytes of sensor
+# data, packed like in the raw block appended to the camera's JPEGs but without the
+# padding of rows and columns. Since version 2, the data may be cropped to a box of the
+# sensor whose origin is stored in the header. Since version 3, the data may be
+# compressed losslessly (see `encode`).
+MAGIC = b"FSRW"
+VERSION = 3
+HEADERS = {
+    1: struct.Struct("<4sBBHH"),  # Magic, version, bayer order, width, height
+    2: struct.Struct("<4sBBHHHH"),  # As version 1, plus x and y of the crop origin
+    3: struct.Struct("<4sBBHHHHB3x"),  # As version 2, plus the codec
+}
+HEADER = HEADERS[VERSION]
+
+CODEC_NONE = 0
+CODEC_DELTA_ZLIB = 1
+STREAM_LENGTH = struct.Struct("<I")
+
+BAYER_ORDER_CODES = {order: code for code, order in bayer.BAYER_ORDERS.items()}
+
+RawFrame = namedtuple("RawFrame", ["width", "height", "bayer_order", "data", "x", "y"])
+
+
+def crop_box(layout, region=None):
+    """
+    Box of pixels covered by a `region` of the sensor given as `(x, y, width, height)`
+    in fractions of the sensor size, like `PiCamera.zoom`. The box is rounded to even
+    pixels, such that it starts on the same colour of the bayer pattern and does not
+    split the pairs of pixels sharing their packed bytes.
+
+    Returns
+    -------
+    box : tuple
+        Tuple `(x, y, width, height)` in pixels. Covers the whole sensor if `region` is
+        `None`.
+    """
+    if region is None:
+        return 0, 0, layout.width, layout.height
+
+    x, y, width, height = region
+    x_start = min(round(x * layout.width / 2) * 2, layout.width - 2)
+    y_start = min(round(y * layout.height / 2) * 2, layout.height - 2)
+    x_stop = min(round((x + width) * layout.width / 2) * 2, layout.width)
+    y_stop = min(round((y + height) * layout.height / 2) * 2, layout.height)
+    return (
+        x_start,
+        y_start,
+        max(x_stop - x_start, 2),
+        max(y_stop - y_start, 2),
+    )
+
+
+def write(f, raw, layout=None, box=None, compress=None, chunk_rows=256):
+    """
+    Write the sensor data of a raw block, i.e. the bytes the camera appends to a JPEG
+    when capturing with `bayer=True`, to the file object `f` in the raw file format.
+    Takes the same arguments as `chunks`.
+
+    Returns
+    -------
+    n_bytes : int
+        Number of bytes written.
+    """
+    n_bytes, pieces = chunks(raw, layout, box, compress, chunk_rows)
+    for piece in pieces:
+        f.write(piece)
+    return n_bytes
+
+
+def chunks(raw, layout=None, box=None, compress=None, chunk_rows=256):
+    """
+    Encode the sensor data of a raw block in the raw file format as a sequence of
+    chunks, such that it can be written without first copying the whole frame into
+    one buffer. Uncompressed rows are copied out of the raw block `chunk_rows` at a
+    time, as they are padded there.
+
+    Parameters
+    ----------
+    raw : bytes-like
+        Raw block to encode.
+    layout : BayerLayout, optional
+        Layout of the raw block. Read from its header if not given.
+    box : tuple, optional
+        Box `(x, y, width, height)` of pixels to crop the sensor data to, as returned
+        by `crop_box`. Encodes the whole sensor if not given.
+    compress : function, optional
+        Function called with the (cropped) sensor data as a contiguous 2D `uint8`
+        array, returning the data encoded with `encode` or `None` to write it
+        uncompressed. Encodes uncompressed data if not given.
+
+    Returns
+    -------
+    n_bytes : int
+        Total number of bytes of the chunks.
+    chunks : generator
+        Generator of the bytes-like chunks in order.
+    """
+    if layout is None:
+        layout = bayer.read_layout(raw)
+    x, y, width, height = crop_box(layout) if box is None else box
+    data = bayer.sensor_data(raw, layout)[
+        y : y + height, x * 3 // 2 : (x + width) * 3 // 2
+    ]
+
+    payload = None
+    if compress is not None:
+        payload = compress(np.ascontiguousarray(data))
+    codec = CODEC_NONE if payload is None else CODEC_DELTA_ZLIB
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        BAYER_ORDER_CODES[layout.bayer_order],
+        width,
+        height,
+        x,
+        y,
+        codec,
+    )
+    n_bytes = len(header) + (len(payload) if payload is not None else data.size)
+
+    def generate():
+        yield header
+        if payload is not None:
+            yield payload
+        else:
+            for start in range(0, height, chunk_rows):
+                yield np.ascontiguousarray(data[start : start + chunk_rows])
+
+    return n_bytes, generate()
+
+
+def encode(data, level=1):
+    """
+    Losslessly compress packed sensor data given as a 2D `uint8` array of rows of
+    `width * 3 // 2` bytes.
+
+    Every byte is replaced by its difference to the byte three bytes before it, which
+    belongs to the pixel of the same colour two pixels to the left, such that smooth
+    parts of the image turn into small values. The differences of the high 8 bits of
+    the pixels and of the bytes holding their low 4 bits are compressed separately
+    with zlib, as they have very different statistics. At `level` 1, zlib only
+    encodes runs of equal bytes, which is several times faster than searching for
+    repeated strings at higher levels and barely worse on noisy sensor data. Higher
+    levels pay off in the flat parts of a frame.
+    """
+    residual = data.reshape(len(data), -1, 3).copy()
+    residual[:, 1:] -= residual[:, :-1].copy()  # Wraps around modulo 256
+
+    strategy = zlib.Z_RLE if level == 1 else zlib.Z_DEFAULT_STRATEGY
+    streams = []
+    for plane in (residual[:, :, :2], residual[:, :, 2]):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+        streams.append(compressor.compress(np.ascontiguousarray(plane)))
+        streams[-1] += compressor.flush()
+
+    return STREAM_LENGTH.pack(len(streams[0])) + streams[0] + streams[1]
+
+
+def decode(payload, height, width):
+    """
+    Decompress sensor data of an image of `height` by `width` pixels that was
+    compressed with `encode`. Returns a 2D `uint8` array identical to the original.
+    """
+    payload = memoryview(payload)
+    (msb_length,) = STREAM_LENGTH.unpack_from(payload)
+    msb_start = STREAM_LENGTH.size
+    lsb_start = msb_start + msb_length
+
+    residual = np.empty((height, width // 2, 3), dtype=np.uint8)
+    residual[:, :, :2] = np.frombuffer(
+        zlib.decompress(payload[msb_start:lsb_start]), dtype=np.uint8
+    ).reshape(height, width // 2, 2)
+    residual[:, :, 2] = np.frombuffer(
+        zlib.decompress(payload[lsb_start:]), dtype=np.uint8
+    ).reshape(height, width // 2)
+
+    return np.cumsum(residual, axis=1, dtype=np.uint8).reshape(height, -1)
+
+
+def read(path):
+    """
+    Read the raw file at `path`. Uncompressed sensor data is memory-mapped rather than
+    read. See `parse` for the result.
+    """
+    return parse(np.memmap(path, dtype=np.uint8, mode="r"))
+
+
+def parse(buffer):
+    """
+    Parse a raw file given as a bytes-like `buffer`, e.g. a frame of a reel container
+    (see `reel.py`). Uncompressed sensor data is returned as a view of `buffer`.
+
+    Returns
+    -------
+    frame : RawFrame
+        Width and height of the image in pixels, its Bayer order as a string, e.g.
+        `"BGGR"`, the packed sensor data as a 2D `uint8` array of `height` rows of
+        `width * 3 // 2` bytes and the origin of the crop on the sensor.
+    """
+    buffer = np.frombuffer(buffer, dtype=np.uint8)
+    magic, version = buffer[:4].tobytes(), int(buffer[4])
+    if magic != MAGIC:
+        raise ValueError("Not a raw file")
+    if version not in HEADERS:
+        raise ValueError(f"Unsupported raw file version {version}")
+
+    header = HEADERS[version]
+    _, _, bayer_order, width, height, *extra = header.unpack_from(buffer)
+    x, y, codec = (extra + [0, 0, CODEC_NONE])[:3]
+
+    if codec == CODEC_DELTA_ZLIB:
+        data = decode(buffer[header.size :], height, width)
+    elif codec == CODEC_NONE:
+        data = buffer[header.size : header.size + height * (width * 3 // 2)]
+        data = data.reshape(height, width * 3 // 2)
+    else:
+        raise ValueError(f"Unknown raw file codec {codec}")
+
+    return RawFrame(width, height, bayer.BAYER_ORDERS[bayer_order], data, x, y)
@@ -0,0 +1,185 @@
+import logging
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+RecoveryAttempt = namedtuple(
+    "RecoveryAttempt",
+    ["frame_index", "stage", "attempt", "start_time", "duration", "success"],
+)
+
+
+class AdvanceRecovery:
+    """
+    Bounded recovery of the frame advance after the frame sensor was not reached in
+    time. Recovery goes through a sequence of stages, each tried a number of times with
+    a growing pause in between:
+
+    1. `"creep_back"`: Slowly back off the magnet, then advance again.
+    2. `"retry_advance"`: Advance again from where the film is.
+    3. `"slow_advance"`: Advance again at `slow_speed`.
+
+    If none of them succeeds, or if recovering takes longer than `budget` seconds in
+    total, recovery is aborted. Every attempt is recorded with its timing in
+    `attempts`.
+
+    Parameters
+    ----------
+    scanner : FilmScanner
+        Scanner whose advance to recover.
+    budget : float, optional
+        Maximum time in seconds a single recovery may take.
+    attempts_per_stage : int, optional
+        Number of attempts per stage.
+    slow_speed : int, optional
+        Speed in RPM of the `"slow_advance"` stage.
+    """
+
+    STAGES = ("creep_back", "retry_advance", "slow_advance")
+
+    def __init__(self, scanner, budget=120, attempts_per_stage=2, slow_speed=100):
+        self.scanner = scanner
+        self.budget = budget
+        self.attempts_per_stage = attempts_per_stage
+        self.slow_speed = slow_speed
+
+        self.stage = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all recorded attempts and outcomes, e.g. at the start of a scan.
+        """
+        self.attempts = []
+        self.n_recovered = 0
+        self.n_failed = 0
+        self.total_time = 0.0
+        self.last_outcome = None
+
+    @property
+    def is_active(self):
+        return self.stage is not None
+
+    def run(self):
+        """
+        Attempt to recover the frame advance. Returns `True` if the scanner advanced to
+        the next frame and `False` if recovery was aborted.
+        """
+        scanner = self.scanner
+        t_start = time.perf_counter()
+        deadline = t_start + self.budget
+
+        scanner.callback.on_recovery_start()
+
+        success = False
+        for stage in self.STAGES:
+            self.stage = stage
+            pause = 1
+            for attempt in range(self.attempts_per_stage):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+
+                logger.warning(
+                    f"Attempting frame sensor recovery (stage={stage} /"
+                    f" attempt={attempt} / remaining={remaining:.0f} s)"
+                )
+                success = self.attempt(stage, attempt)
+                if success:
+                    break
+
+                time.sleep(min(pause, max(deadline - time.perf_counter(), 0)))
+                pause *= 2
+            if success or time.perf_counter() >= deadline:
+                break
+
+        duration = time.perf_counter() - t_start
+        self.total_time += duration
+        self.stage = None
+        if success:
+            self.n_recovered += 1
+            self.last_outcome = "recovered"
+            logger.warning(f"Recovered frame advance after {duration:.1f} s")
+        else:
+            self.n_failed += 1
+            self.last_outcome = "failed"
+            logger.error(f"Aborted frame sensor recovery after {duration:.1f} s")
+
+        scanner.callback.on_recovery_end()
+
+        return success
+
+    def attempt(self, stage, attempt):
+        """
+        Run a single attempt of `stage` and record it. Returns whether the advance
+        succeeded.
+        """
+        # Imported here to avoid a circular import
+        from filmscanner import AdvanceTimeoutError
+
+        scanner = self.scanner
+        start_time = time.time()
+        t_start = time.perf_counter()
+
+        try:
+            if stage == "creep_back":
+                self.creep_back()
+                scanner.advance(recover=False)
+            elif stage == "retry_advance":
+                scanner.advance(recover=False)
+            elif stage == "slow_advance":
+                scanner.advance(recover=False, speed=self.slow_speed)
+        except AdvanceTimeoutError:
+            success = False
+        else:
+            success = True
+
+        duration = time.perf_counter() - t_start
+        self.attempts.append(
+            RecoveryAttempt(
+                scanner.current_frame_index,
+                stage,
+                attempt,
+                start_time,
+                duration,
+                success,
+            )
+        )
+        logger.info(
+            f"Recovery attempt {'succeeded' if success else 'failed'} (stage={stage} /"
+            f" attempt={attempt} / duration={duration:.2f} s)"
+        )
+
+        return success
+
+    def creep_back(self):
+        """
+        Slowly run the motor backwards for a moment or until the frame sensor is
+        triggered.
+        """
+        motor = self.scanner.motor
+
+        with self.scanner.pi.batch():
+            motor.direction = 1
+            motor.enable()
+        motor.start(speed=1, acceleration=1)
+        # Backing off by a few steps can only pass the magnet the scanner is stopped
+        # at, so the reel position is left as is. The following advance updates it.
+        self.scanner.frame_sensor.wait_for_trigger(timeout=1.0)
+        motor.stop(deceleration=1)
+        motor.disable()
+
+        time.sleep(1)
+
+        motor.direction = 0
+
+    @property
+    def stats(self):
+        return {
+            "active": self.is_active,
+            "stage": self.stage,
+            "recovered": self.n_recovered,
+            "failed": self.n_failed,
+            "time_s": round(self.total_time, 1),
+        }
@@ -0,0 +1,331 @@
+import argparse
+import mmap
+import os
+import struct
+import zlib
+from collections import namedtuple
+from pathlib import Path
+from threading import Lock
+
+# A reel container consists of two files in the reel's directory. The data file holds
+# the frames back to back, each starting at a multiple of `ALIGNMENT` bytes. The index
+# file holds a header followed by one record per frame with the frame's index, file
+# suffix, offset and length in the data file and the CRC32 of its data. Each record
+# carries its own CRC32 and is appended with a single write after the frame's data was
+# written, so a crash can at most leave a torn last record, which is ignored.
+DATA_FILENAME = "reel.dat"
+INDEX_FILENAME = "reel.idx"
+
+INDEX_MAGIC = b"FSRI"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sI")
+# Frame index, file suffix, offset, length, CRC32 of the data, CRC32 of the record
+RECORD = struct.Struct("<I4sQQII")
+
+ALIGNMENT = 4096
+
+Record = namedtuple("Record", ["index", "suffix", "offset", "length", "crc"])
+
+
+def frame_name(index, suffix):
+    """
+    File name of the frame at `index` with the file `suffix`, e.g. `"jpg"`.
+    """
+    return f"frame-{index:05d}.{suffix}"
+
+
+def parse_frame_name(name):
+    """
+    Frame index and file suffix of a frame's file name, e.g. `(12, "jpg")` for
+    `"frame-00012.jpg"`.
+    """
+    stem, suffix = Path(name).name.split(".")
+    return int(stem.split("-")[1]), suffix
+
+
+def is_container(directory):
+    """
+    Check whether `directory` holds a reel container.
+    """
+    return (Path(directory) / INDEX_FILENAME).is_file()
+
+
+class ReelWriter:
+    """
+    Appends frames to the reel container in `directory`, creating it if it does not
+    exist yet. Storing a reel's frames in a single container avoids the overhead of
+    creating thousands of files on the scanner's SSD and of listing and opening them
+    in every tool processing the frames afterwards.
+
+    Frames may be written by several threads at once: space for a frame is reserved
+    under a lock, but its data is written outside of it. The data file is preallocated
+    in large steps and cut to its used size when the writer is closed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the container.
+    preallocation : int, optional
+        Number of bytes the data file is extended by whenever it is full. Set to `0` to
+        not preallocate.
+    sync : bool, optional
+        When set to `True`, the data of every frame is flushed to storage before its
+        index record is written, such that the index never points at data that was
+        lost in a power cut. Slows down writing.
+    """
+
+    def __init__(self, directory, preallocation=2**30, sync=False):
+        self.directory = Path(directory)
+        self.preallocation = preallocation
+        self.sync = sync
+
+        self.lock = Lock()
+
+        # Continue after the last frame of an existing container, cutting off a torn
+        # last record such that the following records are not misaligned
+        index_path = self.directory / INDEX_FILENAME
+        self.end = 0
+        is_new = not index_path.is_file() or index_path.stat().st_size == 0
+        if not is_new:
+            for record in read_index(index_path).values():
+                self.end = max(self.end, align(record.offset + record.length))
+            n_records = (index_path.stat().st_size - INDEX_HEADER.size) // RECORD.size
+            os.truncate(index_path, INDEX_HEADER.size + n_records * RECORD.size)
+
+        self.data_fd = os.open(self.directory / DATA_FILENAME, os.O_RDWR | os.O_CREAT)
+        self.allocated = os.fstat(self.data_fd).st_size
+        self.index_fd = os.open(index_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        if is_new:
+            os.write(self.index_fd, INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION))
+
+    def write(self, index, suffix, data, length=None):
+        """
+        Append the frame at `index` with the file `suffix` and contents `data`. Returns
+        the frame's `Record`.
+
+        Parameters
+        ----------
+        index : int
+            Index of the frame.
+        suffix : str
+            File suffix of the frame, e.g. "jpg".
+        data : bytes-like or iterable
+            Contents of the frame, or an iterable of bytes-like chunks of it if
+            `length` is given.
+        length : int, optional
+            Total number of bytes of the chunks in `data`.
+        """
+        if length is None:
+            length = len(memoryview(data).cast("B"))
+            data = [data]
+
+        with self.lock:
+            offset = self.end
+            self.end = align(offset + length)
+            if self.end > self.allocated:
+                self.allocate(self.end)
+
+        crc = 0
+        n_written = 0
+        for chunk in data:
+            chunk = memoryview(chunk).cast("B")
+            if n_written + len(chunk) > length:
+                raise ValueError(f"Frame {index} is longer than {length} bytes")
+            n_chunk = 0
+            while n_chunk < len(chunk):
+                n_chunk += os.pwrite(
+                    self.data_fd, chunk[n_chunk:], offset + n_written + n_chunk
+                )
+            n_written += n_chunk
+            crc = zlib.crc32(chunk, crc)
+        if n_written != length:
+            raise ValueError(f"Frame {index} is shorter than {length} bytes")
+        if self.sync:
+            os.fdatasync(self.data_fd)
+
+        fields = (index, suffix.encode(), offset, length, crc)
+        record = RECORD.pack(*fields, zlib.crc32(RECORD.pack(*fields, 0)))
+        with self.lock:
+            os.write(self.index_fd, record)
+
+        return Record(index, suffix, offset, length, crc)
+
+    def allocate(self, size):
+        """
+        Extend the data file to at least `size` bytes. Called with the lock held.
+        """
+        new_size = max(size, self.allocated + self.preallocation)
+        try:
+            os.posix_fallocate(self.data_fd, self.allocated, new_size - self.allocated)
+        except OSError:
+            # Not supported by all file systems. Writes extend the file anyway.
+            self.preallocation = 0
+            new_size = size
+        self.allocated = new_size
+
+    def flush(self):
+        """
+        Flush the data and index files to storage.
+        """
+        os.fsync(self.data_fd)
+        os.fsync(self.index_fd)
+
+    def close(self):
+        """
+        Flush both files and cut off the unused preallocated space.
+        """
+        with self.lock:
+            os.ftruncate(self.data_fd, self.end)
+            self.allocated = self.end
+        self.flush()
+        os.close(self.data_fd)
+        os.close(self.index_fd)
+
+
+def read_index(path):
+    """
+    Read the index file at `path`. Records that are torn or corrupt are skipped. If a
+    frame was written more than once, its last record wins.
+
+    Returns
+    -------
+    records : dict
+        Dictionary mapping frame indices to their `Record`.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+
+    magic, version = INDEX_HEADER.unpack_from(content)
+    if magic != INDEX_MAGIC:
+        raise ValueError(f'"{path}" is not a reel index')
+    if version != INDEX_VERSION:
+        raise ValueError(f'Reel index "{path}" has unsupported version {version}')
+
+    records = {}
+    n_records = (len(content) - INDEX_HEADER.size) // RECORD.size
+    for i in range(n_records):
+        fields = RECORD.unpack_from(content, INDEX_HEADER.size + i * RECORD.size)
+        *fields, record_crc = fields
+        if zlib.crc32(RECORD.pack(*fields, 0)) != record_crc:
+            continue
+        index, suffix, offset, length, crc = fields
+        records[index] = Record(
+            index, suffix.rstrip(b"\0").decode(), offset, length, crc
+        )
+    return records
+
+
+class Reel:
+    """
+    Read access to the frames of the reel container in `directory`. Frames are looked
+    up by their index, e.g. `reel[12]`, which returns a read-only `memoryview` of a
+    memory mapping of the frame's data. Only the frame's part of the data file is
+    mapped, so this takes constant time and works for reels larger than the address
+    space of the Pi's 32-bit OS.
+
+    Run
+
+        python3 reel.py export <reel-directory> [<output-directory>]
+
+    to export the frames of a container to individual files.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.records = read_index(self.directory / INDEX_FILENAME)
+        self.data_file = open(self.directory / DATA_FILENAME, "rb")
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, index):
+        return index in self.records
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        if record.length == 0:
+            return memoryview(b"")
+
+        # Frames start at multiples of 4096 bytes, which mappings must be aligned to
+        start = record.offset // mmap.ALLOCATIONGRANULARITY * mmap.ALLOCATIONGRANULARITY
+        delta = record.offset - start
+        mapping = mmap.mmap(
+            self.data_file.fileno(),
+            delta + record.length,
+            offset=start,
+            access=mmap.ACCESS_READ,
+        )
+        return memoryview(mapping)[delta:]
+
+    @property
+    def indices(self):
+        """
+        Sorted indices of all frames in the container.
+        """
+        return sorted(self.records)
+
+    def verify(self, index):
+        """
+        Check the frame at `index` against the checksum in its index record.
+        """
+        return zlib.crc32(self[index]) == self.records[index].crc
+
+    def export(self, output_directory, indices=None):
+        """
+        Write the frames at `indices`, or all frames, to individual files named like
+        the scanner names them, e.g. `frame-00012.jpg`, in `output_directory`.
+        """
+        output_directory = Path(output_directory)
+        output_directory.mkdir(parents=True, exist_ok=True)
+        for index in self.indices if indices is None else indices:
+            record = self.records[index]
+            path = output_directory / frame_name(record.index, record.suffix)
+            with open(path, "wb") as f:
+                f.write(self[index])
+
+    def close(self):
+        self.data_file.close()
+
+
+def align(offset):
+    """
+    Round `offset` up to the next multiple of the alignment of frames.
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Work with reel containers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export frames to individual files"
+    )
+    export_parser.add_argument("directory", help="Directory of the container")
+    export_parser.add_argument(
+        "output_directory", nargs="?", help="Defaults to the container's directory"
+    )
+
+    verify_parser = subparsers.add_parser("verify", help="Check all frame checksums")
+    verify_parser.add_argument("directory", help="Directory of the container")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    reel = Reel(args.directory)
+    if args.command == "export":
+        reel.export(args.output_directory or args.directory)
+        print(f"Exported {len(reel)} frames")
+    elif args.command == "verify":
+        invalid = [index for index in reel.indices if not reel.verify(index)]
+        print(f"{len(reel) - len(invalid)} of {len(reel)} frames are valid")
+        for index in invalid:
+            print(f"Frame {index} does not match its checksum")
+    reel.close()
+
+
+if __name__ == "__main__":
+    main()
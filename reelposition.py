@@ -0,0 +1,53 @@
+import json
+import os
+
+
+class ReelPosition:
+    """
+    Absolute position of the film on the reel, i.e. the index of the frame the scanner
+    is stopped at, where the next forward advance lands on the frame after it. The
+    position is updated from every frame sensor pulse in either direction and persisted
+    to a JSON file on every change, such that it survives restarts of the scanner.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file the position is persisted to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.frame = 0
+
+        self.load()
+
+    def move(self, n):
+        """
+        Move the position by `n` frames, where negative values move it backwards.
+        """
+        self.set(self.frame + n)
+
+    def set(self, frame):
+        """
+        Set the position to `frame`, e.g. `0` after threading a new reel.
+        """
+        self.frame = frame
+        self.save()
+
+    def load(self):
+        """
+        Load the position from the JSON file, if it exists.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            self.frame = json.load(f)["frame"]
+
+    def save(self):
+        """
+        Persist the position to the JSON file.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"frame": self.frame}, f)
+        os.replace(tmp_path, self.path)
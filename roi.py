@@ -0,0 +1,67 @@
+import json
+import os
+
+FULL_SENSOR = (0.0, 0.0, 1.0, 1.0)
+
+
+class RegionOfInterest:
+    """
+    Region of the sensor covered by the film gate, given as `(x, y, width, height)` in
+    fractions of the sensor size like `PiCamera.zoom`. Raw-only scans crop the saved
+    sensor data to it (see `rawfile.crop_box`) and the liveview shows it when not
+    zoomed in, such that it can be calibrated by adjusting it until the frame just fits
+    into the liveview. The region is persisted to a JSON file, as it only needs to be
+    calibrated again when the camera or the gate is moved.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file the region is persisted to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.region = None
+
+        self.load()
+
+    @property
+    def zoom(self):
+        """
+        Camera zoom showing the region, or the full sensor if no region is set.
+        """
+        return self.region if self.region is not None else FULL_SENSOR
+
+    def set(self, region):
+        """
+        Set the region to `(x, y, width, height)` or to `None` for the full sensor.
+        """
+        if region is not None:
+            x, y, width, height = (float(value) for value in region)
+            if not (0 <= x < 1 and 0 <= y < 1 and width > 0 and height > 0):
+                raise ValueError(f"Invalid region of interest {region}")
+            if x + width > 1 + 1e-6 or y + height > 1 + 1e-6:
+                raise ValueError(f"Region of interest {region} exceeds the sensor")
+            region = (x, y, width, height)
+
+        self.region = region
+        self.save()
+
+    def load(self):
+        """
+        Load the region from the JSON file, if it exists.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            region = json.load(f)["region"]
+        self.region = tuple(region) if region is not None else None
+
+    def save(self):
+        """
+        Persist the region to the JSON file.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"region": self.region}, f)
+        os.replace(tmp_path, self.path)
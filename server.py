@@ -25,6 +25,12 @@ def advance():
     return "", 204
 
 
+@app.route("/backend/convert", methods=("POST",))
+def convert():
+    scanner.conversion_scheduler.submit(request.get_json()["output_directory"])
+    return "", 204
+
+
 @app.route("/backend/dashboard")
 def dashboard():
     return dashboard_callback.scanner_state_dict
@@ -64,6 +70,14 @@ def toggle_light():
     return "", 204
 
 
+@app.route("/backend/position", methods=("POST",))
+def set_position():
+    if not scanner.is_position_change_allowed:
+        return "The reel position cannot be set while the film is moved", 409
+    scanner.reel_position.set(int(request.get_json()["frame"]))
+    return "", 204
+
+
 @app.route("/backend/poweroff", methods=("POST",))
 def poweroff():
     scanner.poweroff()
@@ -81,12 +95,41 @@ def preview():
     )
 
 
+@app.route("/backend/resume", methods=("POST",))
+def resume():
+    if not scanner.is_scanning and scanner.is_scanning_allowed:
+        try:
+            scanner.resume_scan(request.get_json()["output_directory"])
+        except ValueError as e:
+            return str(e), 409
+    return "", 204
+
+
+@app.route("/backend/roi", methods=("POST",))
+def set_roi():
+    if not scanner.is_scanning:
+        scanner.set_roi(request.get_json()["roi"])
+    return "", 204
+
+
+@app.route("/backend/seek", methods=("POST",))
+def seek():
+    if not scanner.is_fast_forwarding and scanner.is_fast_forward_allowed:
+        scanner.start_seek(int(request.get_json()["frame"]))
+    elif scanner.is_fast_forwarding:
+        scanner.stop_fast_forward()
+    return "", 204
+
+
 @app.route("/backend/scan", methods=("POST",))
 def scan():
     if not scanner.is_scanning and scanner.is_scanning_allowed:
         scanner.start_scan(
             output_directory=request.get_json()["output_directory"],
             n_frames=int(request.get_json()["n_frames"]),
+            start_index=int(request.get_json().get("start_index", 0)),
+            continuous=bool(request.get_json().get("continuous", False)),
+            raw_only=bool(request.get_json().get("raw_only", False)),
         )
     elif scanner.is_scanning:
         scanner.stop_scan()
@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+
+
+class SettleDetector:
+    """
+    Detects when the film in the gate has come to rest by comparing consecutive
+    low-resolution frames from the camera's video port. Motion is measured as the mean
+    absolute difference of the luma of two consecutive frames, which also catches the
+    camera's automatic exposure still adjusting.
+
+    Parameters
+    ----------
+    camera : PiCamera
+        Camera to take the frames from.
+    resolution : tuple, optional
+        Resolution `(width, height)` the frames are resized to on the GPU.
+    threshold : float, optional
+        Mean absolute luma difference (on a scale of 0 to 255) below which the film is
+        considered to be at rest.
+    """
+
+    def __init__(self, camera, resolution=(160, 120), threshold=1.5):
+        self.camera = camera
+        self.resolution = resolution
+        self.threshold = threshold
+
+        # YUV frames are padded to a width of a multiple of 32 and a height of a
+        # multiple of 16
+        width, height = resolution
+        self.padded_width = (width + 31) // 32 * 32
+        self.padded_height = (height + 15) // 16 * 16
+        self.buffer = bytearray(self.padded_width * self.padded_height * 3 // 2)
+
+    def wait(self, max_delay):
+        """
+        Wait until the film has come to rest, but at most `max_delay` seconds.
+
+        Returns
+        -------
+        result : tuple
+            Tuple `(has_settled, settle_time)` of whether the film came to rest before
+            `max_delay` and the time in seconds that was waited.
+        """
+        t_start = time.perf_counter()
+
+        previous = None
+        frames = self.camera.capture_continuous(
+            self.buffer, format="yuv", use_video_port=True, resize=self.resolution
+        )
+        try:
+            for _ in frames:
+                luma = self.luma()
+                if previous is not None and motion(previous, luma) < self.threshold:
+                    return True, time.perf_counter() - t_start
+                if time.perf_counter() - t_start >= max_delay:
+                    return False, time.perf_counter() - t_start
+                previous = luma
+        finally:
+            frames.close()
+
+    def luma(self):
+        """
+        Copy of the luma plane of the frame in the buffer, without padding.
+        """
+        width, height = self.resolution
+        y = np.frombuffer(self.buffer, dtype=np.uint8, count=len(self.buffer) * 2 // 3)
+        y = y.reshape(self.padded_height, self.padded_width)
+        return y[:height, :width].astype(np.int16)
+
+
+def motion(a, b):
+    """
+    Mean absolute difference of two luma frames given as `int16` arrays.
+    """
+    return np.abs(a - b).mean()
@@ -0,0 +1,135 @@
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+# Outcomes of an advance
+DETECTED = 0
+TIMED_OUT = 1
+RECOVERY_DETECTED = 2
+RECOVERY_TIMED_OUT = 3
+
+AdvanceRecord = namedtuple(
+    "AdvanceRecord",
+    ["frame_index", "start_tick", "sensor_tick", "stop_tick", "outcome"],
+)
+
+MAGIC = b"ADVT"
+VERSION = 1
+HEADER = struct.Struct("<4sII")  # Magic, version, number of records
+N_FIELDS = len(AdvanceRecord._fields)
+
+
+def tick_diff(start, end):
+    """
+    Microseconds from tick `start` to tick `end`, taking into account that `pigpio`
+    ticks wrap around every 72 minutes.
+    """
+    return (end - start) & 0xFFFFFFFF
+
+
+def signed_tick_diff(start, end):
+    """
+    Microseconds from tick `start` to tick `end` like `tick_diff`, but negative if `end`
+    lies before `start`. Assumes the ticks are less than 36 minutes apart.
+    """
+    diff = tick_diff(start, end)
+    return diff - (1 << 32) if diff >= 1 << 31 else diff
+
+
+class AdvanceTimeline:
+    """
+    Compact timeline of frame advances, recording for every advance the `pigpio` ticks
+    at which the motor was started, the frame sensor was triggered and the motor was
+    stopped, as well as its outcome. Records are stored in a preallocated array of
+    unsigned 32-bit integers, such that appending a record does not allocate memory.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        Number of records to preallocate memory for. The timeline grows beyond this if
+        needed.
+    """
+
+    def __init__(self, capacity=4096):
+        self.data = array("I", bytes(4 * N_FIELDS * capacity))
+        self.n_records = 0
+
+    def __len__(self):
+        return self.n_records
+
+    def __getitem__(self, i):
+        if not -self.n_records <= i < self.n_records:
+            raise IndexError("Advance timeline index out of range")
+        i %= self.n_records
+        return AdvanceRecord(*self.data[N_FIELDS * i : N_FIELDS * (i + 1)])
+
+    def __iter__(self):
+        for i in range(self.n_records):
+            yield self[i]
+
+    def append(self, frame_index, start_tick, sensor_tick, stop_tick, outcome):
+        """
+        Record an advance. Pass `0` as `sensor_tick` if the sensor was not triggered.
+        """
+        i = N_FIELDS * self.n_records
+        if i == len(self.data):
+            self.data.extend(array("I", bytes(4 * max(len(self.data), N_FIELDS))))
+
+        self.data[i] = frame_index
+        self.data[i + 1] = start_tick
+        self.data[i + 2] = sensor_tick
+        self.data[i + 3] = stop_tick
+        self.data[i + 4] = outcome
+        self.n_records += 1
+
+    def clear(self):
+        """
+        Remove all records while keeping the allocated memory.
+        """
+        self.n_records = 0
+
+    def durations(self):
+        """
+        Microseconds from motor start to sensor trigger of every advance where the
+        sensor was triggered.
+        """
+        return [
+            tick_diff(record.start_tick, record.sensor_tick)
+            for record in self
+            if record.outcome in (DETECTED, RECOVERY_DETECTED)
+        ]
+
+    def save(self, path):
+        """
+        Save the timeline to the binary file at `path`. The file is replaced
+        atomically, such that an interrupted save never leaves a corrupted timeline.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.n_records))
+            f.write(self.data[: N_FIELDS * self.n_records].tobytes())
+        os.replace(tmp_path, path)
+
+
+def load_timeline(path):
+    """
+    Load an advance timeline saved by `AdvanceTimeline.save`. For analysis with NumPy,
+    the records of a timeline can be viewed as an array with one row per advance via
+    `np.frombuffer(timeline.data, dtype=np.uint32).reshape(-1, 5)[: len(timeline)]`.
+
+    Returns
+    -------
+    timeline : AdvanceTimeline
+    """
+    with open(path, "rb") as f:
+        magic, version, n_records = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'"{path}" is not an advance timeline')
+        data = array("I")
+        data.frombytes(f.read(4 * N_FIELDS * n_records))
+
+    timeline = AdvanceTimeline(capacity=0)
+    timeline.data = data
+    timeline.n_records = n_records
+    return timeline
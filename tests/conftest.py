@@ -0,0 +1,15 @@
+import sys
+import types
+from pathlib import Path
+
+# The modules live in the repository root, which is not a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# The camera library can only be imported on a Raspberry Pi. No test uses the camera,
+# but `filmscanner` imports it.
+try:
+    import picamerax  # noqa: F401
+except (ImportError, OSError):
+    picamerax = types.ModuleType("picamerax")
+    picamerax.PiCamera = None
+    sys.modules["picamerax"] = picamerax
@@ -0,0 +1,170 @@
+from threading import Event
+
+import numpy as np
+
+import bayer
+
+from filmscanner import FilmScanner
+from hardware import GPIOConnection
+from utils import BaseCallback
+
+
+class FakeCallback:
+    def __init__(self, pi, pin, function):
+        self.pi = pi
+        self.pin = pin
+        self.function = function
+
+    def cancel(self):
+        self.pi.callbacks.remove(self)
+
+
+class FakePi:
+    """
+    Stand-in for a `pigpio.pi` connection whose clock and GPIO edges are driven by the
+    test.
+    """
+
+    def __init__(self):
+        self.tick = 0
+        self.callbacks = []
+        self.is_transmitting = False
+        self.waves = set()
+        self.n_waves_created = 0
+        self.chain = None
+
+    def get_current_tick(self):
+        return self.tick
+
+    def set_mode(self, gpio, mode):
+        pass
+
+    def write(self, gpio, level):
+        pass
+
+    def set_bank_1(self, mask):
+        pass
+
+    def clear_bank_1(self, mask):
+        pass
+
+    def wave_tx_busy(self):
+        return int(self.is_transmitting)
+
+    def wave_clear(self):
+        self.waves = set()
+
+    def wave_add_generic(self, pulses):
+        pass
+
+    def wave_create(self):
+        wid = self.n_waves_created
+        self.n_waves_created += 1
+        self.waves.add(wid)
+        return wid
+
+    def wave_delete(self, wid):
+        self.waves.remove(wid)
+
+    def wave_chain(self, chain):
+        self.chain = chain
+
+    def callback(self, gpio, edge, function):
+        callback = FakeCallback(self, gpio, function)
+        self.callbacks.append(callback)
+        return callback
+
+    def pulse(self, gpio, tick):
+        """
+        Report a rising edge of `gpio` at `tick`, which may be in the past.
+        """
+        for callback in list(self.callbacks):
+            if callback.pin == gpio:
+                callback.function(gpio, 1, tick)
+
+
+class FakeMotor:
+    def __init__(self):
+        self.profile = None
+        self.direction = 0
+        self.is_running = False
+
+    def enable(self):
+        pass
+
+    def disable(self):
+        pass
+
+    def start(self, speed, acceleration):
+        pass
+
+    def run(self, speed, acceleration):
+        self.is_running = True
+
+    def stop(self, deceleration):
+        self.is_running = False
+
+
+class NeverTriggeredSensor:
+    """
+    Frame sensor that is never reached, e.g. because the film tore.
+    """
+
+    counting_callback = None
+    last_tick = None
+
+    def wait_for_trigger(self, timeout=None):
+        return False
+
+
+class HardwareFreeScanner(FilmScanner):
+    def __del__(self):
+        pass
+
+
+def make_scanner(**attributes):
+    """
+    `FilmScanner` without any hardware, with only the given attributes and the flags
+    set. Attributes that tests need have to be given.
+    """
+    scanner = HardwareFreeScanner.__new__(HardwareFreeScanner)
+    scanner.callback = BaseCallback()
+    scanner.is_advancing = False
+    scanner.is_fast_forwarding = False
+    scanner.is_scanning = False
+    scanner.current_frame_index = 0
+    scanner._last_scan_end_info = "dismissed"
+    scanner.scan_stopped_event = Event()
+    for name, value in attributes.items():
+        setattr(scanner, name, value)
+    return scanner
+
+
+def fake_connection():
+    return GPIOConnection(pi=FakePi())
+
+
+class FakeFrame:
+    def __init__(self, data=b"frame"):
+        self.data = data
+        self.is_released = False
+
+    def release(self):
+        self.is_released = True
+
+
+def raw_block(width=64, height=32, bayer_order="BGGR", seed=0):
+    """
+    Raw block like the camera appends to its JPEGs, with random sensor data.
+    """
+    header = bytearray(bayer.HEADER_SIZE)
+    header[:4] = b"BRCM"
+    order = {v: k for k, v in bayer.BAYER_ORDERS.items()}[bayer_order]
+    bayer.HEADER.pack_into(
+        header, bayer.HEADER_OFFSET, b"", width, height, 0, 0, 0, 0, order, 0
+    )
+    stride = (width * 12 // 8 + 31) // 32 * 32
+    n_rows = (height + 16) // 16 * 16
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 16, stride * n_rows, dtype=np.uint8)
+    return bytes(header) + data.tobytes()
@@ -0,0 +1,88 @@
+import pytest
+
+from advancetiming import AdvanceTimingController
+
+
+@pytest.fixture
+def controller(tmp_path):
+    controller = AdvanceTimingController(
+        str(tmp_path / "advance_timing.json"),
+        default_arm_delay=0.1,
+        default_timeout=0.4,
+        window=50,
+        min_samples=10,
+    )
+    controller.select("300 RPM / None")
+    return controller
+
+
+def test_defaults_until_trained(controller):
+    for _ in range(9):
+        controller.update(0.45)
+
+    assert not controller.is_trained
+    assert controller.arm_delay == 0.1
+    assert controller.deadline == pytest.approx(0.5)
+
+
+def test_deadline_keeps_minimum_margin_on_steady_mechanism(controller):
+    for _ in range(20):
+        controller.update(0.45)
+
+    assert controller.is_trained
+    assert controller.arm_delay == pytest.approx(0.5 * 0.45)
+    assert controller.deadline == pytest.approx(0.45 + controller.MIN_MARGIN)
+    assert controller.timeout == pytest.approx(controller.deadline - 0.225)
+
+
+def test_timeouts_widen_deadline_until_success(controller):
+    for _ in range(20):
+        controller.update(0.45)
+    deadline = controller.deadline
+
+    controller.record_timeout(deadline)
+    assert controller.deadline > deadline
+    # The advance keeps failing, e.g. because the film tore, which grows the learned
+    # deadline only by its margin per timeout
+    for _ in range(10):
+        controller.record_timeout(controller.deadline)
+    margin = controller.DEADLINE_MARGIN**11
+    assert controller.deadline <= margin * controller.MAX_WIDENING * deadline
+
+    controller.update(0.45)
+    assert controller.n_timeouts == 0
+
+
+def test_timeouts_are_learned_from(controller):
+    for _ in range(20):
+        controller.update(0.45)
+    deadline = controller.deadline
+
+    # The mechanism slows down such that every other advance times out
+    for _ in range(15):
+        controller.record_timeout(controller.deadline)
+        controller.update(0.48)
+
+    assert controller.n_timeouts == 0
+    assert controller.deadline > deadline
+
+
+def test_durations_persist_per_setting(controller, tmp_path):
+    for _ in range(20):
+        controller.update(0.45)
+    controller.select("150 RPM / None")
+    controller.update(0.9)
+    controller.save()
+
+    loaded = AdvanceTimingController(
+        str(tmp_path / "advance_timing.json"),
+        default_arm_delay=0.1,
+        default_timeout=0.4,
+        window=50,
+        min_samples=10,
+    )
+    loaded.select("300 RPM / None")
+    assert loaded.is_trained
+    assert loaded.deadline == pytest.approx(controller.deadline)
+    loaded.select("150 RPM / None")
+    assert not loaded.is_trained
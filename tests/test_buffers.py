@@ -0,0 +1,29 @@
+from buffers import FrameBufferPool
+
+
+def test_buffer_returns_to_pool_after_last_release():
+    pool = FrameBufferPool(2, capacity=8)
+    buffer = pool.acquire()
+    buffer.write(b"frame")
+    buffer.retain()
+
+    buffer.release()
+    assert pool.n_free == 1
+    buffer.release()
+    assert pool.n_free == 2
+
+    # Buffers come back empty
+    assert len(pool.acquire()) == 0
+
+
+def test_growing_buffer_keeps_earlier_views_intact():
+    pool = FrameBufferPool(1, capacity=4)
+    buffer = pool.acquire()
+    buffer.write(b"abcd")
+    view = buffer.view()
+
+    buffer.write(memoryview(b"efgh"))
+
+    assert bytes(view) == b"abcd"
+    assert bytes(buffer.view()) == b"abcdefgh"
+    assert bytes(buffer.view(2, 5)) == b"cde"
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import compression
+import rawfile
+from compression import FrameCompressor
+
+
+class FakeWriteQueue:
+    def __init__(self, bytes_pending=0, budget=100):
+        self.bytes_pending = bytes_pending
+        self.budget = budget
+
+
+@pytest.fixture(autouse=True)
+def no_temperature(monkeypatch):
+    monkeypatch.setattr(compression, "TEMPERATURE_PATH", "/nonexistent")
+
+
+def sensor_data(height=32, width=64, noise=4):
+    rng = np.random.default_rng(0)
+    pixels = 256 + rng.normal(0, noise, (height, width))
+    pixels = pixels.clip(0, 4095).astype(np.uint16)
+    data = np.empty((height, width * 3 // 2), dtype=np.uint8)
+    data[:, 0::3] = pixels[:, 0::2] >> 4
+    data[:, 1::3] = pixels[:, 1::2] >> 4
+    data[:, 2::3] = (pixels[:, 0::2] & 15) | ((pixels[:, 1::2] & 15) << 4)
+    return data
+
+
+@pytest.mark.parametrize("level", [1, 6, 9])
+def test_encode_round_trips(level):
+    data = sensor_data()
+
+    payload = rawfile.encode(data, level)
+
+    assert len(payload) < data.nbytes
+    assert np.array_equal(rawfile.decode(payload, 32, 64), data)
+
+
+def test_default_max_level_differs_from_level_under_load():
+    compressor = FrameCompressor(FakeWriteQueue(bytes_pending=0))
+    assert compressor.select_level() > 1
+
+    compressor.write_queue.bytes_pending = 50
+    assert compressor.select_level() == 1
+
+    compressor.write_queue.bytes_pending = 80
+    assert compressor.select_level() == 0
+
+
+def test_compressed_frames_are_counted():
+    compressor = FrameCompressor(FakeWriteQueue())
+    data = sensor_data()
+
+    payload = compressor.compress(data)
+
+    assert np.array_equal(rawfile.decode(payload, 32, 64), data)
+    assert compressor.stats["compressed"] == 1
+    assert compressor.stats["ratio"] > 1
+
+
+def test_incompressible_frames_are_written_uncompressed():
+    compressor = FrameCompressor(FakeWriteQueue())
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, (32, 96), dtype=np.uint8)
+
+    assert compressor.compress(data) is None
+    assert compressor.stats["compressed"] == 0
+    assert compressor.stats["uncompressed"] == 1
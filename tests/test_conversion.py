@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import dngconverter
+import rawfile
+from conversion import ConversionScheduler
+from fakes import raw_block
+from reel import ReelWriter
+
+
+def append_frames(directory, indices):
+    writer = ReelWriter(directory, preallocation=0)
+    for index in indices:
+        length, chunks = rawfile.chunks(raw_block(1024, 768, seed=index))
+        writer.write(index, "raw", chunks, length)
+    writer.close()
+
+
+@pytest.fixture
+def reel_directory(tmp_path):
+    directory = tmp_path / "reel"
+    directory.mkdir()
+    with open(directory / "capture.json", "w") as f:
+        json.dump({"model": "imx477", "awb_gains": [1.5, 1.8]}, f)
+    return directory
+
+
+def test_reel_is_reopened_when_converted_again(tmp_path, reel_directory):
+    scheduler = ConversionScheduler(
+        str(tmp_path / "jobs.json"), is_busy=lambda: False, min_free_space=0
+    )
+
+    append_frames(reel_directory, [0, 1])
+    scheduler.submit(reel_directory)
+    scheduler.run_job(scheduler.jobs[-1])
+    assert dngconverter.open_reels == {}
+
+    # Resuming the scan appends frames to the same reel
+    append_frames(reel_directory, [2, 3])
+    scheduler.submit(reel_directory)
+    job = scheduler.jobs[-1]
+    scheduler.run_job(job)
+
+    assert (job["state"], job["converted"], job["failed"]) == ("done", 4, 0)
+    for index in range(4):
+        assert dngconverter.is_valid_dng(reel_directory / f"frame-{index:05d}.dng")
+    assert dngconverter.open_reels == {}
@@ -0,0 +1,74 @@
+import struct
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from dngwriter import DNGWriter, repack
+
+
+def reference_pack(pixels, bits):
+    """
+    Pack pixels into DNG order bit by bit, most significant bit first.
+    """
+    pixel_bits = np.unpackbits(
+        pixels.astype(">u2").view(np.uint8).reshape(*pixels.shape, 2), axis=-1
+    )[..., 16 - bits :]
+    return np.packbits(pixel_bits.reshape(len(pixels), -1), axis=-1)
+
+
+def mipi_pack(pixels, bits):
+    """
+    Pack pixels like the camera: the high 8 bits of each pixel of a group, followed by
+    a byte with the low bits of all of them, lowest pixel in the lowest bits.
+    """
+    n_group = 8 // (bits - 8)
+    groups = pixels.reshape(len(pixels), -1, n_group)
+    low = np.zeros(groups.shape[:2], dtype=np.uint8)
+    for i in range(n_group):
+        low |= ((groups[:, :, i] & (2 ** (bits - 8) - 1)) << (i * (bits - 8))).astype(
+            np.uint8
+        )
+    high = (groups >> (bits - 8)).astype(np.uint8)
+    return np.concatenate([high, low[:, :, None]], axis=2).reshape(len(pixels), -1)
+
+
+@pytest.mark.parametrize("bits", [10, 12])
+def test_repack_matches_bitwise_packing(bits):
+    rng = np.random.default_rng(bits)
+    pixels = rng.integers(0, 2**bits, (6, 16), dtype=np.uint16)
+    data = mipi_pack(pixels, bits)
+    # Rows of the camera's data are padded
+    padded = np.zeros((6, data.shape[1] + 8), dtype=np.uint8)
+    padded[:, : data.shape[1]] = data
+
+    assert np.array_equal(repack(padded, 16, bits), reference_pack(pixels, bits))
+
+
+def test_repack_rejects_other_bit_depths():
+    with pytest.raises(ValueError):
+        repack(np.zeros((2, 14), dtype=np.uint8), 8, bits=14)
+
+
+def test_dng_holds_repacked_data_at_tile_offset():
+    tags = {"ImageWidth": 6, "ImageLength": 3, "BitsPerSample": 12, "Make": "Test"}
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, (3, 9), dtype=np.uint8)
+
+    f = BytesIO()
+    DNGWriter(tags).write(f, data)
+    dng = f.getvalue()
+
+    assert dng[:4] == b"II*\x00"
+    (ifd_offset,) = struct.unpack_from("<I", dng, 4)
+    (n_entries,) = struct.unpack_from("<H", dng, ifd_offset)
+    entries = {}
+    for i in range(n_entries):
+        tag_id, _, _, value = struct.unpack_from("<HHI4s", dng, ifd_offset + 2 + 12 * i)
+        entries[tag_id] = value
+    (tile_offset,) = struct.unpack("<I", entries[324])
+    (tile_size,) = struct.unpack("<I", entries[325])
+
+    assert tile_size == 27
+    assert dng[tile_offset : tile_offset + tile_size] == repack(data, 6).tobytes()
+    assert len(dng) % 4 == 0
@@ -0,0 +1,321 @@
+import math
+import time
+import zlib
+
+import pytest
+
+import telemetry
+from advancetiming import AdvanceTimingController
+from buffers import FrameBuffer
+from fakes import (
+    FakeFrame,
+    FakeMotor,
+    NeverTriggeredSensor,
+    fake_connection,
+    make_scanner,
+    raw_block,
+)
+from filmscanner import AdvanceTimeoutError, HallEffectSensor
+from journal import ScanJournal, resume_point
+from manifest import FrameManifest
+from recovery import AdvanceRecovery
+from reelposition import ReelPosition
+
+SENSOR_PIN = 26
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+
+def make_advancing_scanner(tmp_path):
+    scanner = make_scanner(
+        pi=fake_connection(),
+        motor=FakeMotor(),
+        frame_sensor=NeverTriggeredSensor(),
+        advance_speed=300,
+        advance_acceleration=24,
+        advance_timing=AdvanceTimingController(
+            str(tmp_path / "advance_timing.json"),
+            default_arm_delay=0.001,
+            default_timeout=0.001,
+        ),
+        advance_timeline=telemetry.AdvanceTimeline(),
+        reel_position=ReelPosition(str(tmp_path / "reel_position.json")),
+        use_advance_script=False,
+        output_directory=str(tmp_path),
+    )
+    scanner.recovery = AdvanceRecovery(scanner, budget=5, attempts_per_stage=1)
+    return scanner
+
+
+def test_advance_releases_scanner_when_recovery_gives_up(tmp_path, no_sleep):
+    scanner = make_advancing_scanner(tmp_path)
+
+    with pytest.raises(AdvanceTimeoutError):
+        scanner.advance()
+
+    assert scanner.recovery.n_failed == 1
+    assert len(scanner.recovery.attempts) == len(AdvanceRecovery.STAGES)
+    assert not scanner.is_advancing
+    assert scanner.is_advance_allowed
+    assert scanner.is_scanning_allowed
+
+
+def test_failed_scan_cleans_up_despite_failing_steps(tmp_path, no_sleep):
+    scanner = make_advancing_scanner(tmp_path)
+    scanner.pipeline = None
+    scanner.reel_writer = None
+    scanner.manifest = None
+    scanner.journal = None
+    scanner.is_scanning = True
+
+    def scan(*args):
+        scanner.advance()
+
+    def wait_for_saves():
+        raise OSError("Storage went away")
+
+    scanner.scan = scan
+    scanner.wait_for_saves = wait_for_saves
+
+    scanner.debug_scan(str(tmp_path), n_frames=10)
+
+    assert not scanner.is_scanning
+    assert not scanner.is_advancing
+    assert scanner.last_scan_end_info == "failure"
+    assert scanner.scan_stopped_event.is_set()
+    # Steps after the failing one still ran
+    assert (tmp_path / "advances.bin").exists()
+
+
+def test_stop_requested_while_draining_pipeline_does_not_outlive_scan(
+    tmp_path, no_sleep
+):
+    scanner = make_advancing_scanner(tmp_path)
+    scanner.pipeline = object()
+    scanner.reel_writer = None
+    scanner.manifest = None
+    scanner.journal = None
+    scanner.is_scanning = True
+
+    def scan(*args):
+        raise RuntimeError("Camera went away")
+
+    def stop_pipeline():
+        # A drained frame completes the end-of-reel run
+        scanner.scan_stop_requested = True
+
+    scanner.scan = scan
+    scanner.stop_pipeline = stop_pipeline
+
+    scanner.debug_scan(str(tmp_path), n_frames=10, pipelined=True)
+
+    assert not scanner.scan_stop_requested
+
+
+def test_continuous_scan_records_positions_frames_were_captured_at(
+    tmp_path, monkeypatch
+):
+    pi = fake_connection()
+    scanner = make_scanner(
+        pi=pi,
+        motor=FakeMotor(),
+        frame_sensor=HallEffectSensor(SENSOR_PIN, pi=pi),
+        advance_acceleration=24,
+        reel_position=ReelPosition(str(tmp_path / "reel_position.json")),
+        continuous_scan_speed=150,
+        continuous_scan_shutter_speed=1000,
+        continuous_scan_phase=0.1,
+        continuous_scan_capture_latency=0.0,
+        continuous_scan_max_error=0.05,
+        continuous_scan_window=8,
+        capture_timing_errors=[],
+        n_continuous_counted=0,
+    )
+    scanner.capture_frame = lambda shutter_speed=None: FakeFrame()
+    period = int(1e6 * scanner.nominal_frame_period)
+
+    def run_until(tick):
+        # The film passes a frame every period while the motor turns
+        for k in range(pi.pi.tick // period + 1, tick // period + 1):
+            pi.pi.pulse(SENSOR_PIN, k * period)
+        pi.pi.tick = tick
+
+    monkeypatch.setattr(
+        time, "sleep", lambda seconds: run_until(pi.pi.tick + int(seconds * 1e6))
+    )
+
+    start_position = 12
+    scanner.reel_position.set(start_position)
+    manifest = FrameManifest(str(tmp_path / "manifest.sqlite"))
+
+    def record(frame_index):
+        # As the scan does, including the checksum of the saved frame
+        path = tmp_path / f"frame-{frame_index:05d}.jpg"
+        path.write_bytes(b"frame")
+        manifest.update(
+            frame_index,
+            position=scanner.reel_position.frame,
+            path=path.name,
+            size=5,
+            crc32=zlib.crc32(b"frame"),
+        )
+
+    # The first frame is captured at rest, then the motor keeps turning
+    record(0)
+    scanner.start_continuous_motion()
+    # The first frame in motion is timed from its pulse, which it waits for
+    run_until(period)
+    for k in range(1, 10):
+        frame = scanner.capture_frame_in_motion(k)
+        assert frame is not None
+        record(k)
+    scanner.stop_continuous_motion()
+
+    positions = [frame["position"] for frame in manifest.frames()]
+    assert positions == list(range(start_position, start_position + 10))
+    assert scanner.reel_position.frame == start_position + 9
+
+    journal = ScanJournal(str(tmp_path / "journal.json"), batch_size=4)
+    parameters = {"n_frames": 20, "start_index": 0, "continuous": True}
+    journal.begin(parameters, False, start_position)
+    journal.durable_frame = 6
+    frame_index, position = resume_point(str(tmp_path), journal, manifest)
+    manifest.close()
+
+    assert frame_index == 7
+    assert position == start_position + 7
+
+
+class FilmModel:
+    """
+    Film whose sensor pulses are at whole frame positions, moved by stand-ins for
+    `FilmScanner.advance` and `FilmScanner.run_continuously`. `shaft` is the position
+    of the mechanism in frames, e.g. 14.5 in the middle of the pulldown after the pulse
+    of frame 14.
+    """
+
+    ARM_DISTANCE = 0.25  # Pulses closer than this to the start of an advance are missed
+    IGNORE_DISTANCE = 0.05  # Pulses this close to the start of a run are ignored
+    OVERSHOOT = 0.1  # Distance the film runs on after the pulse it stops at
+
+    def __init__(self, scanner, shaft):
+        self.scanner = scanner
+        self.shaft = shaft
+
+    def advance(self):
+        self.shaft = math.ceil(self.shaft + self.ARM_DISTANCE)
+        self.scanner.reel_position.move(1)
+
+    def run_continuously(self, n, t_start, direction=0):
+        sign = -1 if direction else 1
+        pulse = (
+            math.floor(self.shaft - self.IGNORE_DISTANCE)
+            if direction
+            else math.ceil(self.shaft + self.IGNORE_DISTANCE)
+        )
+        self.shaft = pulse + sign * (n - 1) + sign * self.OVERSHOOT
+        self.scanner.reel_position.move(sign * n)
+        return n
+
+
+@pytest.mark.parametrize(
+    "n_counted, shaft",
+    [(3, 15.6), (4, 16.3), (4, 16.9), (2, 14.5), (2, 14.9), (0, 12.5)],
+    ids=["mid-pulldown", "past-next", "near-after-next", "early", "near-own", "start"],
+)
+def test_fallback_from_continuous_motion_stops_on_frames_pulse(
+    tmp_path, n_counted, shaft
+):
+    start_position, k = 12, 3
+    scanner = make_scanner(
+        motor=FakeMotor(),
+        reel_position=ReelPosition(str(tmp_path / "reel_position.json")),
+        n_continuous_counted=n_counted,
+        continuous_fast_forward=True,
+        fast_forward_stop_requested=False,
+        scan_stop_requested=False,
+        fast_forward_count=0,
+    )
+    # The motor stopped after counting `n_counted` pulses, at `shaft`
+    scanner.reel_position.set(start_position + n_counted)
+    scanner.stop_continuous_motion = lambda: None
+    film = FilmModel(scanner, shaft)
+    scanner.advance = film.advance
+    scanner.run_continuously = film.run_continuously
+
+    scanner.stop_continuous_motion_on(k)
+
+    assert film.shaft == start_position + k
+    assert scanner.reel_position.frame == start_position + k
+
+
+@pytest.mark.parametrize("flag", ["is_advancing", "is_fast_forwarding", "is_scanning"])
+def test_position_cannot_be_changed_while_film_moves(flag):
+    scanner = make_scanner()
+    assert scanner.is_position_change_allowed
+
+    setattr(scanner, flag, True)
+    assert not scanner.is_position_change_allowed
+
+
+def test_resuming_container_scan_keeps_scanner_setting(tmp_path):
+    journal = ScanJournal(str(tmp_path / "journal.json"))
+    parameters = {
+        "n_frames": 100,
+        "start_index": 0,
+        "pipelined": True,
+        "continuous": False,
+        "raw_only": True,
+    }
+    journal.begin(parameters, reel_container=True, start_position=0)
+    FrameManifest(str(tmp_path / "manifest.sqlite")).close()
+
+    started = []
+    scanner = make_scanner(
+        reel_container=False,
+        reel_position=ReelPosition(str(tmp_path / "reel_position.json")),
+    )
+    scanner.start_scan = lambda *args, **kwargs: started.append(kwargs)
+
+    scanner.resume_scan(str(tmp_path))
+
+    assert started[0]["reel_container"] is True
+    assert scanner.reel_container is False
+
+
+class SuspiciousFrameChecker:
+    def __init__(self, problem):
+        self.problem = problem
+
+    def check(self, planes):
+        return self.problem
+
+    def accept(self):
+        pass
+
+
+def test_suspected_duplicate_is_kept_and_flagged(tmp_path):
+    raw = raw_block()
+    frame = FrameBuffer(pool=None, capacity=len(raw))
+    frame.write(raw)
+    frame.retain()
+    manifest = FrameManifest(str(tmp_path / "manifest.sqlite"))
+    scanner = make_scanner(
+        frame_checker=SuspiciousFrameChecker("duplicate"),
+        manifest=manifest,
+        raw_offset=len(raw),
+    )
+    scanner.advance = lambda *args, **kwargs: pytest.fail("Advanced again")
+    scanner.capture_frame = lambda *args, **kwargs: pytest.fail("Captured again")
+
+    kept, _ = scanner.check_frame(7, frame)
+
+    assert kept is frame
+    assert frame.references == 1
+    [row] = manifest.frames()
+    assert row["is_duplicate"] == 1
+    assert row["is_dark"] == 0
+    manifest.close()
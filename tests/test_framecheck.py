@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from framecheck import FrameChecker
+
+SHAPE = (48, 64)
+
+
+def scene(brightness):
+    """
+    Luma of a shot with some structure around the mean `brightness`.
+    """
+    rows, columns = np.mgrid[: SHAPE[0], : SHAPE[1]]
+    pattern = np.sin(columns / 5) + np.cos(rows / 7) + columns / SHAPE[1]
+    return brightness * (1 + 0.8 * pattern / np.abs(pattern).max())
+
+
+def film_frame(brightness, grain, seed):
+    """
+    One frame of a static shot, differing from the other frames only in its grain.
+    """
+    rng = np.random.default_rng(seed)
+    return scene(brightness) + rng.normal(0, grain, (4, *SHAPE))
+
+
+def capture(frame, seed):
+    """
+    Bayer planes of a capture of `frame` with the sensor's shot noise.
+    """
+    rng = np.random.default_rng(1000 + seed)
+    noise = rng.normal(0, 0.12 * np.sqrt(np.maximum(frame, 0)))
+    return (frame + noise).round().clip(0, 255).astype(np.uint8)
+
+
+def check_pair(first, second):
+    checker = FrameChecker()
+    assert checker.check(first) is None
+    checker.accept()
+    return checker.check(second)
+
+
+@pytest.mark.parametrize("brightness", [24, 60, 128])
+def test_captures_of_same_frame_are_duplicates(brightness):
+    frame = film_frame(brightness, grain=1.0, seed=0)
+
+    assert check_pair(capture(frame, 0), capture(frame, 1)) == "duplicate"
+
+
+@pytest.mark.parametrize("brightness, grain", [(24, 2.0), (60, 3.0), (128, 4.0)])
+def test_distinct_frames_of_static_shot_are_not_duplicates(brightness, grain):
+    first = film_frame(brightness, grain, seed=0)
+    second = film_frame(brightness, grain, seed=1)
+
+    assert check_pair(capture(first, 0), capture(second, 1)) is None
+
+
+def test_blank_frames_are_never_duplicates():
+    blank = np.full((4, *SHAPE), 40, dtype=np.uint8)
+
+    assert check_pair(blank, blank) is None
+
+
+def test_partly_dark_frame_is_dark():
+    frame = capture(film_frame(100, grain=1.0, seed=0), 0)
+    dark = frame.copy()
+    dark[:, :10] //= 4
+
+    assert check_pair(frame, dark) == "dark"
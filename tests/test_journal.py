@@ -0,0 +1,78 @@
+import zlib
+
+import pytest
+
+import journal
+from journal import ScanJournal, resume_point
+from manifest import FrameManifest
+
+
+@pytest.fixture(autouse=True)
+def no_sync(monkeypatch):
+    monkeypatch.setattr(journal.os, "sync", lambda: None)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = FrameManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+
+def begin(tmp_path, batch_size=4):
+    scan_journal = ScanJournal(str(tmp_path / "journal.json"), batch_size=batch_size)
+    scan_journal.begin({"start_index": 10}, reel_container=False, start_position=100)
+    return scan_journal
+
+
+def save_frame(tmp_path, manifest, scan_journal, frame_index):
+    data = bytes([frame_index]) * 16
+    path = f"frame-{frame_index:05d}.jpg"
+    (tmp_path / path).write_bytes(data)
+    manifest.update(
+        frame_index,
+        path=path,
+        size=len(data),
+        crc32=zlib.crc32(data),
+        position=100 + frame_index - 10,
+    )
+    scan_journal.record_saved(frame_index)
+
+
+def test_frames_become_durable_in_batches_in_order(tmp_path, manifest):
+    scan_journal = begin(tmp_path)
+    for frame_index in [11, 12, 13, 14]:
+        save_frame(tmp_path, manifest, scan_journal, frame_index)
+    assert scan_journal.durable_frame is None
+
+    save_frame(tmp_path, manifest, scan_journal, 10)
+    assert scan_journal.durable_frame == 14
+    assert ScanJournal(str(tmp_path / "journal.json")).durable_frame == 14
+
+
+def test_scan_resumes_after_last_durable_frame(tmp_path, manifest):
+    scan_journal = begin(tmp_path)
+    assert resume_point(str(tmp_path), scan_journal, manifest) == (10, 100)
+
+    for frame_index in range(10, 20):
+        save_frame(tmp_path, manifest, scan_journal, frame_index)
+    scan_journal.finish(is_complete=False)
+
+    assert scan_journal.durable_frame == 19
+    assert resume_point(str(tmp_path), scan_journal, manifest) == (20, 110)
+
+
+def test_scan_resumes_at_first_damaged_frame(tmp_path, manifest):
+    scan_journal = begin(tmp_path)
+    for frame_index in range(10, 20):
+        save_frame(tmp_path, manifest, scan_journal, frame_index)
+    scan_journal.finish(is_complete=False)
+
+    (tmp_path / "frame-00018.jpg").write_bytes(b"\0" * 16)
+    (tmp_path / "frame-00017.jpg").unlink()
+    assert resume_point(str(tmp_path), scan_journal, manifest) == (17, 107)
+
+    # Only the last batch is validated by default
+    (tmp_path / "frame-00012.jpg").unlink()
+    assert resume_point(str(tmp_path), scan_journal, manifest) == (17, 107)
+    assert resume_point(str(tmp_path), scan_journal, manifest, 10) == (12, 102)
@@ -0,0 +1,82 @@
+import sqlite3
+import zlib
+from io import BytesIO
+
+import pytest
+
+from manifest import ChecksumFile, FrameManifest, open_manifest, verify
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = FrameManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+
+def test_updates_add_and_merge_fields(manifest):
+    manifest.update(3, captured_at=1.5, position=12)
+    manifest.update(3, size=100)
+    manifest.update(4, is_blank=1)
+
+    frames = manifest.frames()
+    assert [frame["frame_index"] for frame in frames] == [3, 4]
+    assert (frames[0]["position"], frames[0]["size"]) == (12, 100)
+    assert [frame["frame_index"] for frame in manifest.frames("is_blank")] == [4]
+
+    manifest.truncate(4)
+    assert len(manifest.frames()) == 1
+
+    with pytest.raises(ValueError):
+        manifest.update(5, colour="red")
+
+
+def test_columns_missing_from_older_manifests_are_added(tmp_path):
+    path = tmp_path / "manifest.sqlite"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE frames (frame_index INTEGER PRIMARY KEY, path TEXT)"
+    )
+    connection.execute("INSERT INTO frames VALUES (0, 'frame-00000.jpg')")
+    connection.commit()
+    connection.close()
+
+    manifest = open_manifest(tmp_path)
+    manifest.update(0, is_dark=1)
+    assert manifest.frames()[0]["path"] == "frame-00000.jpg"
+    assert manifest.frames()[0]["is_dark"] == 1
+    manifest.close()
+
+
+def test_verify_reports_damaged_frames(tmp_path, manifest):
+    for frame_index, content in enumerate([b"intact", b"damaged", b"cut"]):
+        path = f"frame-{frame_index:05d}.jpg"
+        (tmp_path / path).write_bytes(content)
+        manifest.update(
+            frame_index, path=path, size=len(content), crc32=zlib.crc32(content)
+        )
+    # A frame in a reel container, found at its offset
+    (tmp_path / "reel.dat").write_bytes(b"padding" + b"reel frame")
+    manifest.update(
+        3, path="reel.dat", offset=7, size=10, crc32=zlib.crc32(b"reel frame")
+    )
+    manifest.update(4, path="frame-00004.jpg", size=1, crc32=0)
+
+    (tmp_path / "frame-00001.jpg").write_bytes(b"DAMAGED")
+    (tmp_path / "frame-00002.jpg").write_bytes(b"c")
+
+    assert verify(tmp_path, manifest) == [
+        (1, "checksum mismatch"),
+        (2, "truncated"),
+        (4, "missing"),
+    ]
+    assert verify(tmp_path, manifest, "frame_index < 2") == [(1, "checksum mismatch")]
+
+
+def test_checksum_file_counts_what_it_writes():
+    f = ChecksumFile(BytesIO())
+    f.write(b"frame ")
+    f.write(memoryview(b"data"))
+
+    assert f.size == 10
+    assert f.crc32 == zlib.crc32(b"frame data")
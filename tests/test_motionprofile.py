@@ -0,0 +1,125 @@
+import pytest
+
+from fakes import fake_connection
+from filmscanner import StepperMotor
+from motionprofile import (
+    MAX_RAMP_LEVELS,
+    MotionProfile,
+    SCurveProfile,
+    TrapezoidalProfile,
+    quantise,
+    ramp_duration,
+)
+
+
+def test_profile_must_implement_velocity_and_duration():
+    class IncompleteProfile(MotionProfile):
+        def duration(self, start_frequency, target_frequency):
+            return 1.0
+
+    with pytest.raises(TypeError):
+        IncompleteProfile(1000)
+
+
+@pytest.mark.parametrize(
+    "profile", [TrapezoidalProfile(4000), SCurveProfile(4000, jerk=40000)]
+)
+def test_ramp_reaches_target_within_limits(profile):
+    ramp = profile.make_ramp(2000, stay=10)
+
+    assert len(ramp) <= MAX_RAMP_LEVELS
+    assert ramp[-1] == (quantise(2000), 10)
+    frequencies = [frequency for frequency, _ in ramp]
+    assert frequencies == sorted(frequencies)
+    assert ramp_duration(ramp[:-1]) == pytest.approx(
+        profile.duration(320, 2000), rel=0.1
+    )
+    assert profile.make_ramp(2000, rising=False) == list(reversed(ramp[:-1]))
+
+
+def chain_counters(chain):
+    """
+    Number of loop counters, i.e. `255 1 x y` commands, in a `pigpio` wave chain.
+    """
+    n_counters, i = 0, 0
+    while i < len(chain):
+        if chain[i] != 255:
+            i += 1
+        elif chain[i + 1] == 1:
+            n_counters += 1
+            i += 4
+        else:
+            i += 2
+    return n_counters
+
+
+PROFILES = [TrapezoidalProfile(a) for a in [2000, 5000, 10000, 20000, 40000]] + [
+    SCurveProfile(a, jerk=2e6) for a in [10000, 20000, 40000]
+]
+
+
+@pytest.mark.parametrize("profile", [None] + PROFILES, ids=repr)
+@pytest.mark.parametrize("speed", [150, 300, 400, 450, 500])
+def test_ramps_fit_into_pigpio_chain_counters(profile, speed):
+    pi = fake_connection()
+    motor = StepperMotor(1, 2, 3, pi=pi)
+    motor.profile = profile
+    motor.enable()
+
+    chains = []
+    for run in [motor.start, motor.run]:
+        run(speed=speed)
+        chains.append(pi.pi.chain)
+        motor.stop()
+        chains.append(pi.pi.chain)
+
+    for chain in chains:
+        assert chain_counters(chain) < StepperMotor.MAX_CHAIN_COUNTERS
+
+
+def test_ramp_with_too_many_counters_is_rejected():
+    motor = StepperMotor(1, 2, 3, pi=fake_connection())
+    ramp = [(float(frequency), 2) for frequency in range(500, 521)]
+
+    with pytest.raises(ValueError):
+        motor.send_ramp(ramp)
+    motor.send_ramp(ramp, repeat_last=True)
+
+
+def test_waveforms_are_evicted_while_a_chain_is_transmitted():
+    pi = fake_connection()
+    motor = StepperMotor(1, 2, 3, pi=pi)
+    motor.MAX_WAVEFORMS = 10
+
+    running = [(1000.0, 1)]
+    motor.send_ramp(running, repeat_last=True)
+    pi.pi.is_transmitting = True
+    for frequency in range(500, 520):
+        motor.send_ramp([(float(frequency), 5)])
+
+    assert motor.n_waveforms <= motor.MAX_WAVEFORMS
+    assert set(motor.waveforms.values()) == pi.pi.waves
+    assert (1000.0, 3) not in motor.waveforms
+
+    # The waveform of the chain being transmitted is never deleted, even if it is the
+    # least recently used one
+    motor.send_ramp(running, repeat_last=True)
+    wid = motor.waveforms[(1000.0, 3)]
+    motor.send_ramp([(float(frequency), 5) for frequency in range(600, 609)])
+    assert wid in pi.pi.waves
+    assert motor.n_waveforms == motor.MAX_WAVEFORMS
+
+    pi.pi.is_transmitting = False
+    motor.send_ramp([(2000.0, 5)])
+    assert motor.n_waveforms == 1
+
+
+def test_cruise_speed_is_the_speed_the_motor_reaches():
+    motor = StepperMotor(1, 2, 3, pi=fake_connection())
+
+    # Fast-forwarding runs at 450 RPM
+    assert motor.cruise_speed(450) == 450
+    assert motor.cruise_speed(400) == 300
+
+    motor.profile = TrapezoidalProfile(4000)
+    assert motor.cruise_speed(400) == pytest.approx(400, rel=0.01)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import ScanPipeline, Stage, WriteBehindQueue
+
+
+def test_stage_processes_items_in_order():
+    processed = []
+    stage = Stage("test", processed.append, maxsize=4)
+    stage.start()
+    for i in range(10):
+        stage.put(i)
+    stage.close()
+
+    assert processed == list(range(10))
+    assert stage.stats["processed"] == 10
+
+
+def test_stage_survives_failing_items():
+    processed = []
+
+    def function(item):
+        if item == 1:
+            raise ValueError("Bad item")
+        processed.append(item)
+
+    stage = Stage("test", function)
+    stage.start()
+    for i in range(3):
+        stage.put(i)
+    stage.close()
+
+    assert processed == [0, 2]
+    assert stage.n_processed == 3
+
+
+def test_lossy_stage_drops_items_when_full():
+    release = threading.Event()
+    stage = Stage("preview", lambda item: release.wait(), maxsize=1, lossy=True)
+    stage.start()
+
+    assert stage.put(0)
+    # Wait until the worker holds the first item, such that the next one fills the queue
+    while stage.queue.qsize() > 0:
+        time.sleep(0.001)
+    assert stage.put(1)
+    assert not stage.put(2)
+
+    release.set()
+    stage.close()
+    assert stage.stats["dropped"] == 1
+    assert stage.stats["processed"] == 2
+
+
+def test_pipeline_drains_all_stages_on_close():
+    first, second = [], []
+    pipeline = ScanPipeline(
+        [Stage("first", first.append, maxsize=2), Stage("second", second.append)]
+    )
+    pipeline.start()
+    for i in range(5):
+        pipeline["first"].put(i)
+        pipeline["second"].put(-i)
+    pipeline.close()
+
+    assert first == list(range(5))
+    assert second == [-i for i in range(5)]
+    assert set(pipeline.stats) == {"first", "second"}
+
+
+def test_write_queue_writes_all_frames_before_flush_returns():
+    written = []
+    n_callbacks = []
+    write_queue = WriteBehindQueue(lambda frame, path: written.append(path))
+    for i in range(10):
+        write_queue.submit(b"frame", f"frame-{i}", lambda: n_callbacks.append(1))
+    write_queue.flush()
+
+    assert sorted(written) == sorted(f"frame-{i}" for i in range(10))
+    assert len(n_callbacks) == 10
+    assert write_queue.bytes_pending == 0
+    assert write_queue.bytes_written == 50
+
+
+def test_write_queue_blocks_submit_while_budget_is_exhausted():
+    release = threading.Event()
+    write_queue = WriteBehindQueue(lambda frame, path: release.wait(), budget=10)
+    # A frame larger than the budget is still admitted into an empty queue
+    write_queue.submit(b"x" * 12, "large")
+
+    submitted = threading.Event()
+    thread = threading.Thread(
+        target=lambda: (write_queue.submit(b"x" * 4, "small"), submitted.set())
+    )
+    thread.start()
+    assert not submitted.wait(0.05)
+
+    release.set()
+    assert submitted.wait(1)
+    write_queue.flush()
+    assert write_queue.stall_time > 0
+
+
+def test_write_queue_raises_failed_write_once():
+    def write(frame, path):
+        raise OSError("Disk full")
+
+    write_queue = WriteBehindQueue(write, n_writers=1)
+    write_queue.submit(b"frame", "frame-0")
+    with pytest.raises(OSError):
+        write_queue.flush()
+    write_queue.flush()
@@ -0,0 +1,87 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+import bayer
+import rawfile
+from fakes import raw_block
+from reel import ALIGNMENT, DATA_FILENAME, INDEX_FILENAME, RECORD, Reel, ReelWriter
+
+
+def test_raw_frame_written_in_chunks_matches_raw_file(tmp_path):
+    raw = memoryview(raw_block())
+    expected = BytesIO()
+    rawfile.write(expected, raw)
+
+    writer = ReelWriter(tmp_path, preallocation=0)
+    length, chunks = rawfile.chunks(raw, chunk_rows=5)
+    writer.write(12, "raw", chunks, length)
+    writer.close()
+
+    reel = Reel(tmp_path)
+    assert bytes(reel[12]) == expected.getvalue()
+    assert reel.verify(12)
+    frame = rawfile.parse(reel[12])
+    assert np.array_equal(frame.data, bayer.sensor_data(raw)[:32, :96])
+    reel.close()
+
+
+def test_chunks_must_add_up_to_length(tmp_path):
+    writer = ReelWriter(tmp_path, preallocation=0)
+    with pytest.raises(ValueError):
+        writer.write(0, "raw", [b"abc", b"def"], 5)
+    with pytest.raises(ValueError):
+        writer.write(1, "raw", [b"abc"], 5)
+    writer.close()
+
+
+def test_writer_continues_after_torn_record(tmp_path):
+    writer = ReelWriter(tmp_path, preallocation=0)
+    writer.write(0, "jpg", b"first")
+    writer.write(1, "jpg", b"second")
+    writer.close()
+
+    # A crash while appending the second record leaves it torn
+    index_path = tmp_path / INDEX_FILENAME
+    size = index_path.stat().st_size
+    with open(index_path, "r+b") as f:
+        f.truncate(size - RECORD.size // 2)
+
+    reel = Reel(tmp_path)
+    assert reel.indices == [0]
+    reel.close()
+
+    writer = ReelWriter(tmp_path)
+    writer.write(2, "jpg", b"third")
+    writer.close()
+
+    reel = Reel(tmp_path)
+    assert reel.indices == [0, 2]
+    assert bytes(reel[0]) == b"first"
+    assert bytes(reel[2]) == b"third"
+    assert all(reel.verify(index) for index in reel.indices)
+    reel.close()
+
+
+def test_corrupt_records_are_skipped(tmp_path):
+    writer = ReelWriter(tmp_path, preallocation=0)
+    for index in range(3):
+        writer.write(index, "jpg", bytes([index]) * 10)
+    writer.close()
+
+    with open(tmp_path / INDEX_FILENAME, "r+b") as f:
+        f.seek(-RECORD.size - 1, 2)
+        f.write(b"\xff")
+
+    reel = Reel(tmp_path)
+    assert reel.indices == [0, 2]
+    reel.close()
+
+
+def test_data_file_is_cut_to_its_used_size(tmp_path):
+    writer = ReelWriter(tmp_path, preallocation=1 << 20)
+    writer.write(0, "jpg", b"frame")
+    writer.close()
+
+    assert (tmp_path / DATA_FILENAME).stat().st_size == ALIGNMENT
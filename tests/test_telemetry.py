@@ -0,0 +1,49 @@
+import pytest
+
+import telemetry
+from telemetry import AdvanceTimeline, load_timeline, signed_tick_diff, tick_diff
+
+
+def test_tick_differences_wrap_around():
+    assert tick_diff(0xFFFFFFF0, 0x10) == 0x20
+    assert signed_tick_diff(0x10, 0xFFFFFFF0) == -0x20
+    assert signed_tick_diff(0xFFFFFFF0, 0x10) == 0x20
+
+
+def test_timeline_grows_beyond_capacity():
+    timeline = AdvanceTimeline(capacity=2)
+    for i in range(5):
+        timeline.append(i, 100 * i, 100 * i + 50, 100 * i + 60, telemetry.DETECTED)
+
+    assert len(timeline) == 5
+    assert timeline[-1] == (4, 400, 450, 460, telemetry.DETECTED)
+    assert [record.frame_index for record in timeline] == list(range(5))
+    with pytest.raises(IndexError):
+        timeline[5]
+
+    timeline.clear()
+    assert len(timeline) == 0
+
+
+def test_timeline_round_trips_through_file(tmp_path):
+    timeline = AdvanceTimeline()
+    timeline.append(0, 0xFFFFFF00, 0x100, 0x200, telemetry.DETECTED)
+    timeline.append(1, 1000, 0, 5000, telemetry.TIMED_OUT)
+    timeline.append(1, 6000, 6500, 6600, telemetry.RECOVERY_DETECTED)
+    path = tmp_path / "advances.bin"
+    timeline.save(path)
+
+    loaded = load_timeline(path)
+    assert list(loaded) == list(timeline)
+    assert loaded.durations() == [0x200, 500]
+
+    # Appending to a loaded timeline grows its array
+    loaded.append(2, 7000, 7400, 7500, telemetry.DETECTED)
+    assert len(loaded) == 4
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "advances.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        load_timeline(path)
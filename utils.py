@@ -85,6 +85,13 @@ class BaseCallback:
         """
         pass
 
+    def on_conversion_progress(self):
+        """
+        Called whenever a background conversion job converted a frame or changed its
+        state.
+        """
+        pass
+
     def on_fast_forward_start(self):
         """
         Called before the scanner starts fast-forwarding.
@@ -97,6 +104,12 @@ class BaseCallback:
         """
         pass
 
+    def on_fast_forward_progress(self):
+        """
+        Called whenever the scanner has passed a frame while fast-forwarding.
+        """
+        pass
+
     def on_frame_capture(self):
         """
         Called after a frame was captured during a scan.
@@ -108,6 +121,18 @@ class BaseCallback:
         Called when the info on how the last scan ended changed.
         """
 
+    def on_recovery_start(self):
+        """
+        Called before the scanner starts recovering from a failed advance.
+        """
+        pass
+
+    def on_recovery_end(self):
+        """
+        Called after the scanner finished recovering from a failed advance, whether
+        successfully or not.
+        """
+
     def on_light_on(self):
         """
         Called after the scanner's light is turned on.
@@ -173,6 +198,10 @@ class CallbackList(BaseCallback):
         for callback in self.callbacks:
             callback.on_advance_end()
 
+    def on_conversion_progress(self):
+        for callback in self.callbacks:
+            callback.on_conversion_progress()
+
     def on_fast_forward_start(self):
         for callback in self.callbacks:
             callback.on_fast_forward_start()
@@ -181,6 +210,10 @@ class CallbackList(BaseCallback):
         for callback in self.callbacks:
             callback.on_fast_forward_end()
 
+    def on_fast_forward_progress(self):
+        for callback in self.callbacks:
+            callback.on_fast_forward_progress()
+
     def on_frame_capture(self):
         for callback in self.callbacks:
             callback.on_frame_capture()
@@ -189,6 +222,14 @@ class CallbackList(BaseCallback):
         for callback in self.callbacks:
             callback.on_last_scan_end_info_change()
 
+    def on_recovery_start(self):
+        for callback in self.callbacks:
+            callback.on_recovery_start()
+
+    def on_recovery_end(self):
+        for callback in self.callbacks:
+            callback.on_recovery_end()
+
     def on_light_on(self):
         for callback in self.callbacks:
             callback.on_light_on()
@@ -250,12 +291,18 @@ class DashboardCallback(SSESendingCallback):
     def on_advance_end(self):
         self.messenger.send("state", self.scanner_state_dict)
 
+    def on_conversion_progress(self):
+        self.messenger.send("state", self.scanner_state_dict)
+
     def on_fast_forward_start(self):
         self.messenger.send("state", self.scanner_state_dict)
 
     def on_fast_forward_end(self):
         self.messenger.send("state", self.scanner_state_dict)
 
+    def on_fast_forward_progress(self):
+        self.messenger.send("state", self.scanner_state_dict)
+
     def on_frame_capture(self):
         self.update_time_remaining()
         self.messenger.send("state", self.scanner_state_dict)
@@ -263,6 +310,12 @@ class DashboardCallback(SSESendingCallback):
     def on_last_scan_end_info_change(self):
         self.messenger.send("state", self.scanner_state_dict)
 
+    def on_recovery_start(self):
+        self.messenger.send("state", self.scanner_state_dict)
+
+    def on_recovery_end(self):
+        self.messenger.send("state", self.scanner_state_dict)
+
     def on_light_on(self):
         self.messenger.send("state", self.scanner_state_dict)
 
@@ -295,12 +348,21 @@ class DashboardCallback(SSESendingCallback):
                 and not self.scanner.is_fast_forwarding,
                 "enabled": self.scanner.is_advance_allowed,
             },
+            "advance_timing": self.scanner.advance_timing.stats,
+            "capture_timing": self.scanner.capture_timing_stats,
+            "compression": self.scanner.compressor.stats,
+            "conversion": self.scanner.conversion_scheduler.stats,
             "current_frame_index": self.scanner.current_frame_index,
+            "fast_forward": {
+                "frames": self.scanner.fast_forward_count,
+                "frames_per_s": round(self.scanner.fast_forward_rate, 2),
+            },
             "fast_forward_toggle": {
                 "active": self.scanner.is_fast_forwarding,
                 "enabled": self.scanner.is_fast_forward_allowed
                 or self.scanner.is_fast_forwarding,
             },
+            "gpio_latency": self.scanner.pi.stats,
             "is_scanning": self.scanner.is_scanning,
             "is_scan_button_enabled": self.scanner.is_scanning_allowed
             or self.scanner.is_scanning,
@@ -309,7 +371,11 @@ class DashboardCallback(SSESendingCallback):
                 "active": self.scanner.is_light_on,
                 "enabled": self.scanner.is_light_toggle_allowed,
             },
+            "pipeline": self.scanner.pipeline_stats,
+            "recovery": self.scanner.recovery.stats,
+            "reel_position": self.scanner.reel_position.frame,
             "time_remaining": self.str_time_remaining,
+            "write_queue": self.scanner.write_queue.stats,
             "zoom_toggle": {
                 "active": self.scanner.is_zoomed,
                 "enabled": self.scanner.is_zoom_toggle_allowed,